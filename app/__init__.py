@@ -1,9 +1,14 @@
 from flask import Flask
 from .config import load_config
 from .extensions import db
+from . import aio, cache, changes, eligibility, engine, instrumentation, jobs, overlap, replica, rollups, s3_utils, search
 from .routes.main import main_bp
 from .routes.clients import clients_bp
 from .routes.target_lists import target_lists_bp
+from .routes.jobs import jobs_bp
+from .routes.rollups import rollups_bp
+from .routes.api import api_bp
+from .routes.aio import aio_bp
 from .routes.programs_targetlist_api import programs_bp
 from .routes.placements_edit_override import placements_bp
 from .routes.campaigns_programs import contracts_bp, campaigns_bp, programs_bp, placements_bp
@@ -18,8 +23,20 @@ def create_app():
     except OSError:
         pass
     db.init_app(app)
+    engine.init_app(app)
     with app.app_context():
         db.create_all()
+    changes.init_app(app)
+    replica.init_app(app)
+    search.init_app(app)
+    cache.init_app(app)
+    eligibility.init_app(app)
+    rollups.init_app(app)
+    instrumentation.init_app(app)
+    jobs.init_app(app)
+    overlap.init_app(app)
+    s3_utils.init_app(app)
+    aio.init_app(app)
     app.register_blueprint(main_bp)
     app.register_blueprint(clients_bp, url_prefix="/clients")
     app.register_blueprint(target_lists_bp, url_prefix="/target-lists")
@@ -27,6 +44,11 @@ def create_app():
     app.register_blueprint(campaigns_bp, url_prefix="/campaigns")
     app.register_blueprint(programs_bp, url_prefix="/programs")
     app.register_blueprint(placements_bp, url_prefix="/placements")
+    app.register_blueprint(jobs_bp, url_prefix="/jobs")
+    app.register_blueprint(rollups_bp, url_prefix="/rollups")
+    app.register_blueprint(api_bp, url_prefix="/api/v1")
+    if aio.enabled(app):
+        app.register_blueprint(aio_bp, url_prefix="/aio")
     # simple index redirect
     @app.route("/")
     def index():
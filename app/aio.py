@@ -0,0 +1,108 @@
+"""
+Asyncio tier for the high fan-in JSON lookups.
+
+With ASYNC_LOOKUPS=1 the program form's target-list lookup and the contract
+form's brand list are also served by ``async def`` views under /aio
+(app/routes/aio.py). The views read through SQLAlchemy's asyncio engine
+with the same mapped classes (app/models.py) and the same statements as the
+sync handlers. The forms keep fetching from the sync handlers: under a WSGI
+server an async view still holds its worker thread until it returns, so
+the tier is there for `flask bench-lookups` to compare against.
+
+The engine uses ASYNC_DATABASE_URL, else the primary database, with the
+driver swapped for its asyncio counterpart (sqlite → aiosqlite,
+postgresql → asyncpg).
+
+The views run on Flask's stock async support, which gives every request a
+new event loop (asgiref). asyncio connections are bound to the loop that
+opened them, so the engine does not pool: each lookup opens and closes its
+own connection.
+
+Needs asgiref and aiosqlite (requirements.txt; asyncpg on Postgres) and
+greenlet; without them ASYNC_LOOKUPS is switched off at startup.
+"""
+import importlib.util
+import threading
+from flask import current_app
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+from .engine import configure_sqlite, sqlite_pragmas
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+except Exception:
+    create_async_engine = None
+
+# backend → (async drivername, module that provides it)
+DRIVERS = {
+    "sqlite": ("sqlite+aiosqlite", "aiosqlite"),
+    "postgresql": ("postgresql+asyncpg", "asyncpg"),
+}
+
+def async_url(uri):
+    """``uri`` with its driver replaced by the asyncio one."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in DRIVERS:
+        raise ValueError(f"no asyncio driver configured for {backend!r}")
+    return url.set(drivername=DRIVERS[backend][0])
+
+def missing_dependencies(uri):
+    """Packages the async tier still needs for ``uri`` (empty when it can run)."""
+    missing = [name for name in ("asgiref", "greenlet") if importlib.util.find_spec(name) is None]
+    if create_async_engine is None:
+        missing.append("sqlalchemy.ext.asyncio")
+    backend = make_url(uri).get_backend_name()
+    if backend not in DRIVERS:
+        missing.append(f"an asyncio driver for {backend}")
+    elif importlib.util.find_spec(DRIVERS[backend][1]) is None:
+        missing.append(DRIVERS[backend][1])
+    return missing
+
+class AsyncDB:
+    """The app's asyncio engine, created on first use."""
+
+    def __init__(self, url, pragmas=None):
+        self.url = url
+        self.pragmas = pragmas
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        with self._lock:
+            if self._engine is None:
+                # each request runs on its own event loop, and connections cannot move between loops
+                engine = create_async_engine(self.url, poolclass=NullPool)
+                if self.pragmas:
+                    # connect events live on the sync facade of the async engine
+                    configure_sqlite(engine.sync_engine, self.pragmas)
+                self._engine = engine
+            return self._engine
+
+    def session(self):
+        # the views serialize after the session closes, so keep loaded attributes
+        return AsyncSession(self.engine, expire_on_commit=False)
+
+def enabled(app):
+    return app.extensions.get("aio") is not None
+
+def session():
+    """A new AsyncSession for the current app; use as ``async with aio.session() as s``."""
+    return current_app.extensions["aio"].session()
+
+def init_app(app):
+    cfg = app.config
+    app.extensions["aio"] = None
+    if not cfg["ASYNC_LOOKUPS"]:
+        return
+    uri = cfg["ASYNC_DATABASE_URL"] or cfg["SQLALCHEMY_DATABASE_URI"]
+    missing = missing_dependencies(uri)
+    if missing:
+        app.logger.warning("ASYNC_LOOKUPS needs %s; /aio is not served", ", ".join(missing))
+        cfg["ASYNC_LOOKUPS"] = False
+        return
+    pragmas = None
+    if cfg["DB_ENGINE_PROFILE"] == "tuned" and make_url(uri).get_backend_name() == "sqlite":
+        pragmas = sqlite_pragmas(cfg, uri)
+    app.extensions["aio"] = AsyncDB(async_url(uri), pragmas)
@@ -0,0 +1,167 @@
+"""
+Versioned JSON API (/api/v1) over the campaign model graph.
+
+Every resource exposes its mapped columns. Requests can narrow and widen
+what comes back:
+
+* ``fields=name,status`` keeps only those columns of the requested resource
+  (``id`` is always present), and ``fields[<resource>]=`` does the same for
+  an included one. Only the kept columns (plus foreign keys) are SELECTed.
+* ``include=campaigns.programs,pharma`` nests related rows, up to
+  MAX_INCLUDE_DEPTH levels. Each relationship level is one batched
+  selectinload (``... WHERE parent_id IN (...)``), however many rows the
+  page holds.
+* ``ids=1,2,3`` fetches a batch by id in one query. Otherwise rows come in
+  id order, paged with ``after=<last id>`` and ``limit=``. Foreign-key
+  columns (``?contract_id=``) filter by equality.
+
+Related lists are sorted by id, so the same data always serializes to the
+same bytes. The routes in app/routes/api.py send a content ETag and answer
+If-None-Match with 304.
+"""
+from datetime import date, datetime
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import load_only, selectinload
+from .models import Pharma, Brand, Contract, Campaign, Program, Placement, TargetList
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_INCLUDE_DEPTH = 3
+
+class ApiError(ValueError):
+    """A malformed request; reported to the client as a 400."""
+
+class Resource:
+    """One model exposed by the API and the relationships ``include=`` may expand (name → resource)."""
+
+    def __init__(self, model, relations):
+        self.model = model
+        self.relations = relations
+        self._columns = None
+
+    @property
+    def columns(self):
+        # resolved on first use, once the mappers are configured
+        if self._columns is None:
+            self._columns = {prop.key: prop for prop in inspect(self.model).column_attrs}
+        return self._columns
+
+    @property
+    def foreign_keys(self):
+        return [name for name, prop in self.columns.items() if any(c.foreign_keys for c in prop.columns)]
+
+RESOURCES = {
+    "pharmas": Resource(Pharma, {"brands": "brands", "contracts": "contracts", "target_lists": "target_lists"}),
+    "brands": Resource(Brand, {"pharma": "pharmas", "contracts": "contracts", "target_lists": "target_lists"}),
+    "contracts": Resource(Contract, {"pharma": "pharmas", "brands": "brands", "campaigns": "campaigns"}),
+    "campaigns": Resource(Campaign, {"contract": "contracts", "programs": "programs"}),
+    "programs": Resource(Program, {"campaign": "campaigns", "target_list": "target_lists",
+                                   "placements": "placements"}),
+    "placements": Resource(Placement, {"programs": "programs"}),
+    "target_lists": Resource(TargetList, {"pharmas": "pharmas", "brands": "brands", "programs": "programs"}),
+}
+
+def _split(value):
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+def parse_ids(values):
+    try:
+        ids = [int(v) for value in values for v in _split(value)]
+    except ValueError:
+        raise ApiError("ids must be integers")
+    if len(ids) > MAX_LIMIT:
+        raise ApiError(f"at most {MAX_LIMIT} ids per request")
+    return list(dict.fromkeys(ids))
+
+def parse_fields(kind, args):
+    """{resource: [column names]} from ``fields=`` / ``fields[<resource>]=``; absent means every column."""
+    fields = {}
+    for key, value in args.items():
+        if key == "fields":
+            target = kind
+        elif key.startswith("fields[") and key.endswith("]"):
+            target = key[7:-1]
+        else:
+            continue
+        resource = RESOURCES.get(target)
+        if resource is None:
+            raise ApiError(f"unknown resource {target!r} in {key}")
+        names = _split(value)
+        unknown = [n for n in names if n not in resource.columns]
+        if unknown:
+            raise ApiError(f"unknown {target} fields: {', '.join(unknown)}")
+        fields[target] = ["id"] + [n for n in dict.fromkeys(names) if n != "id"]
+    return fields
+
+def parse_include(kind, value):
+    """``include=`` dotted paths as a tree {relationship: {nested relationship: ...}}."""
+    tree = {}
+    for path in _split(value):
+        parts = path.split(".")
+        if len(parts) > MAX_INCLUDE_DEPTH:
+            raise ApiError(f"include paths are limited to {MAX_INCLUDE_DEPTH} levels")
+        node, current = tree, kind
+        for part in parts:
+            target = RESOURCES[current].relations.get(part)
+            if target is None:
+                raise ApiError(f"{current} has no relationship {part!r}")
+            node = node.setdefault(part, {})
+            current = target
+    return tree
+
+def _load_only(kind, fields):
+    resource = RESOURCES[kind]
+    if kind not in fields:
+        return None
+    names = dict.fromkeys(fields[kind] + resource.foreign_keys)
+    return load_only(*(getattr(resource.model, n) for n in names))
+
+def _loader_options(kind, tree, fields):
+    resource = RESOURCES[kind]
+    options = []
+    for name, subtree in tree.items():
+        target = resource.relations[name]
+        nested = _loader_options(target, subtree, fields)
+        only = _load_only(target, fields)
+        if only is not None:
+            nested.append(only)
+        loader = selectinload(getattr(resource.model, name))
+        options.append(loader.options(*nested) if nested else loader)
+    return options
+
+def query(kind, fields, tree, ids=None, filters=None, after=None, limit=DEFAULT_LIMIT):
+    """SELECT for a batch (``ids``) or an id-ordered page of ``kind``, with its include loaders."""
+    resource = RESOURCES[kind]
+    model = resource.model
+    stmt = select(model).options(*_loader_options(kind, tree, fields))
+    only = _load_only(kind, fields)
+    if only is not None:
+        stmt = stmt.options(only)
+    if ids is not None:
+        return stmt.where(model.id.in_(ids))
+    for name, value in (filters or {}).items():
+        stmt = stmt.where(getattr(model, name) == value)
+    if after:
+        stmt = stmt.where(model.id > after)
+    return stmt.order_by(model.id).limit(limit)
+
+def _value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def serialize(obj, kind, tree, fields):
+    resource = RESOURCES[kind]
+    out = {name: _value(getattr(obj, name)) for name in fields.get(kind) or resource.columns}
+    for name, subtree in tree.items():
+        target = resource.relations[name]
+        related = getattr(obj, name)
+        if isinstance(related, list):
+            out[name] = [serialize(r, target, subtree, fields) for r in sorted(related, key=lambda r: r.id)]
+        else:
+            out[name] = serialize(related, target, subtree, fields) if related is not None else None
+    return out
+
+def describe():
+    """Resource → its fields and includable relationships, for the API index."""
+    return {kind: {"fields": list(r.columns), "include": list(r.relations)} for kind, r in RESOURCES.items()}
@@ -0,0 +1,291 @@
+"""
+Local index of the HCP identifiers inside each target list file.
+
+Every uploaded list is read once, chunk by chunk, and its identifier column
+(NPI by default) is stored as a sorted array of distinct unsigned 64-bit
+integers in AUDIENCE_DIR/<target_list_id>.u64. Row and identifier counts
+live in ``target_list_audience`` so list sizes and program reach come from
+one indexed row instead of a download. load() memory-maps the array when
+numpy is installed and falls back to the stdlib ``array`` module otherwise.
+
+Files are ingested straight from the upload spool after the S3 upload job
+(see routes/target_lists.py), or streamed back from S3 by the
+"target_list_ingest" job for lists registered by key.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import sys
+from array import array
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from .extensions import db
+from . import jobs
+from .models import Program, TargetList, TargetListAudience
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+SUFFIX = ".u64"
+_DELIMITERS = ",;\t|"
+_SNIFF_BYTES = 64 * 1024
+
+class UnsupportedFormat(ValueError):
+    pass
+
+def array_path(tl_id):
+    return os.path.join(current_app.config["AUDIENCE_DIR"], f"{tl_id}{SUFFIX}")
+
+class _RawReader(io.RawIOBase):
+    """Adapts any object with read(n) (e.g. an S3 StreamingBody) for io.BufferedReader."""
+
+    def __init__(self, source):
+        self.source = source
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        data = self.source.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+def _text_stream(fileobj, filename):
+    name = (filename or "").lower()
+    if name.endswith((".xlsx", ".xls")):
+        raise UnsupportedFormat("spreadsheets are not indexed; upload the list as CSV")
+    raw = fileobj if hasattr(fileobj, "peek") else io.BufferedReader(_RawReader(fileobj), _SNIFF_BYTES)
+    if name.endswith(".gz") or raw.peek(2)[:2] == b"\x1f\x8b":
+        raw = io.BufferedReader(gzip.GzipFile(fileobj=raw), _SNIFF_BYTES)
+    sample = raw.peek(_SNIFF_BYTES)[:_SNIFF_BYTES].decode("utf-8", errors="replace")
+    try:
+        delimiter = csv.Sniffer().sniff(sample.split("\n", 20)[0] + "\n", delimiters=_DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+    return io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline=""), delimiter
+
+def _as_identifier(value):
+    value = value.strip().strip('"')
+    if value.endswith(".0"):  # spreadsheets exported with numeric cells
+        value = value[:-2]
+    if not value.isdigit() or len(value) > 19:
+        return None
+    return int(value)
+
+def _find_column(header, candidates):
+    names = [h.strip().lower() for h in header]
+    for c in candidates:
+        if c in names:
+            return names.index(c)
+    return None
+
+class _Collector:
+    """Accumulates identifiers in sorted, de-duplicated chunks."""
+
+    def __init__(self, chunk_rows):
+        self.chunk_rows = chunk_rows
+        self.pending = array("Q")
+        self.chunks = []
+
+    def add(self, value):
+        self.pending.append(value)
+        if len(self.pending) >= self.chunk_rows:
+            self._seal()
+
+    def _seal(self):
+        if not self.pending:
+            return
+        if np is not None:
+            self.chunks.append(np.unique(np.frombuffer(self.pending, dtype=np.uint64)))
+        else:
+            self.chunks.append(array("Q", sorted(set(self.pending))))
+        self.pending = array("Q")
+
+    def result(self):
+        self._seal()
+        if np is not None:
+            if not self.chunks:
+                return np.empty(0, dtype=np.uint64)
+            return np.unique(np.concatenate(self.chunks))
+        merged = set()
+        for chunk in self.chunks:
+            merged.update(chunk)
+        return array("Q", sorted(merged))
+
+def parse(fileobj, filename=None, candidates=None, chunk_rows=None):
+    """
+    Read identifiers from a CSV (optionally gzipped) stream.
+
+    Returns (column name, data rows, invalid rows, sorted distinct ids). The
+    column is the first header matching ``candidates``; a header-less file
+    whose first cell is numeric is read from column 0.
+    """
+    cfg = current_app.config
+    candidates = [c.lower() for c in (candidates or cfg["AUDIENCE_ID_COLUMNS"])]
+    collector = _Collector(chunk_rows or cfg["AUDIENCE_CHUNK_ROWS"])
+    text, delimiter = _text_stream(fileobj, filename)
+    reader = csv.reader(text, delimiter=delimiter)
+    first = next(reader, None)
+    if first is None:
+        return None, 0, 0, collector.result()
+    column = _find_column(first, candidates)
+    rows = invalid = 0
+    if column is not None:
+        name = first[column].strip()
+    elif first and _as_identifier(first[0]) is not None:
+        column, name = 0, None
+        reader = _chain([first], reader)
+    else:
+        raise UnsupportedFormat(f"no identifier column ({', '.join(candidates)}) in header")
+    for row in reader:
+        if not row:
+            continue
+        rows += 1
+        value = _as_identifier(row[column]) if column < len(row) else None
+        if value is None:
+            invalid += 1
+        else:
+            collector.add(value)
+    return name, rows, invalid, collector.result()
+
+def _chain(head, tail):
+    yield from head
+    yield from tail
+
+def _write(tl_id, ids):
+    path = array_path(tl_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        if np is not None:
+            ids.astype("<u8", copy=False).tofile(fh)
+        else:
+            if sys.byteorder != "little":
+                ids = array("Q", ids)
+                ids.byteswap()
+            ids.tofile(fh)
+    os.replace(tmp, path)
+
+def ingest(tl_id, fileobj, filename=None):
+    """Parse ``fileobj`` into the identifier array for ``tl_id`` and record its counts (caller commits)."""
+    audience = db.session.get(TargetListAudience, tl_id) or TargetListAudience(target_list_id=tl_id)
+    db.session.add(audience)
+    audience.ingested_at = datetime.utcnow()
+    try:
+        column, rows, invalid, ids = parse(fileobj, filename)
+    except (UnsupportedFormat, csv.Error, UnicodeError) as e:
+        if os.path.exists(array_path(tl_id)):
+            os.remove(array_path(tl_id))
+        audience.status, audience.error = "unsupported", str(e)
+        audience.identifier_column = None
+        audience.row_count = audience.invalid_count = audience.identifier_count = None
+        return audience
+    _write(tl_id, ids)
+    audience.status, audience.error = "ready", None
+    audience.identifier_column = column
+    audience.row_count = rows
+    audience.invalid_count = invalid
+    audience.identifier_count = len(ids)
+    return audience
+
+def load(tl_id):
+    """The sorted identifier array for ``tl_id`` (numpy memmap or array('Q')), or None."""
+    path = array_path(tl_id)
+    if not os.path.exists(path):
+        return None
+    if np is not None:
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=np.uint64)
+        return np.memmap(path, dtype="<u8", mode="r")
+    ids = array("Q")
+    with open(path, "rb") as fh:
+        ids.frombytes(fh.read())
+    if sys.byteorder != "little":
+        ids.byteswap()
+    return ids
+
+def sizes(tl_ids):
+    """Return {target_list_id: distinct identifier count} for ingested lists."""
+    ids = list(tl_ids)
+    if not ids:
+        return {}
+    rows = db.session.execute(select(TargetListAudience.target_list_id, TargetListAudience.identifier_count)
+                              .where(TargetListAudience.target_list_id.in_(ids),
+                                     TargetListAudience.status == "ready"))
+    return dict(rows.all())
+
+def expected_reach(program_ids):
+    """Return {program_id: identifier count of its target list} in one query."""
+    ids = list(program_ids)
+    if not ids:
+        return {}
+    rows = db.session.execute(
+        select(Program.id, TargetListAudience.identifier_count)
+        .join(TargetListAudience, TargetListAudience.target_list_id == Program.target_list_id)
+        .where(Program.id.in_(ids), TargetListAudience.status == "ready"))
+    return dict(rows.all())
+
+def enqueue_ingest(tl):
+    """Queue a re-read of ``tl`` from S3 (for lists registered by key)."""
+    return jobs.enqueue("target_list_ingest", {"tl_id": tl.id, "bucket": current_app.config["S3_BUCKET_NAME"]},
+                        subject=("target_list", tl.id))
+
+def copy(src_tl_id, dst_tl_id):
+    """Give ``dst_tl_id`` the index of ``src_tl_id`` (same file); False if there is none yet."""
+    src = db.session.get(TargetListAudience, src_tl_id)
+    if src is None or src.status != "ready" or not os.path.exists(array_path(src_tl_id)):
+        return False
+    dst = db.session.get(TargetListAudience, dst_tl_id) or TargetListAudience(target_list_id=dst_tl_id)
+    db.session.add(dst)
+    shutil.copyfile(array_path(src_tl_id), array_path(dst_tl_id))
+    for field in ("status", "error", "identifier_column", "row_count", "invalid_count", "identifier_count"):
+        setattr(dst, field, getattr(src, field))
+    dst.ingested_at = datetime.utcnow()
+    return True
+
+class _HashingReader:
+    def __init__(self, source):
+        self.source = source
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, n=-1):
+        data = self.source.read(n)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+def ingest_from_s3(tl, bucket=None):
+    """
+    Stream ``tl``'s object back from S3 and ingest it (caller commits). The
+    object's SHA-256 and size are recorded on the way when still unknown.
+    """
+    from .s3_utils import s3_client
+    body = s3_client().get_object(Bucket=bucket or current_app.config["S3_BUCKET_NAME"], Key=tl.s3_key)["Body"]
+    reader = _HashingReader(body)
+    try:
+        result = ingest(tl.id, reader, tl.original_filename or tl.s3_key)
+        while reader.read(_SNIFF_BYTES):
+            pass
+    finally:
+        body.close()
+    tl.content_sha256 = reader.sha256.hexdigest()
+    if tl.size_bytes is None:
+        tl.size_bytes = reader.size
+    return result
+
+@jobs.handler("target_list_ingest")
+def _ingest_job(payload):
+    tl = db.session.get(TargetList, payload["tl_id"])
+    if tl is None:
+        return {"skipped": "target list was deleted"}
+    if tl.s3_key is None:
+        return {"skipped": "target list has no stored object"}
+    audience = ingest_from_s3(tl, payload["bucket"])
+    return {"status": audience.status, "identifier_count": audience.identifier_count}
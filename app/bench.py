@@ -0,0 +1,540 @@
+"""
+Route benchmark harness.
+
+Drives every GET route of every blueprint (plus the search, cursor and JSON
+lookup variants listed in EXTRA_GETS, and optionally the write scenarios in
+WRITE_SCENARIOS) through the Flask test client against the configured
+database, and records p50/p95 latency, SQL statement count and peak Python
+memory per route. Results are plain JSON so two commits can be compared
+with `flask bench-routes --compare old.json`.
+
+concurrency() is the multi-process counterpart: N worker processes (one
+app each, like gunicorn workers) mix short reads and single-row write
+transactions against the same database under each DB_ENGINE_PROFILE and
+report throughput, latency and lock errors per profile.
+
+m2m() times edits of one wide many-to-many collection on scratch rows:
+ORM collection reassignment against m2m.sync_links.
+
+lookups() load-tests the form lookups over HTTP: the sync handlers against
+their async twins in the /aio tier (app/aio.py), served by one threaded
+server.
+"""
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from flask import url_for
+from sqlalchemy import Column, Integer, MetaData, String, Table, event, func, select
+from sqlalchemy.exc import OperationalError
+from .extensions import db
+from .models import (Pharma, Brand, Contract, Campaign, Program, Placement, Client, TargetList,
+                     contract_brand, program_placement)
+
+# url parameter -> model whose ids fill it
+PARAM_MODELS = {
+    "contract_id": Contract, "campaign_id": Campaign, "program_id": Program,
+    "placement_id": Placement, "client_id": Client, "tl_id": TargetList, "pharma_id": Pharma,
+}
+
+# (label, endpoint, query args); values naming a PARAM_MODELS key are replaced by a sampled id
+EXTRA_GETS = [
+    ("contracts.list_contracts?q", "contracts.list_contracts", {"q": "Alpha"}),
+    ("campaigns.list_campaigns?q", "campaigns.list_campaigns", {"q": "Alpha"}),
+    ("programs.list_programs?q", "programs.list_programs", {"q": "Alpha"}),
+    ("placements.list_placements?q", "placements.list_placements", {"q": "Alpha"}),
+    ("clients.list_clients?q", "clients.list_clients", {"q": "Alpha"}),
+    ("programs.api_program_target_lists?campaign_id", "programs.api_program_target_lists",
+     {"campaign_id": "campaign_id"}),
+    ("programs.api_program_target_lists?all", "programs.api_program_target_lists", {"all": "1"}),
+    ("rollups.api_rollup[contracts]", "rollups.api_rollup", {"kind": "contracts", "owner_id": "contract_id"}),
+    ("rollups.api_rollups[campaigns]?contract_id", "rollups.api_rollups",
+     {"kind": "campaigns", "contract_id": "contract_id"}),
+    ("rollups.api_rollups[contracts]?pharma_id", "rollups.api_rollups", {"kind": "contracts", "pharma_id": "pharma_id"}),
+    ("contracts.export_hierarchy?contract_id", "contracts.export_hierarchy", {"contract_id": "contract_id"}),
+    ("api.api_get[contracts]?include", "api.api_get",
+     {"kind": "contracts", "obj_id": "contract_id", "include": "pharma,brands,campaigns.programs.placements"}),
+    ("api.api_list[contracts]?include", "api.api_list",
+     {"kind": "contracts", "pharma_id": "pharma_id", "include": "brands,campaigns.programs"}),
+    ("api.api_list[programs]?fields", "api.api_list",
+     {"kind": "programs", "campaign_id": "campaign_id", "fields": "name,target_list_id", "include": "placements"}),
+]
+# Streams the whole database; measured per contract through EXTRA_GETS instead
+SKIP_ENDPOINTS = {"contracts.export_hierarchy"}
+
+def _brand_form(n):
+    def build(ids, i):
+        return {"name": f"bench contract {i}", "pharma": f"Bench Pharma {n}",
+                "brands": ",".join(f"Bench Brand {n}-{k}" for k in range(n))}
+    return build
+
+# (label, endpoint, url params, form builder); these write to the database
+WRITE_SCENARIOS = [
+    ("contracts.create_contract[5 brands]", "contracts.create_contract", {}, _brand_form(5)),
+    ("contracts.create_contract[50 brands]", "contracts.create_contract", {}, _brand_form(50)),
+    ("clients.create_client[50 brands]", "clients.create_client", {},
+     lambda ids, i: {"name": f"Bench Client {i}", "default_brands": ",".join(f"CB{k}" for k in range(50))}),
+    ("placements.bulk_edit_placements[200 status]", "placements.bulk_edit_placements", {},
+     lambda ids, i: {"placement_ids": [str(ids["placement_id"] + k) for k in range(200)],
+                     "status": "live" if i % 2 else "planned"}),
+]
+
+class QueryCounter:
+    """Counts (and keeps) the statements sent to the engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        self.count = 0
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+def sample_ids():
+    """A mid-table id per parameter, so routes see typical rather than first rows."""
+    ids = {}
+    for param, model in PARAM_MODELS.items():
+        total = db.session.scalar(select(func.count(model.id)))
+        if total:
+            ids[param] = db.session.scalar(select(model.id).order_by(model.id).offset(total // 2).limit(1))
+    return ids
+
+def _resolve(values, ids):
+    return {k: ids.get(v, v) if isinstance(v, str) else v for k, v in values.items()}
+
+def discover(app, ids, include_writes=False):
+    """Return [(label, method, url, form builder)] for everything the run will hit."""
+    targets = []
+    with app.test_request_context():
+        for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.endpoint):
+            if ("GET" not in rule.methods or rule.endpoint in ("static", *SKIP_ENDPOINTS)
+                    or rule.rule.startswith("/_")):
+                continue
+            if any(arg not in ids for arg in rule.arguments):
+                continue
+            targets.append((rule.endpoint, "GET", url_for(rule.endpoint, **{a: ids[a] for a in rule.arguments}), None))
+        for label, endpoint, args in EXTRA_GETS:
+            if endpoint in app.view_functions:
+                targets.append((label, "GET", url_for(endpoint, **_resolve(args, ids)), None))
+        if include_writes:
+            for label, endpoint, params, build in WRITE_SCENARIOS:
+                targets.append((label, "POST", url_for(endpoint, **_resolve(params, ids)), build))
+    return targets
+
+def measure(client, engine, method, url, build, ids, iterations, warmup=1):
+    counter = QueryCounter(engine)
+    latencies, queries = [], []
+    status = None
+    for i in range(warmup + iterations):
+        data = build(ids, i) if build else None
+        with counter:
+            started = time.perf_counter()
+            resp = client.open(url, method=method, data=data)
+            # streamed responses do their work while the body is read
+            resp.get_data()
+            elapsed = (time.perf_counter() - started) * 1000
+        resp.close()
+        status = resp.status_code
+        if i >= warmup:
+            latencies.append(elapsed)
+            queries.append(counter.count)
+    # memory on a separate request: tracemalloc would distort the timings
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        resp = client.open(url, method=method, data=build(ids, warmup + iterations) if build else None)
+        resp.get_data()
+        resp.close()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "method": method, "url": url, "status": status,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "queries": max(queries),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run(app, iterations=20, only=None, include_writes=False, progress=None):
+    """Benchmark every discovered route; ``only`` filters labels by substring."""
+    with app.app_context():
+        ids = sample_ids()
+        counts = {m.__tablename__: db.session.scalar(select(func.count(m.id)))
+                  for m in (Pharma, Brand, Contract, Campaign, Program, Placement, Client, TargetList)}
+        engine = db.engine
+        targets = [t for t in discover(app, ids, include_writes) if not only or any(o in t[0] for o in only)]
+    client = app.test_client()
+    routes = {}
+    for label, method, url, build in targets:
+        routes[label] = measure(client, engine, method, url, build, ids, iterations)
+        if progress:
+            progress(label, routes[label])
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "database": engine.url.render_as_string(hide_password=True),
+            "iterations": iterations,
+            "rows": counts,
+            "pid": os.getpid(),
+        },
+        "routes": routes,
+    }
+
+def compare(old, new, metrics=("p50_ms", "p95_ms", "queries", "peak_kib")):
+    """Yield (label, metric, old, new, pct change) for routes present in both runs."""
+    for label, cur in new["routes"].items():
+        prev = old.get("routes", {}).get(label)
+        if not prev:
+            continue
+        for metric in metrics:
+            a, b = prev.get(metric), cur.get(metric)
+            if a is None or b is None:
+                continue
+            pct = ((b - a) / a * 100) if a else (0.0 if b == a else math.inf)
+            yield label, metric, a, b, pct
+
+def load(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+# scratch table for the concurrency writers; created and dropped by concurrency()
+_concurrency_rows = Table("bench_concurrency", MetaData(),
+                          Column("id", Integer, primary_key=True),
+                          Column("worker", Integer, nullable=False),
+                          Column("payload", String(200)))
+
+def _concurrency_worker(profile, seconds, write_ratio, worker, start, results):
+    os.environ["DB_ENGINE_PROFILE"] = profile
+    from . import create_app
+    app = create_app()
+    rng = random.Random(worker)
+    latency = {"read": [], "write": []}
+    errors = 0
+    page = select(Contract.id, Contract.name).order_by(Contract.id.desc()).limit(50)
+    with app.app_context():
+        engine = db.engine
+        results.put(("ready", worker, None))
+        start.wait()
+        deadline = time.perf_counter() + seconds
+        while True:
+            began = time.perf_counter()
+            if began >= deadline:
+                break
+            kind = "write" if rng.random() < write_ratio else "read"
+            try:
+                if kind == "write":
+                    with engine.begin() as conn:
+                        conn.execute(_concurrency_rows.insert(), {"worker": worker, "payload": "x" * 200})
+                else:
+                    with engine.connect() as conn:
+                        conn.execute(page).all()
+                        conn.execute(select(func.max(_concurrency_rows.c.id))).scalar()
+            except OperationalError:
+                errors += 1
+                continue
+            latency[kind].append((time.perf_counter() - began) * 1000)
+        engine.dispose()
+    results.put(("done", worker, {"latency": latency, "errors": errors}))
+
+def _set_journal_mode(engine, mode):
+    # journal_mode is stored in the database file, so the baseline has to undo WAL explicitly
+    engine.dispose()
+    conn = sqlite3.connect(engine.url.database, timeout=30)
+    try:
+        conn.execute(f"PRAGMA journal_mode={mode}")
+    finally:
+        conn.close()
+
+def concurrency(app, workers=4, seconds=5.0, write_ratio=0.2, profiles=("default", "tuned"), progress=None):
+    """Run the read/write mix once per engine profile; returns JSON-able results."""
+    with app.app_context():
+        engine = db.engine
+        sqlite = engine.dialect.name == "sqlite"
+        _concurrency_rows.create(engine, checkfirst=True)
+        database = engine.url.render_as_string(hide_password=True)
+    ctx = multiprocessing.get_context("spawn")
+    out = {}
+    try:
+        for profile in profiles:
+            if sqlite:
+                _set_journal_mode(engine, app.config["SQLITE_JOURNAL_MODE"] if profile == "tuned" else "DELETE")
+            start, results = ctx.Event(), ctx.Queue()
+            procs = [ctx.Process(target=_concurrency_worker, args=(profile, seconds, write_ratio, w, start, results))
+                     for w in range(workers)]
+            for p in procs:
+                p.start()
+            for _ in procs:
+                results.get()
+            start.set()
+            runs = [results.get()[2] for _ in procs]
+            for p in procs:
+                p.join()
+            reads = [ms for r in runs for ms in r["latency"]["read"]]
+            writes = [ms for r in runs for ms in r["latency"]["write"]]
+            out[profile] = {
+                "reads_per_sec": round(len(reads) / seconds, 1),
+                "writes_per_sec": round(len(writes) / seconds, 1),
+                "read_p50_ms": round(_percentile(reads, 50), 2) if reads else None,
+                "read_p95_ms": round(_percentile(reads, 95), 2) if reads else None,
+                "write_p50_ms": round(_percentile(writes, 50), 2) if writes else None,
+                "write_p95_ms": round(_percentile(writes, 95), 2) if writes else None,
+                "errors": sum(r["errors"] for r in runs),
+            }
+            if progress:
+                progress(profile, out[profile])
+    finally:
+        with app.app_context():
+            if sqlite:
+                _set_journal_mode(db.engine, app.config["SQLITE_JOURNAL_MODE"]
+                                  if app.config["DB_ENGINE_PROFILE"] == "tuned" else "DELETE")
+            _concurrency_rows.drop(db.engine, checkfirst=True)
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "database": database,
+            "workers": workers,
+            "seconds": seconds,
+            "write_ratio": write_ratio,
+        },
+        "profiles": out,
+    }
+
+def _m2m_fixture(width):
+    """A scratch pharma → contract → campaign with ``width`` brands and programs, and one placement."""
+    tag = f"bench m2m {os.getpid()}-{time.time_ns()}"
+    pharma = Pharma(name=tag)
+    brands = [Brand(name=f"{tag} brand {i}", pharma=pharma) for i in range(width)]
+    contract = Contract(name=tag, pharma=pharma)
+    campaign = Campaign(name=tag, contract=contract)
+    programs = [Program(name=f"{tag} program {i}", campaign=campaign, platform="bench", asset_id="bench")
+                for i in range(width)]
+    placement = Placement(name=tag)
+    db.session.add_all([pharma, contract, campaign, placement, *brands, *programs])
+    db.session.commit()
+    return {"pharma": pharma.id, "contract": contract.id, "campaign": campaign.id, "placement": placement.id,
+            "brand": [b.id for b in brands], "program": [p.id for p in programs]}
+
+def _drop_m2m_fixture(fixture):
+    session = db.session
+    session.execute(contract_brand.delete().where(contract_brand.c.contract_id == fixture["contract"]))
+    session.execute(program_placement.delete().where(program_placement.c.placement_id == fixture["placement"]))
+    for model, ids in ((Placement, [fixture["placement"]]), (Program, fixture["program"]),
+                       (Campaign, [fixture["campaign"]]), (Contract, [fixture["contract"]]),
+                       (Brand, fixture["brand"]), (Pharma, [fixture["pharma"]])):
+        for obj in session.scalars(select(model).where(model.id.in_(ids))):
+            session.delete(obj)
+    session.commit()
+
+# case -> (owner model, owner key in the fixture, relationship, target model, target key)
+M2M_CASES = {
+    "contract.brands": (Contract, "contract", "brands", Brand, "brand"),
+    "placement.programs": (Placement, "placement", "programs", Program, "program"),
+}
+
+def m2m(app, width=200, changed=5, iterations=20, progress=None):
+    """
+    Time edits of a ``width``-wide many-to-many collection that swap
+    ``changed`` links per commit: collection reassignment (what the edit
+    routes used to do) against m2m.sync_links.
+    """
+    from .m2m import sync_links
+
+    def assign(owner, name, target, wanted):
+        setattr(owner, name, db.session.scalars(select(target).where(target.id.in_(wanted))).all())
+
+    def sync(owner, name, target, wanted):
+        sync_links(db.session, owner, name, wanted)
+
+    out = {}
+    with app.app_context():
+        fixture = _m2m_fixture(width)
+        counter = QueryCounter(db.engine)
+        try:
+            for case, (owner_model, owner_key, name, target, target_key) in M2M_CASES.items():
+                pool = fixture[target_key]
+                out[case] = {}
+                for strategy, apply in (("assign", assign), ("sync", sync)):
+                    sync_links(db.session, db.session.get(owner_model, fixture[owner_key]), name, pool)
+                    db.session.commit()
+                    latencies, queries = [], []
+                    for i in range(iterations + 1):
+                        # drop a different window of ``changed`` targets each time, restoring the last one
+                        start = (i * changed) % width
+                        wanted = pool[:start] + pool[start + changed:]
+                        db.session.remove()
+                        with counter:
+                            started = time.perf_counter()
+                            apply(db.session.get(owner_model, fixture[owner_key]), name, target, wanted)
+                            db.session.commit()
+                            elapsed = (time.perf_counter() - started) * 1000
+                        if i:
+                            latencies.append(elapsed)
+                            queries.append(counter.count)
+                    out[case][strategy] = {
+                        "p50_ms": round(_percentile(latencies, 50), 3),
+                        "p95_ms": round(_percentile(latencies, 95), 3),
+                        "queries": max(queries),
+                    }
+                    if progress:
+                        progress(case, strategy, out[case][strategy])
+        finally:
+            db.session.remove()
+            _drop_m2m_fixture(fixture)
+        database = db.engine.url.render_as_string(hide_password=True)
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "database": database,
+            "width": width,
+            "changed": changed,
+            "iterations": iterations,
+        },
+        "cases": out,
+    }
+
+def _lookup_server(results):
+    import logging
+    os.environ["ASYNC_LOOKUPS"] = "1"
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log per request
+    from . import aio, create_app
+    app = create_app()
+    if not aio.enabled(app):
+        results.put(("error", "ASYNC_LOOKUPS could not be enabled (pip install aiosqlite)"))
+        return
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    results.put(("ready", server.server_port))
+    server.serve_forever()
+
+def _lookup_urls(campaigns, pharmas, target_list):
+    urls = [f"/programs/api/target-lists?campaign_id={c}" for c in campaigns]
+    urls += [f"/programs/api/target-lists?campaign_id={c}&current_tl_id={target_list}" for c in campaigns[::2]]
+    urls += [f"/contracts/api/brands/{p}" for p in pharmas]
+    return urls
+
+def _drive(port, paths, seconds, seed, latencies, failures):
+    """GET random ``paths`` back to back until ``seconds`` pass, appending ms per response."""
+    import http.client
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + seconds
+    while True:
+        began = time.perf_counter()
+        if began >= deadline:
+            return
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        try:
+            conn.request("GET", rng.choice(paths))
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except OSError:
+            ok = False
+        finally:
+            conn.close()
+        if ok:
+            latencies.append((time.perf_counter() - began) * 1000)
+        else:
+            failures.append(1)
+
+def lookups(app, clients=16, seconds=5.0, background=0, tiers=("sync", "async"), progress=None):
+    """
+    Concurrent throughput of the form lookups served by the sync handlers
+    and by the /aio tier. One threaded werkzeug server (a separate process,
+    ASYNC_LOOKUPS on) answers both; ``clients`` threads request random
+    target-list and brand lookups for ``seconds`` per tier while
+    ``background`` threads keep rendering the largest contract page.
+    """
+    import threading
+    with app.app_context():
+        session = db.session
+        campaigns = session.scalars(select(Campaign.id).order_by(func.random()).limit(200)).all()
+        pharmas = session.scalars(select(Pharma.id).order_by(func.random()).limit(50)).all()
+        target_list = session.scalar(select(func.max(TargetList.id)))
+        heavy = session.scalar(select(Campaign.contract_id).group_by(Campaign.contract_id)
+                               .order_by(func.count().desc()).limit(1))
+        database = db.engine.url.render_as_string(hide_password=True)
+    paths = _lookup_urls(campaigns, pharmas, target_list)
+    if not paths:
+        raise ValueError("no campaigns or pharmas to look up")
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    server = ctx.Process(target=_lookup_server, args=(results,), daemon=True)
+    server.start()
+    out = {}
+    try:
+        status, port = results.get(timeout=120)
+        if status != "ready":
+            raise RuntimeError(port)
+        for tier in tiers:
+            prefix = "/aio" if tier == "async" else ""
+            tier_paths = [prefix + p for p in paths]
+            _drive(port, tier_paths, 0.5, -1, [], [])  # warm up
+            latencies, failures, rendered = [], [], []
+            threads = [threading.Thread(target=_drive, args=(port, tier_paths, seconds, i, latencies, failures))
+                       for i in range(clients)]
+            if heavy is not None:
+                threads += [threading.Thread(target=_drive, args=(port, [f"/contracts/{heavy}"], seconds, i,
+                                                                    rendered, failures))
+                            for i in range(background)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            out[tier] = {
+                "requests_per_sec": round(len(latencies) / seconds, 1),
+                "p50_ms": round(_percentile(latencies, 50), 2) if latencies else None,
+                "p95_ms": round(_percentile(latencies, 95), 2) if latencies else None,
+                "background_per_sec": round(len(rendered) / seconds, 1),
+                "errors": len(failures),
+            }
+            if progress:
+                progress(tier, out[tier])
+    finally:
+        server.terminate()
+        server.join()
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "database": database,
+            "clients": clients,
+            "seconds": seconds,
+            "background": background,
+        },
+        "tiers": out,
+    }
@@ -0,0 +1,182 @@
+"""
+Set-based bulk edits of placements.
+
+One call applies field values, a date shift and program link additions or
+removals to a set of placement ids, in batches of BATCH_SIZE ids:
+
+* field values and the date shift are one ``UPDATE placement ... WHERE id
+  IN (batch)`` per batch;
+* removed links are one ``DELETE FROM program_placement`` per batch and
+  added links one ``INSERT ... SELECT`` that skips links already present.
+
+Each batch is validated with set queries before and after it is written:
+every id must exist, must be in ``expect_status`` when one is given (so
+"planned → live" does not flip a placement that already went live or was
+paused), and must not end up with start_date after end_date or, after a
+shift, without a date it had (SQLite's date() yields NULL out of range).
+Shifts are limited to MAX_SHIFT_DAYS either way. The caller
+owns the transaction: on BulkEditError it rolls back and nothing changes.
+
+Core statements bypass the flush, so the placement ids are passed to
+changes.mark_changed, and link removals note their rollup owners before the
+links go. Programs are not marked for link changes: as in m2m.sync_links,
+derived tables key program_placement links by the placement.
+"""
+from datetime import date, timedelta
+from sqlalchemy import and_, exists, func, insert, select, update, delete
+from .changes import mark_changed
+from . import rollups
+from .models import Placement, Program, program_placement
+
+BATCH_SIZE = 500
+TEXT_FIELDS = ("status", "channel")
+DATE_FIELDS = ("start_date", "end_date")
+GOAL_FIELDS = ("impression_goal", "click_goal")
+FIELDS = TEXT_FIELDS + DATE_FIELDS + GOAL_FIELDS
+MAX_SHIFT_DAYS = 3650
+
+class BulkEditError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+class BulkEditStats:
+    def __init__(self):
+        self.placements = 0
+        self.updated = 0
+        self.links_added = 0
+        self.links_removed = 0
+
+    def as_dict(self):
+        return {"placements": self.placements, "updated": self.updated,
+                "links_added": self.links_added, "links_removed": self.links_removed}
+
+def coerce_values(values):
+    """Validated column values from ``values`` ({field: raw}); None or "" clears a field."""
+    out, errors = {}, []
+    for field, raw in values.items():
+        if field not in FIELDS:
+            errors.append(f"{field} cannot be bulk edited")
+            continue
+        raw = raw.strip() if isinstance(raw, str) else raw
+        if raw is None or raw == "":
+            out[field] = None
+        elif field in DATE_FIELDS:
+            try:
+                out[field] = raw if isinstance(raw, date) else date.fromisoformat(raw)
+            except (TypeError, ValueError):
+                errors.append(f"{field} must be a YYYY-MM-DD date")
+        elif field in GOAL_FIELDS:
+            try:
+                out[field] = int(raw)
+            except (TypeError, ValueError):
+                errors.append(f"{field} must be a whole number")
+                continue
+            if out[field] < 0:
+                errors.append(f"{field} cannot be negative")
+        else:
+            out[field] = str(raw)
+    if errors:
+        raise BulkEditError(errors)
+    return out
+
+def _shifted(session, column, days):
+    if session.get_bind().dialect.name == "sqlite":
+        # SQLite keeps dates as ISO text, which its date() function shifts
+        return func.date(column, f"{days:+d} days", type_=Placement.start_date.type)
+    return column + timedelta(days=days)
+
+def _dated(session, ids):
+    """{placement id: (has start_date, has end_date)} for ``ids``."""
+    return {pid: (has_start, has_end) for pid, has_start, has_end in session.execute(
+        select(Placement.id, Placement.start_date.isnot(None), Placement.end_date.isnot(None))
+        .where(Placement.id.in_(ids)))}
+
+def _batches(ids):
+    for i in range(0, len(ids), BATCH_SIZE):
+        yield i // BATCH_SIZE + 1, ids[i:i + BATCH_SIZE]
+
+def _sample(ids, limit=10):
+    ids = sorted(ids)
+    more = f" and {len(ids) - limit} more" if len(ids) > limit else ""
+    return ", ".join(map(str, ids[:limit])) + more
+
+def bulk_edit(session, placement_ids, values=None, shift_days=0, add_program_ids=(), remove_program_ids=(),
+              expect_status=None):
+    """
+    Apply the edit to every id in ``placement_ids`` and return BulkEditStats.
+    Raises BulkEditError when any batch fails validation; earlier batches
+    may already be written, so the caller must roll back.
+    """
+    ids = sorted(set(placement_ids))
+    values = coerce_values(values or {})
+    add, remove = set(add_program_ids), set(remove_program_ids)
+    errors = []
+    if not ids:
+        errors.append("select at least one placement")
+    if not (values or shift_days or add or remove):
+        errors.append("nothing to change")
+    if abs(shift_days) > MAX_SHIFT_DAYS:
+        errors.append(f"dates can be shifted by at most {MAX_SHIFT_DAYS} days")
+    elif shift_days and any(field in values for field in DATE_FIELDS):
+        errors.append("set the dates or shift them, not both")
+    if add & remove:
+        errors.append(f"programs both added and removed: {_sample(add & remove)}")
+    if add | remove:
+        unknown = (add | remove) - set(session.scalars(select(Program.id).where(Program.id.in_(add | remove))))
+        if unknown:
+            errors.append(f"unknown programs: {_sample(unknown)}")
+    if errors:
+        raise BulkEditError(errors)
+
+    assignments = dict(values)
+    if shift_days:
+        assignments.update({field: _shifted(session, getattr(Placement, field), shift_days) for field in DATE_FIELDS})
+    if remove:
+        rollups.note_owners(session, "placement", ids)
+
+    stats = BulkEditStats()
+    for n, batch in _batches(ids):
+        found = dict(session.execute(select(Placement.id, Placement.status).where(Placement.id.in_(batch))).all())
+        missing = set(batch) - set(found)
+        if missing:
+            errors.append(f"batch {n}: unknown placements {_sample(missing)}")
+        if expect_status is not None:
+            wrong = {pid for pid, status in found.items() if status != expect_status}
+            if wrong:
+                errors.append(f"batch {n}: not {expect_status!r}: {_sample(wrong)}")
+        if errors:
+            # keep validating the remaining batches, but stop writing
+            continue
+        stats.placements += len(batch)
+        if assignments:
+            if shift_days:
+                dated = _dated(session, batch)
+            stats.updated += session.execute(
+                update(Placement).where(Placement.id.in_(batch)).values(**assignments)
+                .execution_options(synchronize_session=False)).rowcount
+            inverted = session.scalars(select(Placement.id).where(
+                Placement.id.in_(batch), Placement.start_date > Placement.end_date)).all()
+            if inverted:
+                errors.append(f"batch {n}: start_date after end_date for {_sample(inverted)}")
+            if shift_days:
+                lost = {pid for pid, had in _dated(session, batch).items() if had != dated[pid]}
+                if lost:
+                    errors.append(f"batch {n}: shifted dates out of range for {_sample(lost)}")
+        if remove:
+            stats.links_removed += session.execute(delete(program_placement).where(
+                program_placement.c.placement_id.in_(batch),
+                program_placement.c.program_id.in_(remove))).rowcount
+        if add:
+            linked = exists().where(and_(program_placement.c.program_id == Program.id,
+                                         program_placement.c.placement_id == Placement.id))
+            stats.links_added += session.execute(insert(program_placement).from_select(
+                ["program_id", "placement_id"],
+                select(Program.id, Placement.id).join(Placement, Placement.id.in_(batch))
+                .where(Program.id.in_(add), ~linked))
+            ).rowcount
+    if errors:
+        raise BulkEditError(errors)
+
+    mark_changed(session, Placement.__table__.name, ids)
+    return stats
@@ -0,0 +1,131 @@
+"""
+Cached reference lists for form dropdowns (pharmas, brands, contracts, ...).
+
+Each lookup is a name-sorted list of small snapshots carrying only what the
+templates render, so cached values never hold ORM instances bound to a
+finished session. Entries expire after LOOKUP_CACHE_TTL seconds and are
+dropped as soon as a commit touches one of the tables they were built from.
+
+LOOKUP_CACHE_BACKEND selects the store: "lru" (default, per process) or
+"package.module:factory" for a shared store. The factory is called with the
+app and must return an object with get(key), set(key, value, ttl) and
+delete(key); values are plain picklable objects.
+"""
+import importlib
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from .changes import after_commit
+from .models import Pharma, Brand, Contract, Campaign, Program, TargetList
+
+_KEY_PREFIX = "lookup:"
+
+class LRUBackend:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            expires, value = hit
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+def _pharmas():
+    return [SimpleNamespace(id=p.id, name=p.name)
+            for p in Pharma.query.order_by(Pharma.name)]
+
+def _brands():
+    return [SimpleNamespace(id=b.id, name=b.name, pharma_id=b.pharma_id,
+                            pharma=SimpleNamespace(id=b.pharma_id, name=b.pharma.name))
+            for b in Brand.query.options(joinedload(Brand.pharma)).order_by(Brand.name)]
+
+def _contracts():
+    return [SimpleNamespace(id=c.id, name=c.name, pharma_id=c.pharma_id)
+            for c in Contract.query.order_by(Contract.name)]
+
+def _campaigns():
+    return [SimpleNamespace(id=c.id, name=c.name, contract_id=c.contract_id)
+            for c in Campaign.query.order_by(Campaign.name)]
+
+def _programs():
+    return [SimpleNamespace(id=p.id, name=p.name, campaign_id=p.campaign_id)
+            for p in Program.query.order_by(Program.name)]
+
+def _target_lists():
+    return [SimpleNamespace(id=t.id, label=t.label)
+            for t in TargetList.query.order_by(TargetList.uploaded_at.desc())]
+
+# name -> (tables the list is built from, loader)
+LOOKUPS = {
+    "pharmas": (("pharma",), _pharmas),
+    "brands": (("brand", "pharma"), _brands),
+    "contracts": (("contract",), _contracts),
+    "campaigns": (("campaign",), _campaigns),
+    "programs": (("program",), _programs),
+    "target_lists": (("target_list",), _target_lists),
+}
+
+def _backend():
+    return current_app.extensions.get("lookup_cache")
+
+def lookup(name):
+    """Return the cached list for ``name``, loading it from the database on a miss."""
+    tables, loader = LOOKUPS[name]
+    backend = _backend()
+    if backend is None:
+        return loader()
+    key = _KEY_PREFIX + name
+    value = backend.get(key)
+    if value is None:
+        value = loader()
+        backend.set(key, value, current_app.config.get("LOOKUP_CACHE_TTL", 300))
+    return value
+
+def invalidate(*tables):
+    backend = _backend()
+    if backend is None:
+        return
+    for name, (deps, _) in LOOKUPS.items():
+        if not tables or set(deps) & set(tables):
+            backend.delete(_KEY_PREFIX + name)
+
+@after_commit
+def _invalidate_changed(changes):
+    invalidate(*changes)
+
+def _make_backend(app):
+    spec = app.config.get("LOOKUP_CACHE_BACKEND") or "lru"
+    if spec == "lru":
+        return LRUBackend(app.config.get("LOOKUP_CACHE_SIZE", 64))
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr)(app)
+
+def init_app(app):
+    if not app.config.get("LOOKUP_CACHE_TTL"):
+        app.extensions["lookup_cache"] = None
+        return
+    app.extensions["lookup_cache"] = _make_backend(app)
@@ -0,0 +1,68 @@
+"""
+Per-session change tracking for data derived from the core tables
+(search index, lookup caches, rollups).
+
+ORM writes are picked up automatically from each flush. Code that writes
+through Core statements (bulk UPDATE/INSERT) must call mark_changed itself.
+Registered commit handlers run inside the transaction just before COMMIT,
+so derived rows land atomically with the rows they describe; after-commit
+handlers run once the data is durable (cache invalidation).
+"""
+from sqlalchemy import event
+from .extensions import db
+
+_commit_handlers = []
+_after_commit_handlers = []
+
+def on_commit(fn):
+    """Register fn(session, changes) where changes maps table name -> set of ids."""
+    _commit_handlers.append(fn)
+    return fn
+
+def after_commit(fn):
+    """Register fn(changes), called with the same mapping once COMMIT succeeded."""
+    _after_commit_handlers.append(fn)
+    return fn
+
+def mark_changed(session, table, ids):
+    pending = session.info.setdefault("changed_rows", {})
+    pending.setdefault(table, set()).update(ids)
+
+def _after_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__table__", None)
+        obj_id = getattr(obj, "id", None)
+        if table is None or obj_id is None:
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        mark_changed(session, table.name, [obj_id])
+
+def _before_commit(session):
+    session.flush()
+    changes = session.info.pop("changed_rows", None)
+    if not changes:
+        return
+    for fn in _commit_handlers:
+        fn(session, changes)
+    session.info["committed_rows"] = changes
+
+def _after_commit(session):
+    changes = session.info.pop("committed_rows", None)
+    if not changes:
+        return
+    for fn in _after_commit_handlers:
+        fn(changes)
+
+def _discard(session, *args):
+    session.info.pop("changed_rows", None)
+    session.info.pop("committed_rows", None)
+
+def init_app(app):
+    # db.session is process-global, so listeners are attached once
+    if event.contains(db.session, "after_flush", _after_flush):
+        return
+    event.listen(db.session, "after_flush", _after_flush)
+    event.listen(db.session, "before_commit", _before_commit)
+    event.listen(db.session, "after_commit", _after_commit)
+    event.listen(db.session, "after_rollback", _discard)
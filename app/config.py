@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from .engine import engine_options
 
 def _sqlite_uri_for_instance(app):
     db_path = os.path.join(app.instance_path, "app.db").replace('\\', '/')
@@ -14,7 +15,100 @@ def load_config(app):
     else:
         app.config["SQLALCHEMY_DATABASE_URI"] = env_uri
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Engine profile: "tuned" (WAL + pragmas on SQLite, pool settings elsewhere) or "default"
+    app.config["DB_ENGINE_PROFILE"] = os.getenv("DB_ENGINE_PROFILE", "tuned")
+    app.config["SQLITE_JOURNAL_MODE"] = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    app.config["SQLITE_SYNCHRONOUS"] = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    app.config["SQLITE_CACHE_SIZE_KIB"] = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "65536"))
+    app.config["SQLITE_MMAP_SIZE_MB"] = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+    app.config["DB_POOL_SIZE"] = int(os.getenv("DB_POOL_SIZE", "10"))
+    app.config["DB_MAX_OVERFLOW"] = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    app.config["DB_POOL_RECYCLE"] = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    app.config["DB_POOL_TIMEOUT"] = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    app.config["DB_POOL_PRE_PING"] = os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "False", "")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app)
+
+    # Optional read replica for GET list_*/api_* views (see app/replica.py)
+    replica_uri = os.getenv("DATABASE_REPLICA_URL", "").strip()
+    if replica_uri:
+        app.config["SQLALCHEMY_BINDS"] = {"replica": {"url": replica_uri, **engine_options(app, replica_uri)}}
+    app.config["DB_REPLICA_STICKY_SECONDS"] = int(os.getenv("DB_REPLICA_STICKY_SECONDS", "10"))
+    app.config["DB_REPLICA_ENDPOINTS"] = {
+        e.strip() for e in os.getenv("DB_REPLICA_ENDPOINTS", "").split(",") if e.strip()}
     app.config["AWS_REGION"] = os.getenv("AWS_REGION", "us-east-1")
     app.config["S3_BUCKET_NAME"] = os.getenv("S3_BUCKET_NAME", "")
     app.config["S3_PREFIX"] = os.getenv("S3_PREFIX", "target-lists/")
-    app.config["MAX_CONTENT_LENGTH"] = 128 * 1024 * 1024
\ No newline at end of file
+    app.config["MAX_CONTENT_LENGTH"] = 128 * 1024 * 1024
+    # Streaming multipart uploads: part size (MB) and parts in flight per upload
+    app.config["S3_MULTIPART_PART_SIZE"] = int(os.getenv("S3_MULTIPART_PART_SIZE_MB", "8")) * 1024 * 1024
+    app.config["S3_MULTIPART_CONCURRENCY"] = int(os.getenv("S3_MULTIPART_CONCURRENCY", "4"))
+
+    # List views: seconds to reuse a cached row total (0 = always count)
+    app.config["PAGINATION_COUNT_TTL"] = int(os.getenv("PAGINATION_COUNT_TTL", "30"))
+
+    # Full-text search index (FTS5 on SQLite, tsvector on Postgres); off = ILIKE fallback
+    app.config["SEARCH_INDEX_ENABLED"] = os.getenv("SEARCH_INDEX_ENABLED", "1") not in ("0", "false", "False", "")
+
+    # Dropdown lookup cache: TTL seconds (0 disables), "lru" or "module:factory" for a shared store
+    app.config["LOOKUP_CACHE_TTL"] = int(os.getenv("LOOKUP_CACHE_TTL", "300"))
+    app.config["LOOKUP_CACHE_BACKEND"] = os.getenv("LOOKUP_CACHE_BACKEND", "lru")
+    app.config["LOOKUP_CACHE_SIZE"] = int(os.getenv("LOOKUP_CACHE_SIZE", "64"))
+
+    # Per-request SQL instrumentation: Server-Timing, N+1 warnings, /_debug/requests, sampled cProfile
+    app.config["INSTRUMENTATION_ENABLED"] = os.getenv("INSTRUMENTATION_ENABLED", "0") not in ("0", "false", "False", "")
+    app.config["INSTRUMENTATION_DEBUG_ENDPOINT"] = os.getenv("INSTRUMENTATION_DEBUG_ENDPOINT", "0") not in ("0", "false", "False", "")
+    app.config["INSTRUMENTATION_SLOW_MS"] = float(os.getenv("INSTRUMENTATION_SLOW_MS", "500"))
+    app.config["INSTRUMENTATION_N_PLUS_ONE"] = int(os.getenv("INSTRUMENTATION_N_PLUS_ONE", "5"))
+    app.config["INSTRUMENTATION_BUFFER_SIZE"] = int(os.getenv("INSTRUMENTATION_BUFFER_SIZE", "100"))
+    app.config["INSTRUMENTATION_PROFILE_ENDPOINTS"] = {
+        e.strip() for e in os.getenv("INSTRUMENTATION_PROFILE_ENDPOINTS", "").split(",") if e.strip()}
+    app.config["INSTRUMENTATION_PROFILE_RATE"] = float(os.getenv("INSTRUMENTATION_PROFILE_RATE", "0.1"))
+
+    # Background jobs: "thread" (in-process pool), "eager" (run right after commit) or
+    # "external" (only `flask run-jobs` processes the queue)
+    app.config["JOBS_MODE"] = os.getenv("JOBS_MODE", "thread")
+    app.config["JOBS_WORKERS"] = int(os.getenv("JOBS_WORKERS", "2"))
+    app.config["JOBS_POLL_INTERVAL"] = float(os.getenv("JOBS_POLL_INTERVAL", "2"))
+    app.config["JOBS_MAX_ATTEMPTS"] = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+    app.config["JOBS_BACKOFF_SECONDS"] = float(os.getenv("JOBS_BACKOFF_SECONDS", "5"))
+    app.config["JOBS_BACKOFF_MAX"] = float(os.getenv("JOBS_BACKOFF_MAX", "300"))
+    app.config["JOBS_STALE_SECONDS"] = int(os.getenv("JOBS_STALE_SECONDS", "3600"))
+    app.config["JOBS_SPOOL_DIR"] = os.getenv("JOBS_SPOOL_DIR") or os.path.join(app.instance_path, "spool")
+
+    # Target list identifier index: where the sorted id arrays live, which header holds the id
+    app.config["AUDIENCE_DIR"] = os.getenv("AUDIENCE_DIR") or os.path.join(app.instance_path, "audience")
+    app.config["AUDIENCE_ID_COLUMNS"] = [
+        c.strip() for c in os.getenv("AUDIENCE_ID_COLUMNS", "npi,hcp_npi,npi_number,npi_id").split(",") if c.strip()]
+    app.config["AUDIENCE_CHUNK_ROWS"] = int(os.getenv("AUDIENCE_CHUNK_ROWS", "500000"))
+
+    # Target list overlap: cached pair counts / loaded id arrays, and the matrix endpoint's list limit
+    app.config["OVERLAP_CACHE_SIZE"] = int(os.getenv("OVERLAP_CACHE_SIZE", "250000"))
+    app.config["OVERLAP_ARRAY_CACHE_SIZE"] = int(os.getenv("OVERLAP_ARRAY_CACHE_SIZE", "512"))
+    app.config["OVERLAP_CACHE_TTL"] = int(os.getenv("OVERLAP_CACHE_TTL", "86400"))
+    app.config["OVERLAP_MAX_LISTS"] = int(os.getenv("OVERLAP_MAX_LISTS", "500"))
+
+    # S3-compatible endpoint override (MinIO, moto server) for local testing
+    app.config["S3_ENDPOINT_URL"] = os.getenv("S3_ENDPOINT_URL", "")
+    # Presigned GET URLs are reused until this many seconds before they expire
+    app.config["S3_PRESIGN_CACHE_MARGIN"] = int(os.getenv("S3_PRESIGN_CACHE_MARGIN", "60"))
+    app.config["S3_PRESIGN_CACHE_SIZE"] = int(os.getenv("S3_PRESIGN_CACHE_SIZE", "1024"))
+    # Direct browser-to-S3 uploads (bucket CORS must allow POST/PUT from the app origin and expose ETag)
+    app.config["S3_DIRECT_UPLOADS"] = os.getenv("S3_DIRECT_UPLOADS", "0") not in ("0", "false", "False", "")
+    app.config["S3_DIRECT_POST_MAX_MB"] = int(os.getenv("S3_DIRECT_POST_MAX_MB", "64"))
+    app.config["S3_DIRECT_UPLOAD_EXPIRES"] = int(os.getenv("S3_DIRECT_UPLOAD_EXPIRES", "3600"))
+
+    # Shared S3 client: connection pool (cover JOBS_WORKERS × S3_MULTIPART_CONCURRENCY plus
+    # request threads), retry policy ("standard" or "adaptive") and socket timeouts
+    app.config["S3_MAX_POOL_CONNECTIONS"] = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+    app.config["S3_RETRY_MODE"] = os.getenv("S3_RETRY_MODE", "standard")
+    app.config["S3_MAX_ATTEMPTS"] = int(os.getenv("S3_MAX_ATTEMPTS", "5"))
+    app.config["S3_CONNECT_TIMEOUT"] = float(os.getenv("S3_CONNECT_TIMEOUT", "5"))
+    app.config["S3_READ_TIMEOUT"] = float(os.getenv("S3_READ_TIMEOUT", "60"))
+
+    # Hierarchy export: rows fetched from the server-side cursor and encoded per chunk
+    app.config["EXPORT_BATCH_SIZE"] = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+    # Async lookup tier (see app/aio.py): async twins of the form lookups under /aio via SQLAlchemy asyncio
+    app.config["ASYNC_LOOKUPS"] = os.getenv("ASYNC_LOOKUPS", "0") not in ("0", "false", "False", "")
+    app.config["ASYNC_DATABASE_URL"] = os.getenv("ASYNC_DATABASE_URL", "").strip()
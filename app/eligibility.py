@@ -0,0 +1,92 @@
+"""
+Materialized target-list eligibility per campaign.
+
+A target list is eligible for a campaign when it is mapped to the campaign's
+contract pharma and to at least one of the contract's brands. The pairs live
+in ``target_list_eligibility`` so the program form and
+/programs/api/target-lists answer with one indexed lookup instead of walking
+Campaign → Contract → brands and running two EXISTS subqueries.
+
+Rows are recomputed for just the affected campaigns / target lists inside
+the committing transaction (see changes.on_commit).
+"""
+from sqlalchemy import select, delete, insert, exists
+from .extensions import db
+from .changes import on_commit
+from .models import (Campaign, Contract, TargetList, contract_brand, brand_target_list,
+                     pharma_target_list, target_list_eligibility)
+
+_CHUNK = 500
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i:i + _CHUNK]
+
+def _eligible_pairs():
+    return (select(Campaign.id, brand_target_list.c.target_list_id)
+            .join(Contract, Contract.id == Campaign.contract_id)
+            .join(contract_brand, contract_brand.c.contract_id == Contract.id)
+            .join(brand_target_list, brand_target_list.c.brand_id == contract_brand.c.brand_id)
+            .join(pharma_target_list,
+                  (pharma_target_list.c.target_list_id == brand_target_list.c.target_list_id)
+                  & (pharma_target_list.c.pharma_id == Contract.pharma_id))
+            .distinct())
+
+def _refill(session, column, filter_column, ids):
+    for chunk in _chunks(ids):
+        session.execute(delete(target_list_eligibility).where(column.in_(chunk)))
+        session.execute(insert(target_list_eligibility).from_select(
+            ["campaign_id", "target_list_id"], _eligible_pairs().where(filter_column.in_(chunk))))
+
+def refresh_campaigns(session, campaign_ids):
+    _refill(session, target_list_eligibility.c.campaign_id, Campaign.id, campaign_ids)
+
+def refresh_target_lists(session, target_list_ids):
+    _refill(session, target_list_eligibility.c.target_list_id,
+            brand_target_list.c.target_list_id, target_list_ids)
+
+def rebuild(session):
+    session.execute(delete(target_list_eligibility))
+    session.execute(insert(target_list_eligibility).from_select(
+        ["campaign_id", "target_list_id"], _eligible_pairs()))
+
+@on_commit
+def _sync(session, changes):
+    campaigns = set(changes.get("campaign", ()))
+    contracts = set(changes.get("contract", ()))
+    # a pharma's target list links decide eligibility for every campaign under its contracts
+    # (removed links are already gone from pharma_target_list, so go by contract)
+    for chunk in _chunks(changes.get("pharma", ())):
+        contracts.update(session.scalars(select(Contract.id).where(Contract.pharma_id.in_(chunk))))
+    brands = changes.get("brand")
+    if brands:
+        for chunk in _chunks(brands):
+            contracts.update(session.scalars(
+                select(contract_brand.c.contract_id).where(contract_brand.c.brand_id.in_(chunk))))
+    for chunk in _chunks(contracts):
+        campaigns.update(session.scalars(select(Campaign.id).where(Campaign.contract_id.in_(chunk))))
+    if campaigns:
+        refresh_campaigns(session, campaigns)
+    if changes.get("target_list"):
+        refresh_target_lists(session, changes["target_list"])
+
+def eligible_target_lists_stmt(campaign_id):
+    """SELECT of the eligible TargetLists for ``campaign_id``, ordered by label (shared with app/aio.py)."""
+    return (select(TargetList)
+            .join(target_list_eligibility, target_list_eligibility.c.target_list_id == TargetList.id)
+            .where(target_list_eligibility.c.campaign_id == campaign_id)
+            .order_by(TargetList.label))
+
+def eligible_target_lists(campaign_id):
+    """Eligible TargetLists for ``campaign_id``, ordered by label."""
+    return db.session.scalars(eligible_target_lists_stmt(campaign_id)).all()
+
+def init_app(app):
+    # Fill the table the first time it appears next to existing mappings
+    with app.app_context():
+        session = db.session
+        empty = not session.scalar(select(exists().select_from(target_list_eligibility)))
+        if empty and session.scalar(select(exists().select_from(brand_target_list))):
+            rebuild(session)
+            session.commit()
@@ -0,0 +1,73 @@
+"""
+Database engine profile.
+
+DB_ENGINE_PROFILE=tuned (the default) configures the engine for several
+gunicorn workers sharing one database:
+
+* SQLite: every new DBAPI connection runs the SQLITE_* pragmas below through
+  a "connect" event. journal_mode=WAL lets readers carry on while one
+  writer commits, busy_timeout makes a second writer wait for the lock
+  instead of failing with "database is locked", and synchronous=NORMAL
+  (safe under WAL) drops the fsync from every commit.
+* Other databases (Postgres): pool size, overflow, recycle, timeout and
+  pool_pre_ping come from the DB_POOL_* settings as SQLALCHEMY_ENGINE_OPTIONS.
+
+DB_ENGINE_PROFILE=default leaves the driver defaults alone (used by
+`flask bench-concurrency` as the baseline).
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from .extensions import db
+
+PROFILES = ("tuned", "default")
+
+def _is_sqlite(uri):
+    return make_url(uri).get_backend_name() == "sqlite"
+
+def _is_memory(uri):
+    return make_url(uri).database in (None, "", ":memory:")
+
+def engine_options(app, uri=None):
+    """Engine options for ``uri`` (default: the primary) under the configured profile."""
+    cfg = app.config
+    if cfg["DB_ENGINE_PROFILE"] != "tuned" or _is_sqlite(uri or cfg["SQLALCHEMY_DATABASE_URI"]):
+        return {}
+    return {
+        "pool_size": cfg["DB_POOL_SIZE"],
+        "max_overflow": cfg["DB_MAX_OVERFLOW"],
+        "pool_recycle": cfg["DB_POOL_RECYCLE"],
+        "pool_timeout": cfg["DB_POOL_TIMEOUT"],
+        "pool_pre_ping": cfg["DB_POOL_PRE_PING"],
+    }
+
+def sqlite_pragmas(cfg, uri):
+    """(pragma, value) pairs run on each new SQLite connection."""
+    pragmas = [("busy_timeout", cfg["SQLITE_BUSY_TIMEOUT_MS"])]
+    if not _is_memory(uri):
+        pragmas.append(("journal_mode", cfg["SQLITE_JOURNAL_MODE"]))
+        pragmas.append(("mmap_size", cfg["SQLITE_MMAP_SIZE_MB"] * 1024 * 1024))
+    pragmas.append(("synchronous", cfg["SQLITE_SYNCHRONOUS"]))
+    # negative cache_size is in KiB rather than pages
+    pragmas.append(("cache_size", -cfg["SQLITE_CACHE_SIZE_KIB"]))
+    return pragmas
+
+def configure_sqlite(engine, pragmas):
+    """Run ``pragmas`` on every connection ``engine`` opens from now on."""
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    event.listen(engine, "connect", _on_connect)
+
+def init_app(app):
+    """Must run before the first connection (i.e. before db.create_all())."""
+    if app.config["DB_ENGINE_PROFILE"] != "tuned":
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            uri = engine.url.render_as_string(hide_password=False)
+            if _is_sqlite(uri):
+                configure_sqlite(engine, sqlite_pragmas(app.config, uri))
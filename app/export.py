@@ -0,0 +1,164 @@
+"""
+Streaming export of the Contract → Campaign → Program → Placement hierarchy
+as CSV or Parquet.
+
+One row per program placement, with outer joins so contracts, campaigns
+and programs with nothing underneath still get a row. The first columns
+match what app/importer.py reads, so an export can be imported elsewhere;
+ids and goals follow.
+
+The SELECT runs with yield_per, so rows arrive from a server-side cursor
+(stream_results) in batches of EXPORT_BATCH_SIZE. Each batch looks up its
+contracts' brands with one IN query, is encoded, handed to the caller and
+dropped, so memory depends on the batch size and not on the export size.
+Rows follow contract id and then the (contract, name) indexes, which lets
+the database stream them without sorting the whole result first.
+
+Parquet is written with pyarrow (in requirements.txt), one row group per
+batch; without it, check_format() reports the format as unavailable.
+"""
+import csv
+import io
+from sqlalchemy import bindparam, select
+from .extensions import db
+from .models import Pharma, Brand, Contract, Campaign, Program, Placement, TargetList, contract_brand, program_placement
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = pq = None
+
+FORMATS = ("csv", "parquet")
+MIMETYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+# (name, pyarrow type); the first thirteen are the importer's columns
+COLUMNS = (
+    ("pharma", "string"), ("brands", "string"), ("contract", "string"), ("campaign", "string"),
+    ("program", "string"), ("platform", "string"), ("asset_id", "string"), ("target_list", "string"),
+    ("placement", "string"), ("channel", "string"), ("status", "string"),
+    ("start_date", "date32"), ("end_date", "date32"),
+    ("pharma_id", "int64"), ("contract_id", "int64"), ("campaign_id", "int64"), ("program_id", "int64"),
+    ("placement_id", "int64"), ("impression_goal", "int64"), ("click_goal", "int64"),
+)
+HEADER = [name for name, _ in COLUMNS]
+
+_BRANDS = (select(contract_brand.c.contract_id, Brand.name)
+           .join(Brand, Brand.id == contract_brand.c.brand_id)
+           .where(contract_brand.c.contract_id.in_(bindparam("ids", expanding=True)))
+           .order_by(contract_brand.c.contract_id, Brand.name))
+
+class ExportUnavailable(RuntimeError):
+    """The requested format needs an optional dependency that is not installed."""
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    if fmt == "parquet" and pa is None:
+        raise ExportUnavailable("Parquet export needs pyarrow (pip install pyarrow)")
+
+def hierarchy_query(pharma_id=None, contract_ids=None):
+    stmt = (select(Pharma.name, Contract.name, Campaign.name, Program.name, Program.platform, Program.asset_id,
+                   TargetList.label, Placement.name, Placement.channel, Placement.status,
+                   Placement.start_date, Placement.end_date,
+                   Pharma.id, Contract.id, Campaign.id, Program.id, Placement.id,
+                   Placement.impression_goal, Placement.click_goal)
+            .select_from(Contract)
+            .join(Pharma, Pharma.id == Contract.pharma_id)
+            .outerjoin(Campaign, Campaign.contract_id == Contract.id)
+            .outerjoin(Program, Program.campaign_id == Campaign.id)
+            .outerjoin(TargetList, TargetList.id == Program.target_list_id)
+            .outerjoin(program_placement, program_placement.c.program_id == Program.id)
+            .outerjoin(Placement, Placement.id == program_placement.c.placement_id)
+            .order_by(Contract.id, Campaign.name, Campaign.id, Program.name, Program.id,
+                      program_placement.c.placement_id))
+    if pharma_id:
+        stmt = stmt.where(Contract.pharma_id == pharma_id)
+    if contract_ids:
+        stmt = stmt.where(Contract.id.in_(contract_ids))
+    return stmt
+
+def iter_batches(batch_size, pharma_id=None, contract_ids=None, session=None):
+    """Yield lists of export rows (tuples in HEADER order), ``batch_size`` rows at a time."""
+    session = session or db.session
+    stmt = hierarchy_query(pharma_id, contract_ids).execution_options(yield_per=batch_size)
+    result = session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            brands = {}
+            owners = list({row[13] for row in partition})
+            # stream_results keeps the cursor open, so this runs on its own short statement
+            for contract_id, name in session.execute(_BRANDS, {"ids": owners}):
+                brands.setdefault(contract_id, []).append(name)
+            yield [(row[0], ";".join(brands.get(row[13], ())), *row[1:]) for row in partition]
+    finally:
+        result.close()
+
+def iter_csv(batches):
+    """CSV (with header) as UTF-8 chunks, one per batch."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(HEADER)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose buffered bytes are taken after each row group."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        out = b"".join(self.chunks)
+        self.chunks.clear()
+        return out
+
+def iter_parquet(batches):
+    """Parquet as byte chunks, one row group per batch; the footer comes last."""
+    check_format("parquet")
+    schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in COLUMNS])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+def stream(fmt, batch_size, pharma_id=None, contract_ids=None, stats=None):
+    """
+    Encoded chunks of the export in ``fmt``. ``stats``, if given, is a dict
+    updated with the running "rows" count.
+    """
+    check_format(fmt)
+    batches = iter_batches(batch_size, pharma_id=pharma_id, contract_ids=contract_ids)
+    if stats is not None:
+        batches = _counted(batches, stats)
+    return iter_csv(batches) if fmt == "csv" else iter_parquet(batches)
+
+def _counted(batches, stats):
+    stats.setdefault("rows", 0)
+    for batch in batches:
+        stats["rows"] += len(batch)
+        yield batch
@@ -1,6 +1,11 @@
-
-from flask import request
-from sqlalchemy import or_
+import base64
+import json
+import time
+from datetime import date, datetime
+from flask import request, current_app
+from sqlalchemy import or_, and_
+from sqlalchemy.engine import Row
+from . import search
 
 def get_page(default=1):
     try:
@@ -15,11 +20,152 @@ def get_per_page(default=10, max_per=100):
     except Exception:
         return default
 
-def apply_search(query, model, fields):
+def get_cursor():
+    return (request.args.get("cursor") or "").strip() or None
+
+def apply_search(query, model, fields, keys=None):
+    """
+    Filter ``query`` by the ``q`` request arg and return (query, q, keys).
+
+    Served by the full-text index when it is available, in which case rows come
+    back as (entity, search_rank) and ``keys`` leads with relevance; otherwise
+    falls back to ILIKE over ``fields``. ``keys`` is what keyset_paginate needs.
+    """
+    keys = keys or [(model.id, "desc")]
     q = (request.args.get("q") or "").strip()
     if not q:
-        return query, q
+        return query, q, keys
+    ranked = search.ranked_ids(model.__table__.name, q)
+    if ranked is not None:
+        query = query.join(ranked, ranked.c.entity_id == model.id).add_columns(ranked.c.search_rank)
+        return query, q, [(ranked.c.search_rank, "asc"), (model.id, "desc")]
     clauses = []
     for f in fields:
         clauses.append(getattr(model, f).ilike(f"%{q}%"))
-    return query.filter(or_(*clauses)), q
+    return query.filter(or_(*clauses)), q, keys
+
+# -------- Keyset (cursor) pagination --------
+
+def _jsonable(v):
+    if isinstance(v, datetime):
+        return {"dt": v.isoformat()}
+    if isinstance(v, date):
+        return {"d": v.isoformat()}
+    return v
+
+def _from_jsonable(v):
+    if isinstance(v, dict):
+        if "dt" in v:
+            return datetime.fromisoformat(v["dt"])
+        if "d" in v:
+            return date.fromisoformat(v["d"])
+    return v
+
+def encode_cursor(values, direction="n"):
+    """Pack key values into an opaque, URL-safe token. direction is 'n'ext or 'p'rev."""
+    raw = json.dumps([direction, [_jsonable(v) for v in values]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; returns (direction, values) or None for a bad token."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        direction, values = json.loads(raw)
+        if direction not in ("n", "p") or not isinstance(values, list):
+            return None
+        return direction, [_from_jsonable(v) for v in values]
+    except Exception:
+        return None
+
+_count_cache = {}
+
+def cached_count(query, ttl=None):
+    """
+    query.count(), memoised per process for ``ttl`` seconds (PAGINATION_COUNT_TTL).
+    Totals are informational only, so a briefly stale number is fine.
+    """
+    ttl = current_app.config.get("PAGINATION_COUNT_TTL", 30) if ttl is None else ttl
+    if not ttl:
+        return query.count()
+    compiled = query.statement.compile()
+    key = (str(compiled), tuple(sorted((k, repr(v)) for k, v in compiled.params.items())))
+    now = time.monotonic()
+    hit = _count_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    total = query.count()
+    if len(_count_cache) >= 512:
+        _count_cache.clear()
+    _count_cache[key] = (now + ttl, total)
+    return total
+
+class KeysetPage:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def _seek_clause(keys, values, forward):
+    """Row-value comparison (k1, k2, ...) past ``values``, expanded for mixed directions."""
+    ors = []
+    for i, (col, direction) in enumerate(keys):
+        descending = (direction == "desc") == forward
+        step = col < values[i] if descending else col > values[i]
+        ors.append(and_(*[keys[j][0] == values[j] for j in range(i)], step))
+    return or_(*ors)
+
+def keyset_paginate(query, keys, per_page, cursor=None, with_total=True):
+    """
+    Paginate ``query`` by seeking past the last row seen instead of OFFSET.
+
+    ``keys`` is a list of (column, "asc"|"desc") pairs whose last entry must be
+    unique (normally the primary key). Rows inserted while a user pages never
+    shift or duplicate the rows on later pages.
+    """
+    decoded = decode_cursor(cursor)
+    if decoded and len(decoded[1]) != len(keys):
+        decoded = None
+    backwards = bool(decoded) and decoded[0] == "p"
+
+    total = cached_count(query.order_by(None)) if with_total else None
+
+    ordering = []
+    for col, direction in keys:
+        descending = (direction == "desc") != backwards
+        ordering.append(col.desc() if descending else col.asc())
+    page_q = query.order_by(None).order_by(*ordering)
+    if decoded:
+        page_q = page_q.filter(_seek_clause(keys, decoded[1], forward=not backwards))
+    rows = page_q.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def values_of(row):
+        # ranked searches yield (entity, search_rank) rows
+        if isinstance(row, Row):
+            return [row._mapping[col.key] if col.key in row._mapping else getattr(row[0], col.key)
+                    for col, _ in keys]
+        return [getattr(row, col.key) for col, _ in keys]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backwards:
+            next_cursor = encode_cursor(values_of(rows[-1]), "n")
+        if decoded and (more or not backwards):
+            prev_cursor = encode_cursor(values_of(rows[0]), "p")
+    items = [r[0] if isinstance(r, Row) else r for r in rows]
+    return KeysetPage(items, per_page, next_cursor, prev_cursor, total)
@@ -0,0 +1,288 @@
+"""
+Bulk import of the Pharma → Brand → Contract → Campaign → Program → Placement
+hierarchy from CSV or JSON.
+
+Rows are streamed and handled in batches: every name in a batch is resolved
+against in-memory name→id maps, misses are looked up with one IN query per
+entity, and whatever is still missing is inserted with a single executemany
+INSERT ... RETURNING. Each batch commits on its own.
+
+Columns (CSV header or JSON keys): pharma, contract, brands (';' separated),
+campaign, program, platform, asset_id, target_list (label of an existing
+list), placement, channel, status, start_date, end_date. Only pharma and
+contract are required; deeper levels are created when their name is given.
+"""
+import csv
+import io
+import json
+import time
+from datetime import date
+from sqlalchemy import select, insert, tuple_
+from .extensions import db
+from .changes import mark_changed
+from . import jobs
+from .models import (Pharma, Brand, Contract, Campaign, Program, Placement, TargetList,
+                     contract_brand, program_placement)
+
+DEFAULT_BATCH_SIZE = 1000
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.skipped = 0
+        self.created = {"pharma": 0, "brand": 0, "contract": 0, "campaign": 0,
+                        "program": 0, "placement": 0, "contract_brand": 0, "program_placement": 0}
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {"rows": self.rows, "skipped": self.skipped, "created": dict(self.created),
+                "errors": self.errors[:50], "elapsed_s": round(self.elapsed, 3),
+                "rows_per_sec": round(self.rows_per_sec, 1)}
+
+def _clean(v):
+    return (str(v).strip() if v is not None else "") or None
+
+def _parse_date(s):
+    try:
+        return date.fromisoformat(s) if s else None
+    except ValueError:
+        return None
+
+def iter_rows(fileobj, fmt=None):
+    """Yield dict rows from a binary file object. fmt is 'csv' or 'json' (JSON array or JSON lines)."""
+    text_stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for row in csv.DictReader(text_stream):
+            yield {(k or "").strip().lower(): v for k, v in row.items()}
+        return
+    first = text_stream.read(1)
+    while first and first.isspace():
+        first = text_stream.read(1)
+    if first == "[":
+        # a JSON array has to be parsed whole; JSON lines stream
+        for row in json.loads(first + text_stream.read()):
+            yield {k.lower(): v for k, v in row.items()}
+        return
+    pending = first
+    for line in text_stream:
+        line = (pending + line).strip()
+        pending = ""
+        if line:
+            yield {k.lower(): v for k, v in json.loads(line).items()}
+
+class _Resolver:
+    """Name→id maps that survive across batches of one import."""
+
+    def __init__(self, session, stats):
+        self.session = session
+        self.stats = stats
+        self.pharmas = {}      # name -> id
+        self.brands = {}       # (pharma_id, name) -> id
+        self.contracts = {}    # (pharma_id, name) -> id
+        self.campaigns = {}    # (contract_id, name) -> id
+        self.programs = {}     # (campaign_id, name) -> id
+        self.placements = {}   # (contract_id, name) -> id
+        self.target_lists = {} # label -> id
+        self.contract_brands = set()
+        self.program_placements = set()
+
+    def _insert(self, model, table_key, rows, key_cols):
+        """
+        executemany INSERT ... RETURNING id plus the key columns. Ids are paired
+        back by key rather than parameter order, which keeps SQLite on the
+        batched insertmanyvalues path.
+        """
+        if not rows:
+            return []
+        returned = self.session.execute(insert(model).returning(model.id, *key_cols), rows).all()
+        self.stats.created[table_key] += len(returned)
+        mark_changed(self.session, model.__table__.name, [r[0] for r in returned])
+        return returned
+
+    def pharma_ids(self, names):
+        missing = {n for n in names if n not in self.pharmas}
+        if missing:
+            for pid, name in self.session.execute(
+                    select(Pharma.id, Pharma.name).where(Pharma.name.in_(missing))):
+                self.pharmas[name] = pid
+            new = sorted(n for n in missing if n not in self.pharmas)
+            for pid, name in self._insert(Pharma, "pharma", [{"name": n} for n in new], [Pharma.name]):
+                self.pharmas[name] = pid
+
+    def keyed(self, cache, model, parent_col, keys, table_key, extra=None):
+        """Resolve (parent_id, name) keys for a model scoped by its parent FK."""
+        missing = {k for k in keys if k not in cache}
+        if not missing:
+            return
+        parents = {p for p, _ in missing}
+        names = {n for _, n in missing}
+        for row_id, parent_id, name in self.session.execute(
+                select(model.id, parent_col, model.name)
+                .where(parent_col.in_(parents), model.name.in_(names))):
+            cache.setdefault((parent_id, name), row_id)
+        new = sorted(k for k in missing if k not in cache)
+        rows = [dict({parent_col.key: p, "name": n}, **((extra or {}).get((p, n), {}))) for p, n in new]
+        for row_id, parent_id, name in self._insert(model, table_key, rows, [parent_col, model.name]):
+            cache[(parent_id, name)] = row_id
+
+    def target_list_ids(self, labels):
+        missing = {l for l in labels if l not in self.target_lists}
+        if missing:
+            for tl_id, label in self.session.execute(
+                    select(TargetList.id, TargetList.label).where(TargetList.label.in_(missing))):
+                self.target_lists.setdefault(label, tl_id)
+            for label in missing:
+                self.target_lists.setdefault(label, None)
+
+    def placement_ids(self, keys, extra):
+        missing = {k for k in keys if k not in self.placements}
+        if not missing:
+            return
+        contract_ids = {c for c, _ in missing}
+        names = {n for _, n in missing}
+        existing = self.session.execute(
+            select(Placement.id, Campaign.contract_id, Placement.name)
+            .join(program_placement, program_placement.c.placement_id == Placement.id)
+            .join(Program, Program.id == program_placement.c.program_id)
+            .join(Campaign, Campaign.id == Program.campaign_id)
+            .where(Campaign.contract_id.in_(contract_ids), Placement.name.in_(names)))
+        for pl_id, contract_id, name in existing:
+            self.placements.setdefault((contract_id, name), pl_id)
+        new = sorted(k for k in missing if k not in self.placements)
+        # placements carry no contract column, so ids are paired back by name;
+        # split the inserts into rounds in which every name is unique
+        while new:
+            seen, this_round, rest = set(), [], []
+            for key in new:
+                (rest if key[1] in seen else this_round).append(key)
+                seen.add(key[1])
+            by_name = {n: c for c, n in this_round}
+            rows = [dict({"name": n}, **extra.get((c, n), {})) for c, n in this_round]
+            for pl_id, name in self._insert(Placement, "placement", rows, [Placement.name]):
+                self.placements[(by_name[name], name)] = pl_id
+            new = rest
+
+    def link(self, table, left, right, pairs, known, table_key, owner):
+        """
+        Insert the (left, right) pairs not already present in an association
+        table. Only the ``owner`` column's side is marked changed, as in
+        m2m.sync_links.
+        """
+        pairs = {p for p in pairs if p not in known}
+        if not pairs:
+            return
+        for l, r in self.session.execute(
+                select(table.c[left], table.c[right])
+                .where(tuple_(table.c[left], table.c[right]).in_(list(pairs)))):
+            known.add((l, r))
+        new = sorted(p for p in pairs if p not in known)
+        if new:
+            self.session.execute(table.insert(), [{left: l, right: r} for l, r in new])
+            known.update(new)
+            self.stats.created[table_key] += len(new)
+            ids = {pair[0 if owner == left else 1] for pair in new}
+            fk = next(iter(table.c[owner].foreign_keys))
+            mark_changed(self.session, fk.column.table.name, ids)
+
+def _import_batch(resolver, batch):
+    stats = resolver.stats
+    resolver.pharma_ids({r["pharma"] for r in batch})
+    for r in batch:
+        r["pharma_id"] = resolver.pharmas[r["pharma"]]
+
+    brand_keys = {(r["pharma_id"], b) for r in batch for b in r["brands"]}
+    resolver.keyed(resolver.brands, Brand, Brand.pharma_id, brand_keys, "brand")
+    resolver.keyed(resolver.contracts, Contract, Contract.pharma_id,
+                    {(r["pharma_id"], r["contract"]) for r in batch}, "contract")
+    for r in batch:
+        r["contract_id"] = resolver.contracts[(r["pharma_id"], r["contract"])]
+    resolver.link(contract_brand, "contract_id", "brand_id",
+                  {(r["contract_id"], resolver.brands[(r["pharma_id"], b)]) for r in batch for b in r["brands"]},
+                  resolver.contract_brands, "contract_brand", owner="contract_id")
+
+    with_campaign = [r for r in batch if r["campaign"]]
+    resolver.keyed(resolver.campaigns, Campaign, Campaign.contract_id,
+                    {(r["contract_id"], r["campaign"]) for r in with_campaign}, "campaign")
+    for r in with_campaign:
+        r["campaign_id"] = resolver.campaigns[(r["contract_id"], r["campaign"])]
+
+    with_program = [r for r in with_campaign if r["program"]]
+    resolver.target_list_ids({r["target_list"] for r in with_program if r["target_list"]})
+    program_extra = {}
+    for r in with_program:
+        program_extra.setdefault((r["campaign_id"], r["program"]), {
+            "platform": r["platform"] or "",
+            "asset_id": r["asset_id"] or "",
+            "target_list_id": resolver.target_lists.get(r["target_list"]) if r["target_list"] else None,
+        })
+    resolver.keyed(resolver.programs, Program, Program.campaign_id, set(program_extra), "program",
+                    extra=program_extra)
+    for r in with_program:
+        r["program_id"] = resolver.programs[(r["campaign_id"], r["program"])]
+
+    with_placement = [r for r in with_program if r["placement"]]
+    placement_extra = {}
+    for r in with_placement:
+        placement_extra.setdefault((r["contract_id"], r["placement"]), {
+            "channel": r["channel"], "status": r["status"],
+            "start_date": _parse_date(r["start_date"]), "end_date": _parse_date(r["end_date"]),
+        })
+    resolver.placement_ids(set(placement_extra), placement_extra)
+    resolver.link(program_placement, "program_id", "placement_id",
+                  {(r["program_id"], resolver.placements[(r["contract_id"], r["placement"])]) for r in with_placement},
+                  resolver.program_placements, "program_placement", owner="placement_id")
+
+def import_hierarchy(fileobj, fmt=None, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Import rows from ``fileobj`` (binary). Returns ImportStats; ``progress``,
+    if given, is called with the stats after every committed batch.
+    """
+    stats = ImportStats()
+    session = db.session
+    resolver = _Resolver(session, stats)
+    batch = []
+
+    def flush_batch():
+        try:
+            _import_batch(resolver, batch)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        batch.clear()
+        stats.elapsed = time.perf_counter() - stats.started
+        if progress:
+            progress(stats)
+
+    for lineno, raw in enumerate(iter_rows(fileobj, fmt), start=1):
+        stats.rows += 1
+        row = {k: _clean(raw.get(k)) for k in (
+            "pharma", "contract", "campaign", "program", "platform", "asset_id",
+            "target_list", "placement", "channel", "status", "start_date", "end_date")}
+        brands = raw.get("brands") or ""
+        if isinstance(brands, str):
+            brands = brands.split(";")
+        row["brands"] = sorted({b.strip() for b in brands if b and b.strip()})
+        if not row["pharma"] or not row["contract"]:
+            stats.skipped += 1
+            stats.errors.append(f"row {lineno}: pharma and contract are required")
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush_batch()
+    if batch:
+        flush_batch()
+    stats.elapsed = time.perf_counter() - stats.started
+    return stats
+
+# Batches commit as they go, so a failed import is reported rather than replayed
+@jobs.handler("import_hierarchy", max_attempts=1)
+def _import_job(payload):
+    with open(payload["spool"], "rb") as fh:
+        return import_hierarchy(fh, fmt=payload["format"], batch_size=payload["batch_size"]).as_dict()
@@ -0,0 +1,176 @@
+"""
+Per-request SQL instrumentation and profiling.
+
+When INSTRUMENTATION_ENABLED is set, every statement sent through the engine
+during a request is counted and timed, grouped by statement shape (the SQL
+with literals and IN-lists collapsed). A shape that repeats
+INSTRUMENTATION_N_PLUS_ONE times or more in one request is reported as a
+likely N+1 and logged. Each response carries a Server-Timing header
+(db / app durations and the statement count).
+
+Requests slower than INSTRUMENTATION_SLOW_MS, or with an N+1 finding, go
+into a ring buffer of INSTRUMENTATION_BUFFER_SIZE entries that
+/_debug/requests serves as JSON when INSTRUMENTATION_DEBUG_ENDPOINT is on.
+Outbound calls reported through record_call() (S3, see s3_utils) get their
+own Server-Timing entry, and /_debug/metrics serves process-wide totals.
+Endpoints listed in INSTRUMENTATION_PROFILE_ENDPOINTS are run under cProfile
+for a INSTRUMENTATION_PROFILE_RATE fraction of requests and the top of the
+profile is attached to their buffer entry.
+"""
+import cProfile
+import io
+import pstats
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import Blueprint, current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from .extensions import db
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)|\((?:\s*%\(\w+\)s\s*,)+\s*%\(\w+\)s\s*\)")
+_SPACE = re.compile(r"\s+")
+_PROFILE_LINES = 25
+
+# cProfile cannot run in two threads at once, so profiled requests take turns
+_profile_lock = threading.Lock()
+
+debug_bp = Blueprint("instrumentation", __name__)
+
+def statement_shape(sql):
+    """Normalize ``sql`` so repeats of one query with different values compare equal."""
+    shape = _LITERALS.sub("?", sql)
+    shape = _IN_LISTS.sub("(?...)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+class RequestStats:
+    """Statement counts and timings collected during one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_ms = 0.0
+        self.shapes = {}
+        self.calls = {}
+
+    def record(self, sql, ms):
+        self.count += 1
+        self.db_ms += ms
+        shape = statement_shape(sql)
+        n, total = self.shapes.get(shape, (0, 0.0))
+        self.shapes[shape] = (n + 1, total + ms)
+
+    def repeated(self, threshold):
+        return sorted(((s, n, ms) for s, (n, ms) in self.shapes.items() if n >= threshold),
+                      key=lambda r: -r[1])
+
+    def slowest(self, limit=5):
+        return sorted(((s, n, ms) for s, (n, ms) in self.shapes.items()), key=lambda r: -r[2])[:limit]
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._instrumentation_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_instrumentation_start", None)
+    stats = g.get("sql_stats") if has_request_context() else None
+    if started is not None and stats is not None:
+        stats.record(statement, (time.perf_counter() - started) * 1000)
+
+def record_call(service, ms):
+    """Count one outbound ``service`` call against the current request, if it is tracked."""
+    stats = g.get("sql_stats") if has_request_context() else None
+    if stats is not None:
+        n, total = stats.calls.get(service, (0, 0.0))
+        stats.calls[service] = (n + 1, total + ms)
+
+def _tracked():
+    return request.endpoint not in (None, "static") and request.blueprint != debug_bp.name
+
+def _before_request():
+    if not _tracked():
+        return
+    g.sql_stats = RequestStats()
+    endpoints = current_app.config["INSTRUMENTATION_PROFILE_ENDPOINTS"]
+    if request.endpoint in endpoints and random.random() < current_app.config["INSTRUMENTATION_PROFILE_RATE"]:
+        if _profile_lock.acquire(blocking=False):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+def _finish_profile():
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return None
+    profiler.disable()
+    _profile_lock.release()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(_PROFILE_LINES)
+    return out.getvalue()
+
+def _after_request(response):
+    stats = g.pop("sql_stats", None)
+    if stats is None:
+        return response
+    profile = _finish_profile()
+    cfg = current_app.config
+    total_ms = (time.perf_counter() - stats.started) * 1000
+    response.headers.add("Server-Timing", f'db;dur={stats.db_ms:.1f};desc="{stats.count} queries"')
+    call_ms = 0.0
+    for service, (n, ms) in stats.calls.items():
+        call_ms += ms
+        response.headers.add("Server-Timing", f'{service};dur={ms:.1f};desc="{n} calls"')
+    response.headers.add("Server-Timing", f"app;dur={max(total_ms - stats.db_ms - call_ms, 0):.1f}")
+    response.headers.add("Server-Timing", f"total;dur={total_ms:.1f}")
+
+    repeated = stats.repeated(cfg["INSTRUMENTATION_N_PLUS_ONE"])
+    for shape, n, ms in repeated:
+        current_app.logger.warning("possible N+1 in %s: %d× %.1fms %s", request.endpoint, n, ms, shape[:200])
+    if total_ms >= cfg["INSTRUMENTATION_SLOW_MS"] or repeated or profile:
+        current_app.extensions["instrumentation"].append({
+            "at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 1),
+            "db_ms": round(stats.db_ms, 1),
+            "queries": stats.count,
+            "calls": {s: {"count": n, "ms": round(ms, 1)} for s, (n, ms) in stats.calls.items()},
+            "n_plus_one": [{"sql": s, "count": n, "ms": round(ms, 1)} for s, n, ms in repeated],
+            "slowest": [{"sql": s, "count": n, "ms": round(ms, 1)} for s, n, ms in stats.slowest()],
+            "profile": profile,
+        })
+    return response
+
+def _teardown_request(exc):
+    # after_request is skipped when a view raises; still release the profiler
+    if g.get("profiler") is not None:
+        _finish_profile()
+
+@debug_bp.route("/_debug/requests")
+def recent_requests():
+    entries = list(current_app.extensions["instrumentation"])
+    entries.reverse()
+    return jsonify(entries)
+
+@debug_bp.route("/_debug/metrics")
+def metrics():
+    s3 = current_app.extensions.get("s3")
+    return jsonify({"s3": s3.stats() if s3 is not None else None})
+
+def init_app(app):
+    if not app.config["INSTRUMENTATION_ENABLED"]:
+        return
+    app.extensions["instrumentation"] = deque(maxlen=app.config["INSTRUMENTATION_BUFFER_SIZE"])
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+                event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    if app.config["INSTRUMENTATION_DEBUG_ENDPOINT"]:
+        app.register_blueprint(debug_bp)
@@ -0,0 +1,276 @@
+"""
+Local background job queue backed by the ``job`` table.
+
+Views call enqueue() and commit; the job row is then picked up by a small
+pool of worker threads (started with the first request), by
+`flask run-jobs` in a separate process, or, with JOBS_MODE=eager, inline
+right after the commit. No broker is involved: workers claim rows with a
+conditional UPDATE, so any number of threads and processes can share the
+table.
+
+A handler is registered per job kind with @handler("kind") and called as
+fn(payload) inside an app context; whatever it changes through db.session
+is committed together with the job's "succeeded" status. A handler that
+raises is retried with exponential backoff until max_attempts, after which
+the job is "failed" and the handler's on_failure(payload, error) runs.
+Payloads may name a spooled upload under "spool"; the file is removed once
+the job is finished either way.
+"""
+import json
+import os
+import random
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from werkzeug.utils import secure_filename
+from .extensions import db
+from .changes import after_commit
+from .models import Job
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+_SPOOL_CHUNK = 1024 * 1024
+
+_handlers = {}
+_local = threading.local()
+
+class _Handler:
+    def __init__(self, fn, max_attempts=None, on_failure=None):
+        self.fn = fn
+        self.max_attempts = max_attempts
+        self.on_failure = on_failure
+
+def handler(kind, max_attempts=None, on_failure=None):
+    """Register fn(payload) -> JSON-able result as the runner for ``kind``."""
+    def register(fn):
+        _handlers[kind] = _Handler(fn, max_attempts, on_failure)
+        return fn
+    return register
+
+def spool(file_storage, hasher=None):
+    """
+    Copy an uploaded file to the spool directory and return its path. If
+    ``hasher`` (a hashlib object) is given it is fed the body on the way.
+    """
+    directory = current_app.config["JOBS_SPOOL_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    name = secure_filename(file_storage.filename or "") or "upload"
+    path = os.path.join(directory, f"{uuid.uuid4().hex}-{name}")
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = file_storage.stream.read(_SPOOL_CHUNK)
+                if not chunk:
+                    break
+                if hasher is not None:
+                    hasher.update(chunk)
+                out.write(chunk)
+    finally:
+        file_storage.stream.close()
+    return path
+
+def enqueue(kind, payload, subject=None, max_attempts=None):
+    """Add a job to the current session; it is runnable once the caller commits."""
+    if kind not in _handlers:
+        raise KeyError(f"no job handler registered for {kind!r}")
+    limit = max_attempts or _handlers[kind].max_attempts or current_app.config["JOBS_MAX_ATTEMPTS"]
+    job = Job(kind=kind, status=QUEUED, payload=json.dumps(payload), attempts=0, max_attempts=limit,
+              subject_table=subject[0] if subject else None, subject_id=subject[1] if subject else None,
+              run_after=datetime.utcnow())
+    db.session.add(job)
+    return job
+
+def latest_for(subject_table, subject_ids):
+    """Return {subject_id: newest Job} for the given rows."""
+    ids = list(subject_ids)
+    if not ids:
+        return {}
+    latest = {}
+    rows = (Job.query.filter(Job.subject_table == subject_table, Job.subject_id.in_(ids))
+            .order_by(Job.id))
+    for job in rows:
+        latest[job.subject_id] = job
+    return latest
+
+def as_dict(job):
+    return {
+        "id": job.id, "kind": job.kind, "status": job.status,
+        "attempts": job.attempts, "max_attempts": job.max_attempts,
+        "subject": {"table": job.subject_table, "id": job.subject_id} if job.subject_table else None,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+    }
+
+def _claim(session):
+    # Job state changes go through Core UPDATEs so they never show up as ORM
+    # changes (which would re-trigger the after-commit wake-up below).
+    while True:
+        now = datetime.utcnow()
+        job_id = session.scalar(select(Job.id).where(Job.status == QUEUED, Job.run_after <= now)
+                                .order_by(Job.run_after, Job.id).limit(1))
+        if job_id is None:
+            session.rollback()
+            return None
+        claimed = session.execute(update(Job).where(Job.id == job_id, Job.status == QUEUED)
+                                  .values(status=RUNNING, started_at=now, attempts=Job.attempts + 1)).rowcount
+        session.commit()
+        if claimed:
+            return session.get(Job, job_id, populate_existing=True)
+
+def _backoff(attempt):
+    cfg = current_app.config
+    if cfg["JOBS_MODE"] == "eager":
+        return 0
+    delay = min(cfg["JOBS_BACKOFF_SECONDS"] * 2 ** (attempt - 1), cfg["JOBS_BACKOFF_MAX"])
+    return delay * random.uniform(0.8, 1.2)
+
+def _discard_spool(payload):
+    path = payload.get("spool")
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def run_next():
+    """Claim and run one runnable job; returns its final status, or None if idle."""
+    session = db.session
+    job = _claim(session)
+    if job is None:
+        return None
+    job_id, kind, attempt, limit = job.id, job.kind, job.attempts, job.max_attempts
+    payload = json.loads(job.payload or "{}")
+    entry = _handlers.get(kind)
+    try:
+        if entry is None:
+            raise KeyError(f"no job handler registered for {kind!r}")
+        result = entry.fn(payload)
+        session.execute(update(Job).where(Job.id == job_id).values(
+            status=SUCCEEDED, result=json.dumps(result), error=None, finished_at=datetime.utcnow()))
+        session.commit()
+    except Exception as exc:
+        session.rollback()
+        error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+        current_app.logger.warning("job %s (%s) attempt %d/%d failed: %s", job_id, kind, attempt, limit, error)
+        if attempt < limit:
+            session.execute(update(Job).where(Job.id == job_id).values(
+                status=QUEUED, error=error,
+                run_after=datetime.utcnow() + timedelta(seconds=_backoff(attempt))))
+            session.commit()
+            return QUEUED
+        session.execute(update(Job).where(Job.id == job_id).values(
+            status=FAILED, error=error, finished_at=datetime.utcnow()))
+        session.commit()
+        if entry is not None and entry.on_failure:
+            try:
+                entry.on_failure(payload, error)
+                session.commit()
+            except Exception:
+                session.rollback()
+                current_app.logger.exception("on_failure for job %s failed", job_id)
+        _discard_spool(payload)
+        return FAILED
+    _discard_spool(payload)
+    return SUCCEEDED
+
+def drain(max_jobs=None):
+    """Run jobs until none is runnable (or ``max_jobs`` ran); returns how many ran."""
+    ran = 0
+    while max_jobs is None or ran < max_jobs:
+        if run_next() is None:
+            break
+        ran += 1
+    return ran
+
+def requeue_stale(seconds):
+    """Put back jobs left 'running' by a worker that died."""
+    cutoff = datetime.utcnow() - timedelta(seconds=seconds)
+    n = db.session.execute(update(Job).where(Job.status == RUNNING, Job.started_at < cutoff)
+                           .values(status=QUEUED, run_after=datetime.utcnow())).rowcount
+    db.session.commit()
+    return n
+
+class Worker:
+    """Threads that poll the job table, woken early whenever a job is committed."""
+
+    def __init__(self, app, threads, poll_interval):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            with self.app.app_context():
+                requeue_stale(self.app.config["JOBS_STALE_SECONDS"])
+            for i in range(self.threads):
+                t = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    status = run_next()
+            except Exception:
+                self.app.logger.exception("job worker error")
+                status = None
+            if status is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+@after_commit
+def _wake_on_enqueue(changes):
+    if "job" not in changes:
+        return
+    app = current_app._get_current_object()
+    mode = app.config["JOBS_MODE"]
+    if mode == "thread" and app.config["JOBS_WORKERS"] > 0:
+        worker = app.extensions["jobs"]
+        worker.start()
+        worker.wake()
+    elif mode == "eager" and not getattr(_local, "draining", False):
+        # A fresh app context gets its own session, separate from the one committing
+        _local.draining = True
+        try:
+            with app.app_context():
+                drain()
+        finally:
+            _local.draining = False
+
+def init_app(app):
+    app.extensions["jobs"] = Worker(app, app.config["JOBS_WORKERS"], app.config["JOBS_POLL_INTERVAL"])
+    if app.config["JOBS_MODE"] == "thread" and app.config["JOBS_WORKERS"] > 0:
+        # Started lazily so CLI commands never run uploads in the background
+        @app.before_request
+        def _start_job_worker():
+            if not app.extensions["jobs"].running:
+                app.extensions["jobs"].start()
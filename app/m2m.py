@@ -0,0 +1,66 @@
+"""
+Diff-based updates of many-to-many links.
+
+Assigning a relationship collection (``contract.brands = [...]``) makes the
+ORM load the current collection and every target object, then delete and
+insert secondary rows one by one. sync_links reads only the linked ids from
+the secondary table (contract_brand, program_placement, pharma_target_list,
+brand_target_list, ...), compares them with the wanted ids, and issues at
+most one DELETE ... IN and one executemany INSERT for the difference;
+nothing is written when the two sets already match.
+
+Only the owner's table is passed to changes.mark_changed. Every derived
+table keys link changes by that side (a contract's brands feed its search
+document and eligibility; a placement's programs feed its rollups), and
+marking the targets too would reindex everything that mentions them. The
+importer and bulk_edit follow the same rule for the links they write.
+"""
+from sqlalchemy import delete, inspect, insert, select
+from .changes import mark_changed
+from . import rollups
+
+def _link_columns(owner, name):
+    """(secondary table, owner fk column, target key column, target fk column) of ``owner.<name>``."""
+    prop = inspect(type(owner)).relationships[name]
+    if prop.secondary is None:
+        raise ValueError(f"{type(owner).__name__}.{name} is not a many-to-many relationship")
+    (_, owner_fk), = prop.synchronize_pairs
+    (target_key, target_fk), = prop.secondary_synchronize_pairs
+    return prop, owner_fk, target_key, target_fk
+
+def sync_links(session, owner, name, target_ids, where=()):
+    """
+    Make the many-to-many ``owner.<name>`` hold exactly ``target_ids``. Ids
+    that do not exist or fail the extra ``where`` criteria on the target
+    table are dropped. Returns (added ids, removed ids).
+    """
+    prop, owner_fk, target_key, target_fk = _link_columns(owner, name)
+    if inspect(owner).identity is None:
+        session.flush()
+    owner_id, = inspect(owner).identity
+    wanted = set(target_ids)
+    if wanted:
+        wanted = set(session.scalars(select(target_key).where(target_key.in_(wanted), *where)))
+    current = set(session.scalars(select(target_fk).where(owner_fk == owner_id)))
+    added, removed = wanted - current, current - wanted
+    if not (added or removed):
+        return added, removed
+
+    owner_table = owner.__table__.name
+    if removed:
+        # the links about to go still lead to the owners whose rollups change
+        rollups.note_owners(session, owner_table, [owner_id])
+        session.execute(delete(prop.secondary).where(owner_fk == owner_id, target_fk.in_(removed)))
+    if added:
+        session.execute(insert(prop.secondary),
+                        [{owner_fk.key: owner_id, target_fk.key: target_id} for target_id in sorted(added)])
+    mark_changed(session, owner_table, [owner_id])
+
+    # collections already loaded on either side no longer match the table
+    session.expire(owner, [name])
+    target_model = prop.mapper.class_
+    for target_id in added | removed:
+        target = session.identity_map.get(session.identity_key(target_model, target_id))
+        if target is not None:
+            session.expire(target, [prop.back_populates])
+    return added, removed
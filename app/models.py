@@ -6,8 +6,10 @@ class Pharma(db.Model):
     name = db.Column(db.String(120), unique=True, nullable=False)
 
 class Brand(db.Model):
+    # (pharma_id, name) serves both the FK and per-pharma name lookups
+    __table_args__ = (db.Index('ix_brand_pharma_id_name', 'pharma_id', 'name'),)
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False)
+    name = db.Column(db.String(120), nullable=False, index=True)
     pharma_id = db.Column(db.Integer, db.ForeignKey('pharma.id'), nullable=False)
     pharma = db.relationship('Pharma', backref=db.backref('brands', lazy=True))
 
@@ -16,18 +18,22 @@ contract_brand = db.Table(
     'contract_brand',
     db.Column('contract_id', db.Integer, db.ForeignKey('contract.id'), primary_key=True),
     db.Column('brand_id', db.Integer, db.ForeignKey('brand.id'), primary_key=True),
+    db.Index('ix_contract_brand_brand_id', 'brand_id'),
 )
 
 class Contract(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
-    pharma_id = db.Column(db.Integer, db.ForeignKey('pharma.id'), nullable=False)
+    name = db.Column(db.String(200), nullable=False, index=True)
+    pharma_id = db.Column(db.Integer, db.ForeignKey('pharma.id'), nullable=False, index=True)
     start_date = db.Column(db.Date, nullable=True)
     end_date = db.Column(db.Date, nullable=True)
+    budget_total = db.Column(db.Float, nullable=True)
     pharma = db.relationship('Pharma', backref=db.backref('contracts', lazy=True))
     brands = db.relationship('Brand', secondary=contract_brand, backref='contracts')
 
 class Client(db.Model):
+    # matches the list view's keyset order
+    __table_args__ = (db.Index('ix_client_created_at_id', 'created_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     notes = db.Column(db.Text, nullable=True)
@@ -35,26 +41,34 @@ class Client(db.Model):
 
 class TargetList(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    label = db.Column(db.String(200), nullable=False)
-    s3_key = db.Column(db.String(300), nullable=False)
+    label = db.Column(db.String(200), nullable=False, index=True)
+    # NULL until the upload job has stored the object
+    s3_key = db.Column(db.String(300), nullable=True)
     original_filename = db.Column(db.String(255), nullable=False)
     size_bytes = db.Column(db.Integer, nullable=True)
-    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # SHA-256 of the object at s3_key; set once the object is known to exist
+    content_sha256 = db.Column(db.String(64), nullable=True, index=True)
+    # nonce of the direct upload that last stored the object (repeated completions find it)
+    upload_nonce = db.Column(db.String(32), nullable=True, unique=True, index=True)
 
 class Campaign(db.Model):
+    __table_args__ = (db.Index('ix_campaign_contract_id_name', 'contract_id', 'name'),)
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
+    name = db.Column(db.String(200), nullable=False, index=True)
     contract_id = db.Column(db.Integer, db.ForeignKey('contract.id'), nullable=False)
     description = db.Column(db.Text, nullable=True)
     contract = db.relationship('Contract', backref=db.backref('campaigns', lazy=True))
 
 class Program(db.Model):
+    __table_args__ = (db.Index('ix_program_campaign_id_name', 'campaign_id', 'name'),)
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
+    name = db.Column(db.String(200), nullable=False, index=True)
     campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), nullable=False)
-    target_list_id = db.Column(db.Integer, db.ForeignKey('target_list.id'), nullable=True)
+    target_list_id = db.Column(db.Integer, db.ForeignKey('target_list.id'), nullable=True, index=True)
     platform = db.Column(db.String(200), nullable=False)
     asset_id = db.Column(db.String(200), nullable=False)
+    expected_reach = db.Column(db.Integer, nullable=True)
 
     campaign = db.relationship('Campaign', backref=db.backref('programs', lazy=True))
     target_list = db.relationship('TargetList', backref=db.backref('programs', lazy=True))
@@ -64,18 +78,29 @@ program_placement = db.Table(
     'program_placement',
     db.Column('program_id', db.Integer, db.ForeignKey('program.id'), primary_key=True),
     db.Column('placement_id', db.Integer, db.ForeignKey('placement.id'), primary_key=True),
+    db.Index('ix_program_placement_placement_id', 'placement_id'),
 )
 
 pharma_target_list = db.Table(
     'pharma_target_list',
     db.Column('pharma_id', db.Integer, db.ForeignKey('pharma.id'), primary_key=True),
     db.Column('target_list_id', db.Integer, db.ForeignKey('target_list.id'), primary_key=True),
+    db.Index('ix_pharma_target_list_target_list_id', 'target_list_id'),
 )
 
 brand_target_list = db.Table(
     'brand_target_list',
     db.Column('brand_id', db.Integer, db.ForeignKey('brand.id'), primary_key=True),
     db.Column('target_list_id', db.Integer, db.ForeignKey('target_list.id'), primary_key=True),
+    db.Index('ix_brand_target_list_target_list_id', 'target_list_id'),
+)
+
+# Materialized (campaign -> eligible target list) pairs, maintained by app/eligibility.py
+target_list_eligibility = db.Table(
+    'target_list_eligibility',
+    db.Column('campaign_id', db.Integer, db.ForeignKey('campaign.id'), primary_key=True),
+    db.Column('target_list_id', db.Integer, db.ForeignKey('target_list.id'), primary_key=True),
+    db.Index('ix_target_list_eligibility_target_list_id', 'target_list_id'),
 )
 
 Pharma.target_lists = db.relationship('TargetList', secondary=pharma_target_list, backref='pharmas')
@@ -88,5 +113,66 @@ class Placement(db.Model):
     status = db.Column(db.String(50), nullable=True)    # planned, live, paused, complete
     start_date = db.Column(db.Date, nullable=True)
     end_date = db.Column(db.Date, nullable=True)
+    impression_goal = db.Column(db.Integer, nullable=True)
+    click_goal = db.Column(db.Integer, nullable=True)
     # many-to-many: a placement can belong to multiple programs
     programs = db.relationship('Program', secondary=program_placement, backref='placements')
+
+# Background work queue, processed by app/jobs.py
+class Job(db.Model):
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+        db.Index('ix_job_subject', 'subject_table', 'subject_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    payload = db.Column(db.Text, nullable=False, default='{}')            # JSON
+    result = db.Column(db.Text, nullable=True)                            # JSON
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    # the row the job works on, e.g. ('target_list', 12)
+    subject_table = db.Column(db.String(50), nullable=True)
+    subject_id = db.Column(db.Integer, nullable=True)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+# Identifier counts for a target list file; the ids themselves live in AUDIENCE_DIR (app/audience.py)
+class TargetListAudience(db.Model):
+    target_list_id = db.Column(db.Integer, db.ForeignKey('target_list.id'), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='ready')  # ready, unsupported
+    error = db.Column(db.Text, nullable=True)
+    identifier_column = db.Column(db.String(120), nullable=True)
+    row_count = db.Column(db.Integer, nullable=True)
+    invalid_count = db.Column(db.Integer, nullable=True)
+    identifier_count = db.Column(db.Integer, nullable=True)
+    ingested_at = db.Column(db.DateTime, nullable=True)
+    target_list = db.relationship('TargetList', backref=db.backref('audience', uselist=False))
+
+# KPI rollups per campaign / contract / pharma, maintained by app/rollups.py. No foreign
+# keys: rows are derived and are removed in the same transaction as their owner.
+def _rollup_table(name, key):
+    return db.Table(
+        name,
+        db.Column(key, db.Integer, primary_key=True),
+        db.Column('contract_count', db.Integer, nullable=True),
+        db.Column('campaign_count', db.Integer, nullable=True),
+        db.Column('program_count', db.Integer, nullable=False, default=0),
+        db.Column('placement_count', db.Integer, nullable=False, default=0),
+        db.Column('impression_goal', db.BigInteger, nullable=True),
+        db.Column('click_goal', db.BigInteger, nullable=True),
+        db.Column('expected_reach', db.BigInteger, nullable=True),
+        db.Column('budget_total', db.Float, nullable=True),
+        db.Column('placements_by_status', db.Text, nullable=False, default='{}'),   # JSON
+        db.Column('placements_by_channel', db.Text, nullable=False, default='{}'),  # JSON
+        db.Column('start_date', db.Date, nullable=True),
+        db.Column('end_date', db.Date, nullable=True),
+        db.Column('refreshed_at', db.DateTime, nullable=False),
+    )
+
+campaign_rollup = _rollup_table('campaign_rollup', 'campaign_id')
+contract_rollup = _rollup_table('contract_rollup', 'contract_id')
+pharma_rollup = _rollup_table('pharma_rollup', 'pharma_id')
@@ -0,0 +1,174 @@
+"""
+Audience overlap between target lists, computed from the identifier arrays
+written by app/audience.py.
+
+Pairwise counts for N lists come from a single sort of all their ids rather
+than N² merges: each id shared by a few lists adds one to every pair of
+those lists (vectorized with bincount), and the ids shared by many lists
+are multiplied as dense float32 blocks, so neither a long tail of
+near-unique ids nor a common core of very popular ones dominates. Every pair is then kept in an LRU keyed by both lists'
+ingest timestamps, so a re-ingested list simply stops matching its old
+entries. Without numpy the same API works on Python sets, only slower.
+"""
+from itertools import combinations
+from flask import current_app
+from sqlalchemy import select
+from .extensions import db
+from .audience import load, np
+from .cache import LRUBackend
+from .models import Program, TargetListAudience
+
+# ids shared by more lists than this go through the dense product instead of pair enumeration
+_PAIR_LIMIT = 24
+# float32 cells per dense block (64 MiB)
+_BLOCK_CELLS = 16 * 1024 * 1024
+
+def _versions(tl_ids):
+    rows = db.session.execute(
+        select(TargetListAudience.target_list_id, TargetListAudience.ingested_at, TargetListAudience.identifier_count)
+        .where(TargetListAudience.target_list_id.in_(list(tl_ids)), TargetListAudience.status == "ready"))
+    return {tl_id: (at.isoformat() if at else "", n) for tl_id, at, n in rows}
+
+def _state():
+    return current_app.extensions["overlap"]
+
+def _array(tl_id, version):
+    arrays = _state()["arrays"]
+    key = f"{tl_id}:{version}"
+    ids = arrays.get(key)
+    if ids is None:
+        ids = load(tl_id)
+        if ids is None:
+            ids = np.empty(0, dtype=np.uint64) if np is not None else frozenset()
+        elif np is None:
+            ids = frozenset(ids)
+        arrays.set(key, ids, current_app.config["OVERLAP_CACHE_TTL"])
+    return ids
+
+def _pair_key(a, b, versions):
+    if a > b:
+        a, b = b, a
+    return f"{a}:{versions[a][0]}:{b}:{versions[b][0]}"
+
+def _pairwise(arrays):
+    """Full overlap matrix (list of lists) for ``arrays``."""
+    n = len(arrays)
+    if np is None:
+        out = [[0] * n for _ in range(n)]
+        for i in range(n):
+            out[i][i] = len(arrays[i])
+        for i, j in combinations(range(n), 2):
+            small, big = sorted((arrays[i], arrays[j]), key=len)
+            out[i][j] = out[j][i] = sum(1 for x in small if x in big)
+        return out
+
+    lengths = np.array([len(a) for a in arrays], dtype=np.int64)
+    result = np.zeros((n, n), dtype=np.int64)
+    if lengths.sum():
+        values = np.concatenate([np.asarray(a) for a in arrays])
+        order = np.argsort(values)
+        values = values[order]
+        owner = np.repeat(np.arange(n, dtype=np.int32), lengths)[order]
+        starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+        k = np.diff(np.r_[starts, values.size])  # lists holding each distinct id
+        group_k = np.repeat(k, k)
+
+        # ids in a few lists: enumerate their list pairs directly
+        pairs = np.zeros(n * n, dtype=np.int64)
+        cand = np.flatnonzero((group_k >= 2) & (group_k <= _PAIR_LIMIT))
+        # partners left after each member within its group
+        left = (group_k[cand] - 1 - (cand - np.repeat(starts, k)[cand])).astype(np.int32)
+        base = owner[cand] * n
+        d = 1
+        while cand.size:
+            keep = left >= d
+            cand, left, base = cand[keep], left[keep], base[keep]
+            if cand.size:
+                pairs += np.bincount(base + owner[cand + d], minlength=n * n)
+            d += 1
+        pairs = pairs.reshape(n, n)
+        result += pairs + pairs.T
+
+        # ids in many lists: dense float32 product over just those columns
+        dense = np.flatnonzero(group_k > _PAIR_LIMIT)
+        if dense.size:
+            column = np.cumsum(np.r_[True, values[dense][1:] != values[dense][:-1]]) - 1
+            owner = owner[dense]
+            total = int(column[-1]) + 1
+            width = max(min(_BLOCK_CELLS // n, total), 1)
+            bounds = np.searchsorted(column, np.arange(0, total + width, width))
+            block = np.zeros((n, width), dtype=np.float32)
+            for b in range(len(bounds) - 1):
+                lo, hi = bounds[b], bounds[b + 1]
+                if lo == hi:
+                    continue
+                block.fill(0)
+                block[owner[lo:hi], column[lo:hi] - b * width] = 1
+                result += np.rint(block @ block.T).astype(np.int64)
+    np.fill_diagonal(result, lengths)
+    return result.tolist()
+
+def matrix(tl_ids):
+    """
+    Overlap matrix for ``tl_ids``. Returns (ids, sizes, matrix, not_indexed) where
+    ids are the indexed lists in request order and matrix[i][j] is |ids[i] ∩ ids[j]|.
+    """
+    tl_ids = list(dict.fromkeys(tl_ids))
+    versions = _versions(tl_ids)
+    ids = [i for i in tl_ids if i in versions]
+    missing = [i for i in tl_ids if i not in versions]
+    pairs = _state()["pairs"]
+    ttl = current_app.config["OVERLAP_CACHE_TTL"]
+
+    known = {}
+    stale = set()
+    for a, b in combinations(ids, 2):
+        hit = pairs.get(_pair_key(a, b, versions))
+        if hit is None:
+            stale.update((a, b))
+        else:
+            known[(a, b)] = known[(b, a)] = hit
+
+    if stale:
+        subset = [i for i in ids if i in stale]
+        sub = _pairwise([_array(i, versions[i][0]) for i in subset])
+        for x, y in combinations(range(len(subset)), 2):
+            a, b = subset[x], subset[y]
+            known[(a, b)] = known[(b, a)] = sub[x][y]
+            pairs.set(_pair_key(a, b, versions), sub[x][y], ttl)
+
+    sizes = [versions[i][1] for i in ids]
+    out = [[sizes[x] if x == y else known[(a, b)] for y, b in enumerate(ids)] for x, a in enumerate(ids)]
+    return ids, sizes, out, missing
+
+def combined(tl_ids):
+    """Return (indexed ids, not indexed ids, |union|, |intersection|) across ``tl_ids``."""
+    tl_ids = list(dict.fromkeys(tl_ids))
+    versions = _versions(tl_ids)
+    ids = [i for i in tl_ids if i in versions]
+    missing = [i for i in tl_ids if i not in versions]
+    if not ids:
+        return ids, missing, 0, 0
+    arrays = sorted((_array(i, versions[i][0]) for i in ids), key=len)
+    if np is None:
+        union = len(frozenset().union(*arrays))
+        inter = len(frozenset(arrays[0]).intersection(*arrays[1:]))
+        return ids, missing, union, inter
+    union = int(np.unique(np.concatenate([np.asarray(a) for a in arrays])).size)
+    inter = np.asarray(arrays[0])
+    for a in arrays[1:]:
+        if not inter.size:
+            break
+        inter = np.intersect1d(inter, a, assume_unique=True)
+    return ids, missing, union, int(inter.size)
+
+def campaign_target_lists(campaign_id):
+    return list(db.session.scalars(
+        select(Program.target_list_id).where(Program.campaign_id == campaign_id,
+                                             Program.target_list_id.isnot(None)).distinct()))
+
+def init_app(app):
+    app.extensions["overlap"] = {
+        "pairs": LRUBackend(app.config["OVERLAP_CACHE_SIZE"]),
+        "arrays": LRUBackend(app.config["OVERLAP_ARRAY_CACHE_SIZE"]),
+    }
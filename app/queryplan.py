@@ -0,0 +1,205 @@
+"""
+Query-plan regression check for the hot queries of each blueprint.
+
+Builds a scratch SQLite database from the model metadata (so it always has
+exactly the index set declared in app/models.py), seeds a few rows, runs
+EXPLAIN QUERY PLAN on every statement in HOT_QUERIES and reports any plan
+step that scans a whole table. Run with `flask check-query-plans`.
+
+check_route_plans() covers what the routes really send: it requests every
+GET route the route benchmark discovers through the test client, keeps the
+SELECTs the engine saw (with their parameters) and explains those, so a
+route that changes its query is checked as it now runs. Scans a route needs
+by design (dropdown lookups over a whole table) are listed in ROUTE_SCANS,
+and a statement shape repeated N_PLUS_ONE or more times in one request is
+reported as an N+1. tests/test_query_plans.py runs both checks.
+"""
+import re
+from datetime import datetime
+from sqlalchemy import create_engine, select, delete, insert, text, and_, or_
+from .extensions import db
+from .export import hierarchy_query
+from .instrumentation import statement_shape
+from .models import (Pharma, Brand, Contract, Campaign, Program, Placement, Client, TargetList,
+                     contract_brand, program_placement, pharma_target_list, brand_target_list,
+                     target_list_eligibility)
+
+_FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\S+)(?!.*\bUSING\b)")
+_AT = datetime(2025, 1, 1)
+
+# (blueprint, description, statement); ids are arbitrary but realistic
+HOT_QUERIES = [
+    ("contracts", "list_contracts next page",
+     select(Contract).where(Contract.id < 50).order_by(Contract.id.desc()).limit(16)),
+    ("contracts", "view_contract brands",
+     select(Brand).join(contract_brand, contract_brand.c.brand_id == Brand.id)
+     .where(contract_brand.c.contract_id.in_([1, 2]))),
+    ("contracts", "view_contract campaigns",
+     select(Campaign).where(Campaign.contract_id.in_([1, 2]))),
+    ("contracts", "view_contract programs",
+     select(Program).where(Program.campaign_id.in_([1, 2]))),
+    ("contracts", "view_contract placements",
+     select(Placement, program_placement.c.program_id)
+     .join(program_placement, program_placement.c.placement_id == Placement.id)
+     .where(program_placement.c.program_id.in_([1, 2]))),
+    ("contracts", "view_contract placement programs",
+     select(Program, program_placement.c.placement_id)
+     .join(program_placement, program_placement.c.program_id == Program.id)
+     .where(program_placement.c.placement_id.in_([1, 2]))),
+    ("contracts", "api_brands",
+     select(Brand).where(Brand.pharma_id == 1)),
+    ("contracts", "resolve_brands",
+     select(Brand).where(Brand.pharma_id == 1, Brand.name.in_(["a", "b"]))),
+    ("contracts", "pharma contracts",
+     select(Contract.id).where(Contract.pharma_id.in_([1, 2]))),
+    ("contracts", "brand contracts",
+     select(contract_brand.c.contract_id).where(contract_brand.c.brand_id.in_([1, 2]))),
+    ("contracts", "export_hierarchy for one pharma",
+     hierarchy_query(pharma_id=1)),
+    ("contracts", "export_hierarchy brands per batch",
+     select(contract_brand.c.contract_id, Brand.name).join(Brand, Brand.id == contract_brand.c.brand_id)
+     .where(contract_brand.c.contract_id.in_([1, 2]))),
+    ("campaigns", "list_campaigns next page",
+     select(Campaign).where(Campaign.id < 50).order_by(Campaign.id.desc()).limit(16)),
+    ("programs", "list_programs next page",
+     select(Program).where(Program.id < 50).order_by(Program.id.desc()).limit(16)),
+    ("programs", "api_program_target_lists",
+     select(TargetList).join(target_list_eligibility, target_list_eligibility.c.target_list_id == TargetList.id)
+     .where(target_list_eligibility.c.campaign_id == 1).order_by(TargetList.label)),
+    ("programs", "programs using a target list",
+     select(Program.id).where(Program.target_list_id == 1)),
+    ("placements", "list_placements next page",
+     select(Placement).where(Placement.id < 50).order_by(Placement.id.desc()).limit(16)),
+    ("placements", "edit_placement selected programs",
+     select(Program).join(program_placement, program_placement.c.program_id == Program.id)
+     .where(program_placement.c.placement_id == 1)),
+    ("clients", "list_clients next page",
+     select(Client).where(or_(Client.created_at < _AT, and_(Client.created_at == _AT, Client.id < 50)))
+     .order_by(Client.created_at.desc(), Client.id.desc()).limit(16)),
+    ("clients", "edit_client pharma by name",
+     select(Pharma).where(Pharma.name == "a")),
+    ("target_lists", "list_target_lists",
+     select(TargetList).order_by(TargetList.uploaded_at.desc()).limit(50)),
+    ("target_lists", "upload dedupe by content hash",
+     select(TargetList).where(TargetList.content_sha256 == "0" * 64, TargetList.id != 1).order_by(TargetList.id).limit(1)),
+    ("target_lists", "target list pharmas",
+     select(Pharma).join(pharma_target_list, pharma_target_list.c.pharma_id == Pharma.id)
+     .where(pharma_target_list.c.target_list_id == 1)),
+    ("target_lists", "target list brands",
+     select(Brand).join(brand_target_list, brand_target_list.c.brand_id == Brand.id)
+     .where(brand_target_list.c.target_list_id == 1)),
+    ("target_lists", "direct upload completion by nonce",
+     select(TargetList).where(TargetList.upload_nonce == "0" * 32)),
+    ("target_lists", "eligibility refresh by target list",
+     delete(target_list_eligibility).where(target_list_eligibility.c.target_list_id.in_([1, 2]))),
+]
+
+def _seed(conn):
+    # large enough that a page's IN (...) lists cover a small share of every table
+    conn.execute(insert(Pharma), [{"id": i, "name": f"pharma {i}"} for i in range(1, 201)])
+    conn.execute(insert(Brand), [{"id": i, "name": f"brand {i}", "pharma_id": i % 200 + 1} for i in range(1, 601)])
+    conn.execute(insert(Contract), [{"id": i, "name": f"contract {i}", "pharma_id": i % 200 + 1} for i in range(1, 1001)])
+    conn.execute(insert(contract_brand), [{"contract_id": i, "brand_id": i % 600 + 1} for i in range(1, 1001)])
+    conn.execute(insert(Campaign), [{"id": i, "name": f"campaign {i}", "contract_id": i % 1000 + 1} for i in range(1, 2001)])
+    conn.execute(insert(TargetList), [{"id": i, "label": f"list {i}", "s3_key": f"k{i}", "original_filename": "f.csv",
+                                       "uploaded_at": _AT} for i in range(1, 2001)])
+    conn.execute(insert(pharma_target_list), [{"pharma_id": i % 200 + 1, "target_list_id": i} for i in range(1, 2001)])
+    conn.execute(insert(brand_target_list), [{"brand_id": i % 600 + 1, "target_list_id": i} for i in range(1, 2001)])
+    conn.execute(insert(Program), [{"id": i, "name": f"program {i}", "campaign_id": i % 2000 + 1,
+                                    "target_list_id": i % 200 + 1, "platform": "web", "asset_id": "a"}
+                                   for i in range(1, 4001)])
+    conn.execute(insert(Placement), [{"id": i, "name": f"placement {i}"} for i in range(1, 8001)])
+    conn.execute(insert(program_placement), [{"program_id": i % 4000 + 1, "placement_id": i} for i in range(1, 8001)])
+    conn.execute(insert(Client), [{"id": i, "name": f"client {i}", "created_at": _AT} for i in range(1, 501)])
+    conn.execute(text("ANALYZE"))
+
+def explain(conn, stmt):
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[3] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+def check_query_plans():
+    """Return [(blueprint, description, plan lines, full-scan tables)] for every hot query."""
+    engine = create_engine("sqlite://")
+    results = []
+    with engine.begin() as conn:
+        db.metadata.create_all(conn)
+        _seed(conn)
+        for blueprint, description, stmt in HOT_QUERIES:
+            plan = explain(conn, stmt)
+            scans = [m.group(1) for m in map(_FULL_SCAN.match, plan) if m]
+            results.append((blueprint, description, plan, scans))
+    engine.dispose()
+    return results
+
+# statement shapes seen this many times in one request count as an N+1
+N_PLUS_ONE = 5
+
+# endpoint -> tables it reads in full on purpose
+ROUTE_SCANS = {
+    # the pager's row total over the whole (unindexed) table, cached for PAGINATION_COUNT_TTL
+    "placements.list_placements": {"placement"},
+    # with ANALYZE stats SQLite drives the page's pharmas/brands selectinloads from these small tables
+    "target_lists.list_target_lists": {"pharma", "brand"},
+}
+
+def capture_route_queries(app):
+    """{label: [(statement, parameters)]} for every GET route bench.discover() finds."""
+    from .bench import QueryCounter, discover, sample_ids
+    with app.app_context():
+        ids = sample_ids()
+        engine = db.engine
+    client = app.test_client()
+    captured = {}
+    for label, method, url, _ in discover(app, ids):
+        with QueryCounter(engine) as counter:
+            response = client.get(url)
+            response.get_data()
+            response.close()
+        if response.status_code >= 500:
+            raise RuntimeError(f"{label} ({url}) answered {response.status_code}")
+        captured[label] = counter.statements
+    return captured
+
+def _selects(statements):
+    seen = {}
+    for statement, parameters in statements:
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            seen.setdefault(statement, parameters)
+    return seen
+
+def _route_scans(statement, plan, allowed):
+    """Full scans in ``plan`` that are neither allowed nor cheap by construction."""
+    scans = []
+    for i, line in enumerate(plan):
+        m = _FULL_SCAN.match(line)
+        # FTS5 matches and materialized subqueries are not table scans
+        if not m or "VIRTUAL TABLE" in line or m.group(1).startswith("(") or m.group(1) in allowed:
+            continue
+        # first pages: rows already come in ORDER BY order, so the scan stops at LIMIT
+        if (i == 0 and "ORDER BY" in statement and "LIMIT" in statement
+                and not any("TEMP B-TREE FOR ORDER BY" in step for step in plan)):
+            continue
+        scans.append(m.group(1))
+    return scans
+
+def check_route_plans(app):
+    """
+    Return [(label, statement, plan lines, unexpected full-scan tables)] for
+    the SELECTs each GET route runs, plus [(label, shape, times)] for N+1s.
+    """
+    captured = capture_route_queries(app)
+    results, repeats = [], []
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for label, statements in captured.items():
+                allowed = ROUTE_SCANS.get(label.split("?")[0].split("[")[0], set())
+                for statement, parameters in _selects(statements).items():
+                    plan = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+                    scans = _route_scans(statement, plan, allowed)
+                    results.append((label, statement, plan, scans))
+                shapes = {}
+                for statement, _ in statements:
+                    shape = statement_shape(statement)
+                    shapes[shape] = shapes.get(shape, 0) + 1
+                repeats += [(label, shape, n) for shape, n in shapes.items() if n >= N_PLUS_ONE]
+    return results, repeats
@@ -0,0 +1,90 @@
+"""
+Optional read-replica routing.
+
+With DATABASE_REPLICA_URL set, the replica is registered as the "replica"
+bind and RoutingSession sends SELECTs there while a request is marked for
+replica reads. GET requests to list_*, api_* and export_* endpoints (plus
+any named in DB_REPLICA_ENDPOINTS) are marked; everything else, CLI
+commands and job workers always use the primary.
+
+Reads stay on the primary once the session has written anything (a flush
+or a Core INSERT/UPDATE/DELETE). A request that committed a write also
+pins the browser to the primary for DB_REPLICA_STICKY_SECONDS through the
+Flask session, so the list page a form redirects to shows the new row even
+if the replica is behind.
+
+For local testing point DATABASE_REPLICA_URL at a second SQLite file and
+refresh it with `flask sync-replica`.
+"""
+import sqlite3
+import time
+from flask import current_app, g, has_request_context, request, session as browser_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA = "replica"
+_STICKY_KEY = "_db_primary_until"
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that can read from the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or clause is None:
+            return engine
+        engines = self._db.engines
+        if getattr(clause, "is_dml", False):
+            self.info["db_wrote"] = True
+        elif (REPLICA in engines and engine is engines.get(None) and getattr(clause, "is_select", False)
+              and getattr(clause, "_for_update_arg", None) is None and self._reads_from_replica()):
+            return engines[REPLICA]
+        return engine
+
+    def _reads_from_replica(self):
+        return has_request_context() and g.get("db_replica", False) and not self.info.get("db_wrote")
+
+def _before_flush(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        session.info["db_wrote"] = True
+
+def _after_commit(session):
+    if session.info.get("db_wrote") and has_request_context():
+        g.db_wrote = True
+
+def _before_request():
+    if request.method != "GET" or request.endpoint is None:
+        return
+    if browser_session.get(_STICKY_KEY, 0) > time.time():
+        return
+    name = request.endpoint.rsplit(".", 1)[-1]
+    if name.startswith(("list_", "api_", "export_")) or request.endpoint in current_app.config["DB_REPLICA_ENDPOINTS"]:
+        g.db_replica = True
+
+def _after_request(response):
+    sticky = current_app.config["DB_REPLICA_STICKY_SECONDS"]
+    if g.get("db_wrote") and sticky > 0:
+        browser_session[_STICKY_KEY] = time.time() + sticky
+    return response
+
+def sync_sqlite(primary_engine, replica_engine):
+    """Copy the primary SQLite file over the replica with the online backup API."""
+    replica_engine.dispose()
+    src = sqlite3.connect(primary_engine.url.database)
+    dst = sqlite3.connect(replica_engine.url.database)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+def init_app(app):
+    db = app.extensions["sqlalchemy"]
+    with app.app_context():
+        if REPLICA not in db.engines:
+            return
+    # db.session is process-global, so listeners are attached once
+    if not event.contains(db.session, "before_flush", _before_flush):
+        event.listen(db.session, "before_flush", _before_flush)
+        event.listen(db.session, "after_commit", _after_commit)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,59 @@
+"""
+Batched Pharma/Brand resolution for the contract and client forms.
+
+Each helper takes a whole list of ids or names and costs one IN query, plus
+one executemany INSERT and one re-select for names that do not exist yet,
+however many brands a contract carries. (An ORM flush would insert row by
+row on SQLite, since it needs RETURNING in parameter order.)
+"""
+from sqlalchemy import insert
+from .extensions import db
+from .changes import mark_changed
+from .models import Pharma, Brand
+
+def _clean_names(names):
+    seen = []
+    for n in names:
+        n = (n or "").strip()
+        if n and n not in seen:
+            seen.append(n)
+    return seen
+
+def _bulk_create(model, rows):
+    """Insert ``rows`` in one statement and return the new instances."""
+    ids = [r[0] for r in db.session.execute(insert(model).returning(model.id), rows)]
+    mark_changed(db.session, model.__table__.name, ids)
+    return model.query.filter(model.id.in_(ids)).all()
+
+def resolve_pharmas(names):
+    """Return {name: Pharma} for ``names``, creating the missing ones."""
+    names = _clean_names(names)
+    if not names:
+        return {}
+    found = {p.name: p for p in Pharma.query.filter(Pharma.name.in_(names))}
+    missing = [{"name": n} for n in names if n not in found]
+    if missing:
+        found.update((p.name, p) for p in _bulk_create(Pharma, missing))
+    return found
+
+def resolve_brands(pharma, names):
+    """Return {name: Brand} under ``pharma`` for ``names``, creating the missing ones."""
+    names = _clean_names(names)
+    if not names:
+        return {}
+    found = {b.name: b for b in Brand.query.filter(Brand.pharma_id == pharma.id, Brand.name.in_(names))}
+    missing = [{"name": n, "pharma_id": pharma.id} for n in names if n not in found]
+    if missing:
+        found.update((b.name, b) for b in _bulk_create(Brand, missing))
+    return found
+
+def brands_by_ids(ids, pharma_id=None):
+    """Return the Brands for ``ids`` in the given order, optionally limited to one pharma."""
+    ids = list(dict.fromkeys(i for i in ids if i))
+    if not ids:
+        return []
+    query = Brand.query.filter(Brand.id.in_(ids))
+    if pharma_id is not None:
+        query = query.filter(Brand.pharma_id == pharma_id)
+    by_id = {b.id: b for b in query}
+    return [by_id[i] for i in ids if i in by_id]
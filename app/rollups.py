@@ -0,0 +1,254 @@
+"""
+Materialized KPI rollups per campaign, contract and pharma.
+
+Each rollup row holds summed impression/click goals (placements), expected
+reach (programs), budget (contracts), placement counts by status and by
+channel, and the date span the owner covers, so dashboards read one row
+instead of walking placement → program → campaign → contract.
+
+A placement shared by several programs of the same owner is counted once.
+Rows are recomputed for just the affected owners inside the committing
+transaction (see changes.on_commit). Owners are resolved from the changed
+rows both after the flush and, for edited or deleted rows, before it
+(before_flush), so a program moved to another campaign refreshes both.
+"""
+import json
+from datetime import datetime
+from functools import lru_cache
+from sqlalchemy import bindparam, delete, event, exists, func, insert, literal, select
+from .extensions import db
+from .changes import on_commit
+from .models import (Campaign, Contract, Pharma, Placement, Program, program_placement,
+                     campaign_rollup, contract_rollup, pharma_rollup)
+
+_CHUNK = 500
+LEVELS = ("campaign", "contract", "pharma")
+TABLES = {"campaign": campaign_rollup, "contract": contract_rollup, "pharma": pharma_rollup}
+_OWNERS = {"campaign": Campaign, "contract": Contract, "pharma": Pharma}
+_UNSET = "unspecified"
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i:i + _CHUNK]
+
+def _add(total, value):
+    return value if total is None else total + (value or 0)
+
+def _widen(row, start, end):
+    if start and (row["start_date"] is None or start < row["start_date"]):
+        row["start_date"] = start
+    if end and (row["end_date"] is None or end > row["end_date"]):
+        row["end_date"] = end
+
+@lru_cache(maxsize=None)
+def _statements(level, filtered):
+    """
+    The SELECTs behind one ``level`` rollup, built once; when ``filtered`` they
+    take the owner ids as the expanding ``ids`` parameter. Rebuilding the
+    expressions on every commit cost more than running them.
+    """
+    def where(stmt, column):
+        return stmt.where(column.in_(bindparam("ids", expanding=True))) if filtered else stmt
+
+    owner_model = _OWNERS[level]
+    programs = Program.__table__
+    campaigns = Campaign.__table__
+    if level == "campaign":
+        owner = Program.campaign_id
+    elif level == "contract":
+        owner = Campaign.contract_id
+        programs = programs.join(Campaign, Campaign.id == Program.campaign_id)
+    else:
+        owner = Contract.pharma_id
+        programs = programs.join(Campaign, Campaign.id == Program.campaign_id) \
+                           .join(Contract, Contract.id == Campaign.contract_id)
+        campaigns = campaigns.join(Contract, Contract.id == Campaign.contract_id)
+
+    pairs = where(select(owner.label("owner_id"), program_placement.c.placement_id)
+                  .select_from(programs.join(program_placement, program_placement.c.program_id == Program.id)),
+                  owner).distinct().subquery()
+    stmts = {
+        "owners": where(select(owner_model.id), owner_model.id),
+        "programs": where(select(owner, func.count(Program.id), func.sum(Program.expected_reach))
+                          .select_from(programs), owner).group_by(owner),
+        # one pass over the owners' placements, grouped finely enough for every total
+        "placements": select(pairs.c.owner_id, Placement.status, Placement.channel, func.count(),
+                             func.sum(Placement.impression_goal), func.sum(Placement.click_goal),
+                             func.min(Placement.start_date), func.max(Placement.end_date))
+                      .select_from(pairs.join(Placement, Placement.id == pairs.c.placement_id))
+                      .group_by(pairs.c.owner_id, Placement.status, Placement.channel),
+    }
+    if level == "contract":
+        stmts["contracts"] = where(select(Contract.id, literal(1), Contract.budget_total, Contract.start_date,
+                                          Contract.end_date), Contract.id)
+    elif level == "pharma":
+        stmts["contracts"] = where(select(Contract.pharma_id, func.count(Contract.id), func.sum(Contract.budget_total),
+                                          func.min(Contract.start_date), func.max(Contract.end_date)),
+                                   Contract.pharma_id).group_by(Contract.pharma_id)
+    if level != "campaign":
+        campaign_owner = Campaign.contract_id if level == "contract" else Contract.pharma_id
+        stmts["campaigns"] = where(select(campaign_owner, func.count(Campaign.id)).select_from(campaigns),
+                                   campaign_owner).group_by(campaign_owner)
+    return stmts
+
+def _compute(session, level, ids=None):
+    """Rollup rows for the ``level`` owners in ``ids`` (every owner when None); orphans are skipped."""
+    stmts = _statements(level, ids is not None)
+    params = {"ids": list(ids)} if ids is not None else {}
+    key = f"{level}_id"
+    now = datetime.utcnow()
+    counted = level != "campaign"
+    rows = {}
+    for (owner_id,) in session.execute(stmts["owners"], params):
+        rows[owner_id] = {key: owner_id, "program_count": 0, "placement_count": 0,
+                          "impression_goal": None, "click_goal": None, "expected_reach": None,
+                          "budget_total": None, "start_date": None, "end_date": None,
+                          "contract_count": 0 if level == "pharma" else None,
+                          "campaign_count": 0 if counted else None,
+                          "placements_by_status": {}, "placements_by_channel": {}, "refreshed_at": now}
+    if not rows:
+        return []
+
+    for owner_id, n, reach in session.execute(stmts["programs"], params):
+        if owner_id in rows:
+            rows[owner_id].update(program_count=n, expected_reach=reach)
+    for owner_id, status, channel, n, impressions, clicks, start, end in session.execute(stmts["placements"], params):
+        row = rows.get(owner_id)
+        if row is None:
+            continue
+        row["placement_count"] += n
+        row["impression_goal"] = _add(row["impression_goal"], impressions)
+        row["click_goal"] = _add(row["click_goal"], clicks)
+        _widen(row, start, end)
+        by_status, by_channel = row["placements_by_status"], row["placements_by_channel"]
+        by_status[status or _UNSET] = by_status.get(status or _UNSET, 0) + n
+        by_channel[channel or _UNSET] = by_channel.get(channel or _UNSET, 0) + n
+    if counted:
+        for owner_id, n, budget, start, end in session.execute(stmts["contracts"], params):
+            row = rows.get(owner_id)
+            if row is None:
+                continue
+            if level == "pharma":
+                row["contract_count"] = n
+            row["budget_total"] = budget
+            _widen(row, start, end)
+        for owner_id, n in session.execute(stmts["campaigns"], params):
+            if owner_id in rows:
+                rows[owner_id]["campaign_count"] = n
+
+    for row in rows.values():
+        row["placements_by_status"] = json.dumps(row["placements_by_status"], sort_keys=True)
+        row["placements_by_channel"] = json.dumps(row["placements_by_channel"], sort_keys=True)
+    return list(rows.values())
+
+def refresh(session, level, ids):
+    table = TABLES[level]
+    key = table.c[f"{level}_id"]
+    for chunk in _chunks(ids):
+        session.execute(delete(table).where(key.in_(chunk)))
+        rows = _compute(session, level, chunk)
+        if rows:
+            session.execute(insert(table), rows)
+
+def rebuild(session):
+    for level in LEVELS:
+        table = TABLES[level]
+        session.execute(delete(table))
+        rows = _compute(session, level)
+        for i in range(0, len(rows), _CHUNK):
+            session.execute(insert(table), rows[i:i + _CHUNK])
+
+@lru_cache(maxsize=None)
+def _owner_lookup(table):
+    """(statement taking expanding ``ids``, levels of its columns) for rows of ``table``."""
+    if table == "contract":
+        stmt = select(Contract.id, Contract.pharma_id)
+        column, levels = Contract.id, ("contract", "pharma")
+    else:
+        stmt = (select(Campaign.id, Campaign.contract_id, Contract.pharma_id)
+                .join(Contract, Contract.id == Campaign.contract_id))
+        column, levels = Campaign.id, LEVELS
+        if table in ("program", "placement"):
+            stmt = stmt.join(Program, Program.campaign_id == Campaign.id)
+            column = Program.id
+        if table == "placement":
+            stmt = stmt.join(program_placement, program_placement.c.program_id == Program.id)
+            column = program_placement.c.placement_id
+    return stmt.where(column.in_(bindparam("ids", expanding=True))).distinct(), levels
+
+def _owners(session, table, ids):
+    """{level: owner ids} affected by changes to ``table`` rows ``ids``."""
+    found = {level: set() for level in LEVELS}
+    if table in found:
+        # the row itself, even if it was just deleted
+        found[table].update(ids)
+    if table == "pharma":
+        return found
+    stmt, levels = _owner_lookup(table)
+    for chunk in _chunks(ids):
+        for row in session.execute(stmt, {"ids": chunk}):
+            for level, owner_id in zip(levels, row):
+                found[level].add(owner_id)
+    return found
+
+_TRACKED = {"placement", "program", "campaign", "contract", "pharma"}
+
+def _before_flush(session, flush_context, instances):
+    # owners as they are before this flush, for rows being edited or deleted
+    ids = {}
+    for obj in list(session.dirty) + list(session.deleted):
+        table = getattr(getattr(obj, "__table__", None), "name", None)
+        if table in _TRACKED and getattr(obj, "id", None) is not None:
+            ids.setdefault(table, set()).add(obj.id)
+    with session.no_autoflush:
+        for table, table_ids in ids.items():
+            note_owners(session, table, table_ids)
+
+def note_owners(session, table, ids):
+    """
+    Refresh, at commit, the owners ``table`` rows ``ids`` have right now. Core
+    statements that move rows between owners (e.g. deleting program_placement
+    links) call this first, as before_flush does for ORM edits.
+    """
+    if table not in _TRACKED:
+        return
+    stale = session.info.setdefault("rollup_owners", {})
+    for level, owners in _owners(session, table, ids).items():
+        stale.setdefault(level, set()).update(owners)
+
+def _discard(session, *args):
+    session.info.pop("rollup_owners", None)
+
+@on_commit
+def _sync(session, changes):
+    owners = session.info.pop("rollup_owners", {})
+    for table in _TRACKED:
+        if changes.get(table):
+            for level, ids in _owners(session, table, changes[table]).items():
+                owners.setdefault(level, set()).update(ids)
+    for level in LEVELS:
+        if owners.get(level):
+            refresh(session, level, owners[level])
+
+def as_dict(row, level):
+    out = dict(row._mapping)
+    out["id"] = out.pop(f"{level}_id")
+    for field in ("placements_by_status", "placements_by_channel"):
+        out[field] = json.loads(out[field] or "{}")
+    for field in ("start_date", "end_date", "refreshed_at"):
+        out[field] = out[field].isoformat() if out[field] else None
+    return out
+
+def init_app(app):
+    # db.session is process-global, so listeners are attached once
+    if not event.contains(db.session, "before_flush", _before_flush):
+        event.listen(db.session, "before_flush", _before_flush)
+        event.listen(db.session, "after_rollback", _discard)
+    # Fill the tables the first time they appear next to existing data
+    with app.app_context():
+        session = db.session
+        if (not session.scalar(select(exists().select_from(contract_rollup)))
+                and session.scalar(select(exists().select_from(Contract)))):
+            rebuild(session)
+            session.commit()
@@ -0,0 +1,33 @@
+from flask import Blueprint, abort, jsonify, request
+from sqlalchemy import select
+from .. import aio
+from ..eligibility import eligible_target_lists_stmt
+from ..models import Pharma, Brand, TargetList
+from .programs_targetlist_api import target_list_options
+
+# async twins of programs.api_program_target_lists and contracts.api_brands (see app/aio.py)
+aio_bp = Blueprint("aio", __name__)
+
+@aio_bp.route("/programs/api/target-lists")
+async def api_program_target_lists():
+    campaign_id   = request.args.get("campaign_id", type=int)
+    current_tl_id = request.args.get("current_tl_id", type=int)
+    async with aio.session() as session:
+        if request.args.get("all") == "1":
+            rows = await session.execute(select(TargetList.id, TargetList.label).order_by(TargetList.label))
+            return jsonify([{"id": tl_id, "label": label} for tl_id, label in rows])
+        if not campaign_id:
+            return jsonify([])
+        tls = (await session.scalars(eligible_target_lists_stmt(campaign_id))).all()
+        cur = None
+        if current_tl_id and all(t.id != current_tl_id for t in tls):
+            cur = await session.get(TargetList, current_tl_id)
+    return jsonify(target_list_options(tls, cur))
+
+@aio_bp.route("/contracts/api/brands/<int:pharma_id>")
+async def api_brands(pharma_id):
+    async with aio.session() as session:
+        if await session.get(Pharma, pharma_id) is None:
+            abort(404)
+        rows = await session.execute(select(Brand.id, Brand.name).where(Brand.pharma_id == pharma_id))
+        return jsonify([{"id": brand_id, "name": name} for brand_id, name in rows])
@@ -0,0 +1,58 @@
+from flask import Blueprint, jsonify, request
+from ..extensions import db
+from .. import api
+
+api_bp = Blueprint("api", __name__)
+
+def _conditional(payload):
+    """JSON response with a content ETag; 304 when If-None-Match already has it."""
+    response = jsonify(payload)
+    response.add_etag()
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+def _options(kind):
+    return api.parse_fields(kind, request.args), api.parse_include(kind, request.args.get("include"))
+
+@api_bp.errorhandler(api.ApiError)
+def api_error(e):
+    return jsonify({"error": str(e)}), 400
+
+@api_bp.route("/")
+def api_index():
+    return _conditional({"version": "v1", "resources": api.describe()})
+
+@api_bp.route("/<kind>")
+def api_list(kind):
+    """A page of ``kind`` in id order (?after=, ?limit=, ?<foreign key>=), or a batch with ?ids=1,2,3."""
+    resource = api.RESOURCES.get(kind)
+    if resource is None:
+        return jsonify({"error": f"unknown resource {kind!r}"}), 404
+    fields, tree = _options(kind)
+    ids = api.parse_ids(request.args.getlist("ids")) if "ids" in request.args else None
+    if ids is not None:
+        found = {obj.id: obj for obj in db.session.scalars(api.query(kind, fields, tree, ids=ids))}
+        return _conditional({"data": [api.serialize(found[i], kind, tree, fields) for i in ids if i in found],
+                             "missing": [i for i in ids if i not in found]})
+    filters = {}
+    for name in resource.foreign_keys:
+        if name in request.args:
+            value = request.args.get(name, type=int)
+            if value is None:
+                raise api.ApiError(f"{name} must be an integer")
+            filters[name] = value
+    limit = min(max(request.args.get("limit", api.DEFAULT_LIMIT, type=int), 1), api.MAX_LIMIT)
+    rows = db.session.scalars(api.query(kind, fields, tree, filters=filters,
+                                        after=request.args.get("after", type=int), limit=limit)).all()
+    next_after = rows[-1].id if len(rows) == limit else None
+    return _conditional({"data": [api.serialize(obj, kind, tree, fields) for obj in rows], "next_after": next_after})
+
+@api_bp.route("/<kind>/<int:obj_id>")
+def api_get(kind, obj_id):
+    if kind not in api.RESOURCES:
+        return jsonify({"error": f"unknown resource {kind!r}"}), 404
+    fields, tree = _options(kind)
+    obj = db.session.scalars(api.query(kind, fields, tree, ids=[obj_id])).first()
+    if obj is None:
+        return jsonify({"error": f"{kind} {obj_id} not found"}), 404
+    return _conditional({"data": api.serialize(obj, kind, tree, fields)})
@@ -1,8 +1,16 @@
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from datetime import date
+from flask import (Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify,
+                   current_app, stream_with_context)
+from sqlalchemy.orm import joinedload, selectinload
 from ..extensions import db
-from ..models import Pharma, Brand, Contract, Campaign, Program, Placement, TargetList
-from ..helpers import get_page, get_per_page, apply_search
+from ..cache import lookup
+from ..eligibility import eligible_target_lists
+from ..resolvers import resolve_pharmas, resolve_brands, brands_by_ids
+from .. import audience, bulk_edit, export, importer, jobs
+from ..m2m import sync_links
+from ..models import Pharma, Brand, Contract, Campaign, Program, Placement, TargetList, Job
+from ..helpers import get_per_page, get_cursor, keyset_paginate, apply_search
 
 contracts_bp = Blueprint("contracts", __name__)
 campaigns_bp = Blueprint("campaigns", __name__)
@@ -12,26 +20,31 @@ placements_bp = Blueprint("placements", __name__)
 # -------- Contracts (searchable list, view, create/edit, nested creates) --------
 @contracts_bp.route("/")
 def list_contracts():
-    page = get_page()
     per_page = get_per_page(15)
-    query = Contract.query.order_by(Contract.id.desc())
-    q = (request.args.get("q") or "").strip()
-    if q:
-        query = query.join(Pharma).outerjoin(Contract.brands).filter(
-            (Contract.name.ilike(f"%{q}%")) | (Pharma.name.ilike(f"%{q}%")) | (Brand.name.ilike(f"%{q}%"))
-        )
-    total = query.count()
-    rows = query.offset((page-1)*per_page).limit(per_page).all()
-    return render_template("contracts/list.html", contracts=rows, total=total, page=page, per_page=per_page, q=q)
+    query, q, keys = apply_search(Contract.query.options(selectinload(Contract.pharma), selectinload(Contract.brands)),
+                                  Contract, ["name"])
+    pager = keyset_paginate(query, keys, per_page, get_cursor())
+    return render_template("contracts/list.html", contracts=pager.items, pager=pager, total=pager.total, per_page=per_page, q=q)
 
 @contracts_bp.route("/<int:contract_id>")
 def view_contract(contract_id):
-    contract = Contract.query.get_or_404(contract_id)
-    campaigns = Campaign.query.filter_by(contract_id=contract.id).order_by(Campaign.name).all()
-    programs_by_campaign = {}
-    for c in campaigns:
-        programs_by_campaign[c.id] = Program.query.filter_by(campaign_id=c.id).order_by(Program.name).all()
-    all_programs = Program.query.join(Campaign, Program.campaign_id == Campaign.id).filter(Campaign.contract_id == contract.id).order_by(Program.name).all()
+    # One planned load for the whole tree; grouping happens in Python below
+    contract = (Contract.query
+                .options(
+                    joinedload(Contract.pharma),
+                    selectinload(Contract.brands),
+                    selectinload(Contract.campaigns)
+                    .selectinload(Campaign.programs)
+                    .options(
+                        joinedload(Program.target_list),
+                        selectinload(Program.placements).selectinload(Placement.programs),
+                    ),
+                )
+                .filter(Contract.id == contract_id)
+                .first_or_404())
+    campaigns = sorted(contract.campaigns, key=lambda c: c.name)
+    programs_by_campaign = {c.id: sorted(c.programs, key=lambda p: p.name) for c in campaigns}
+    all_programs = sorted((p for c in campaigns for p in c.programs), key=lambda p: p.name)
     return render_template("contracts/view.html",
                         contract=contract,
                         campaigns=campaigns,
@@ -46,7 +59,7 @@ def api_brands(pharma_id):
 
 @contracts_bp.route("/create", methods=["GET","POST"])
 def create_contract():
-    pharmas = Pharma.query.order_by(Pharma.name).all()
+    pharmas = lookup("pharmas")
     if request.method == "POST":
         name = request.form.get("name", "").strip()
         pharma_id = request.form.get("pharma_id", type=int)
@@ -59,25 +72,15 @@ def create_contract():
         if pharma_id:
             pharma = Pharma.query.get_or_404(pharma_id)
         else:
-            pharma = Pharma.query.filter_by(name=pharma_name).first()
-            if not pharma:
-                pharma = Pharma(name=pharma_name)
-                db.session.add(pharma)
-                db.session.flush()
+            pharma = resolve_pharmas([pharma_name])[pharma_name]
         contract = Contract(name=name, pharma=pharma)
         db.session.add(contract); db.session.flush()
         if brand_ids:
-            for bid in brand_ids:
-                b = Brand.query.get(bid)
-                if b and b.pharma_id == pharma.id:
-                    contract.brands.append(b)
+            contract.brands.extend(brands_by_ids(brand_ids, pharma_id=pharma.id))
         else:
-            for bn in [b.strip() for b in (brands_csv or '').split(',') if b.strip()]:
-                b = Brand.query.filter_by(name=bn, pharma=pharma).first()
-                if not b:
-                    b = Brand(name=bn, pharma=pharma)
-                    db.session.add(b); db.session.flush()
-                contract.brands.append(b)
+            brand_names = [b.strip() for b in (brands_csv or '').split(',') if b.strip()]
+            by_name = resolve_brands(pharma, brand_names)
+            contract.brands.extend(by_name[bn] for bn in dict.fromkeys(brand_names))
         db.session.commit()
         flash("Contract created.", "success")
         return redirect(url_for("contracts.view_contract", contract_id=contract.id))
@@ -86,7 +89,7 @@ def create_contract():
 @contracts_bp.route("/<int:contract_id>/edit", methods=["GET","POST"])
 def edit_contract(contract_id):
     contract = Contract.query.get_or_404(contract_id)
-    pharmas = Pharma.query.order_by(Pharma.name).all()
+    pharmas = lookup("pharmas")
     if request.method == "POST":
         name = request.form.get("name", "").strip()
         pharma_id = request.form.get("pharma_id", type=int)
@@ -97,17 +100,56 @@ def edit_contract(contract_id):
             contract.name = name
             pharma = Pharma.query.get_or_404(pharma_id)
             contract.pharma = pharma
-            contract.brands.clear()
-            for bid in brand_ids:
-                b = Brand.query.get(bid)
-                if b and b.pharma_id == pharma.id:
-                    contract.brands.append(b)
+            sync_links(db.session, contract, "brands", brand_ids, where=[Brand.pharma_id == pharma.id])
             db.session.commit()
             flash("Contract updated.", "success")
             return redirect(url_for("contracts.view_contract", contract_id=contract.id))
     brands_selected = {b.id for b in contract.brands}
     return render_template("contracts/form.html", contract=contract, pharmas=pharmas, brands_selected=brands_selected)
 
+@contracts_bp.route("/import", methods=["GET","POST"])
+def import_hierarchy():
+    if request.method == "POST":
+        file_storage = request.files.get("file")
+        batch_size = request.form.get("batch_size", type=int) or importer.DEFAULT_BATCH_SIZE
+        if not file_storage or not file_storage.filename:
+            flash("Please choose a CSV or JSON file.", "danger")
+        else:
+            fmt = "csv" if file_storage.filename.lower().endswith(".csv") else "json"
+            try:
+                job = jobs.enqueue("import_hierarchy", {"spool": jobs.spool(file_storage), "format": fmt,
+                                                        "batch_size": max(batch_size, 1)})
+                db.session.commit()
+                return redirect(url_for("contracts.import_hierarchy", job=job.id))
+            except Exception as e:
+                db.session.rollback()
+                flash(f"Import failed: {e}", "danger")
+    job = None
+    stats = None
+    job_id = request.args.get("job", type=int)
+    if job_id:
+        job = Job.query.get_or_404(job_id)
+        stats = jobs.as_dict(job)["result"]
+    return render_template("contracts/import.html", stats=stats, job=job)
+
+@contracts_bp.route("/export")
+def export_hierarchy():
+    """Stream the whole hierarchy (or one pharma's / some contracts') as CSV or Parquet."""
+    fmt = request.args.get("format", "csv")
+    pharma_id = request.args.get("pharma_id", type=int)
+    contract_ids = request.args.getlist("contract_id", type=int)
+    try:
+        export.check_format(fmt)
+    except (ValueError, export.ExportUnavailable) as e:
+        flash(f"Export failed: {e}", "danger")
+        return redirect(url_for("contracts.list_contracts"))
+    chunks = export.stream(fmt, current_app.config["EXPORT_BATCH_SIZE"], pharma_id=pharma_id,
+                           contract_ids=contract_ids)
+    filename = f"hierarchy-{date.today().isoformat()}.{fmt}"
+    # no Content-Length, so the body goes out chunked as batches are encoded
+    return Response(stream_with_context(chunks), mimetype=export.MIMETYPES[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 # nested creates on the contract view
 @contracts_bp.route("/<int:contract_id>/create-campaign", methods=["POST"])
 def contract_create_campaign(contract_id):
@@ -157,8 +199,7 @@ def contract_create_placement(contract_id):
     pl = Placement(name=name, channel=channel, status=status,
                    start_date=parse_d(start_date), end_date=parse_d(end_date))
     db.session.add(pl); db.session.flush()
-    chosen = Program.query.filter(Program.id.in_(program_ids)).all()
-    pl.programs = chosen
+    sync_links(db.session, pl, "programs", program_ids)
     db.session.commit()
     flash("Placement created.", "success")
     return redirect(url_for("contracts.view_contract", contract_id=contract.id))
@@ -166,19 +207,14 @@ def contract_create_placement(contract_id):
 # -------- Campaigns --------
 @campaigns_bp.route("/")
 def list_campaigns():
-    page = get_page()
     per_page = get_per_page(15)
-    query = Campaign.query.order_by(Campaign.id.desc())
-    q = (request.args.get("q") or "").strip()
-    if q:
-        query = query.join(Contract).filter((Campaign.name.ilike(f"%{q}%")) | (Contract.name.ilike(f"%{q}%")))
-    total = query.count()
-    rows = query.offset((page-1)*per_page).limit(per_page).all()
-    return render_template("campaigns/list.html", campaigns=rows, total=total, page=page, per_page=per_page, q=q)
+    query, q, keys = apply_search(Campaign.query.options(selectinload(Campaign.contract)), Campaign, ["name"])
+    pager = keyset_paginate(query, keys, per_page, get_cursor())
+    return render_template("campaigns/list.html", campaigns=pager.items, pager=pager, total=pager.total, per_page=per_page, q=q)
 
 @campaigns_bp.route("/create", methods=["GET","POST"])
 def create_campaign():
-    contracts = Contract.query.order_by(Contract.name).all()
+    contracts = lookup("contracts")
     if request.method == "POST":
         name = request.form.get("name","").strip()
         contract_id = request.form.get("contract_id", type=int)
@@ -194,7 +230,7 @@ def create_campaign():
 @campaigns_bp.route("/<int:campaign_id>/edit", methods=["GET","POST"])
 def edit_campaign(campaign_id):
     c = Campaign.query.get_or_404(campaign_id)
-    contracts = Contract.query.order_by(Contract.name).all()
+    contracts = lookup("contracts")
     if request.method == "POST":
         c.name = request.form.get("name","").strip()
         c.contract_id = request.form.get("contract_id", type=int)
@@ -206,20 +242,17 @@ def edit_campaign(campaign_id):
 # -------- Programs --------
 @programs_bp.route("/")
 def list_programs():
-    page = get_page()
     per_page = get_per_page(15)
-    query = Program.query.order_by(Program.id.desc())
-    q = (request.args.get("q") or "").strip()
-    if q:
-        query = query.join(Campaign).filter((Program.name.ilike(f"%{q}%")) | (Campaign.name.ilike(f"%{q}%")))
-    total = query.count()
-    rows = query.offset((page-1)*per_page).limit(per_page).all()
-    return render_template("programs/list.html", programs=rows, total=total, page=page, per_page=per_page, q=q)
+    query, q, keys = apply_search(Program.query.options(selectinload(Program.campaign), selectinload(Program.target_list)),
+                                  Program, ["name"])
+    pager = keyset_paginate(query, keys, per_page, get_cursor())
+    reach = audience.expected_reach(p.id for p in pager.items)
+    return render_template("programs/list.html", programs=pager.items, pager=pager, total=pager.total, per_page=per_page, q=q, reach=reach)
 
 @programs_bp.route("/create", methods=["GET","POST"])
 def create_program():
-    campaigns = Campaign.query.order_by(Campaign.name).all()
-    tls = TargetList.query.order_by(TargetList.uploaded_at.desc()).all()
+    campaigns = lookup("campaigns")
+    tls = lookup("target_lists")
     if request.method == "POST":
         name = request.form.get("name","").strip()
         campaign_id = request.form.get("campaign_id", type=int)
@@ -235,7 +268,7 @@ def create_program():
 @programs_bp.route("/<int:program_id>/edit", methods=["GET","POST"])
 def edit_program(program_id):
     program = Program.query.get_or_404(program_id)
-    campaigns = Campaign.query.order_by(Campaign.name).all()
+    campaigns = lookup("campaigns")
 
     if request.method == "POST":
         program.name = request.form.get("name","").strip()
@@ -250,21 +283,7 @@ def edit_program(program_id):
         return redirect(url_for("programs.list_programs"))
     
     # --- prefilter by program's campaign -> contract (pharma & brands) ---
-    filtered_tls = []
-    if program.campaign_id:
-        camp = Campaign.query.get(program.campaign_id)
-        contract = Contract.query.get(camp.contract_id) if camp else None
-        if contract:
-            pharma_id = contract.pharma_id
-            brand_ids = [b.id for b in contract.brands]
-            if pharma_id and brand_ids:
-                filtered_tls = (TargetList.query
-                                .filter(
-                                    TargetList.pharmas.any(Pharma.id == pharma_id),
-                                    TargetList.brands.any(Brand.id.in_(brand_ids))
-                                )
-                                .order_by(TargetList.label)
-                                .all())
+    filtered_tls = eligible_target_lists(program.campaign_id) if program.campaign_id else []
 
     # make sure the currently selected TL is present
     if program.target_list_id and all(tl.id != program.target_list_id for tl in filtered_tls):
@@ -283,19 +302,14 @@ def edit_program(program_id):
 # -------- Placements (M2M) --------
 @placements_bp.route("/")
 def list_placements():
-    page = get_page()
     per_page = get_per_page(15)
-    query = Placement.query.order_by(Placement.id.desc())
-    q = (request.args.get("q") or "").strip()
-    if q:
-        query = query.filter(Placement.name.ilike(f"%{q}%"))
-    total = query.count()
-    rows = query.offset((page-1)*per_page).limit(per_page).all()
-    return render_template("placements/list.html", placements=rows, total=total, page=page, per_page=per_page, q=q)
+    query, q, keys = apply_search(Placement.query.options(selectinload(Placement.programs)), Placement, ["name"])
+    pager = keyset_paginate(query, keys, per_page, get_cursor())
+    return render_template("placements/list.html", placements=pager.items, pager=pager, total=pager.total, per_page=per_page, q=q)
 
 @placements_bp.route("/create", methods=["GET","POST"])
 def create_placement():
-    programs = Program.query.order_by(Program.name).all()
+    programs = lookup("programs")
     if request.method == "POST":
         name = request.form.get("name","").strip()
         program_ids = request.form.getlist("program_ids", type=int)
@@ -315,9 +329,7 @@ def create_placement():
             pl = Placement(name=name, channel=channel, status=status,
                            start_date=parse_d(start_date), end_date=parse_d(end_date))
             db.session.add(pl); db.session.flush()
-            if program_ids:
-                chosen = Program.query.filter(Program.id.in_(program_ids)).all()
-                pl.programs = chosen
+            sync_links(db.session, pl, "programs", program_ids)
             db.session.commit()
             flash("Placement created.", "success")
             return redirect(url_for("placements.list_placements"))
@@ -326,7 +338,7 @@ def create_placement():
 @placements_bp.route("/<int:placement_id>/edit", methods=["GET","POST"])
 def edit_placement(placement_id):
     pl = Placement.query.get_or_404(placement_id)
-    programs = Program.query.order_by(Program.name).all()
+    programs = lookup("programs")
 
     def _parse_date(s):
         from datetime import date
@@ -348,9 +360,7 @@ def edit_placement(placement_id):
         pl.ad_server = request.form.get("ad_server","").strip() or None
         pl.impression_goal = request.form.get("impression_goal", type=int)
         pl.click_goal = request.form.get("click_goal", type=int)
-
-        chosen = Program.query.filter(Program.id.in_(program_ids)).all() if program_ids else []
-        pl.programs = chosen
+        sync_links(db.session, pl, "programs", program_ids)
 
         db.session.commit()
         flash("Placement updated.", "success")
@@ -363,4 +373,51 @@ def edit_placement(placement_id):
     selected_program_ids = {p.id for p in pl.programs}
     return render_template("placements/form.html", programs=programs, placement=pl, selected_program_ids=selected_program_ids)
 
+def _id_list(value):
+    return [int(v) for v in str(value or "").replace(";", ",").split(",") if v.strip()]
+
+@placements_bp.route("/bulk-edit", methods=["POST"])
+def bulk_edit_placements():
+    """
+    Edit many placements at once. Takes the list page's form or JSON
+    {"ids", "values", "shift_days", "add_program_ids", "remove_program_ids",
+    "expect_status"} and answers JSON requests with the stats or the errors.
+    """
+    as_json = request.is_json
+    try:
+        if as_json:
+            data = request.get_json()
+            ids, values = [int(i) for i in data.get("ids") or []], dict(data.get("values") or {})
+            options = {"shift_days": int(data.get("shift_days") or 0),
+                       "add_program_ids": [int(i) for i in data.get("add_program_ids") or []],
+                       "remove_program_ids": [int(i) for i in data.get("remove_program_ids") or []],
+                       "expect_status": data.get("expect_status") or None}
+        else:
+            ids = request.form.getlist("placement_ids", type=int)
+            # blank inputs leave the field alone (JSON clears a field with null)
+            values = {f: request.form[f] for f in bulk_edit.FIELDS if request.form.get(f, "").strip()}
+            options = {"shift_days": request.form.get("shift_days", 0, type=int),
+                       "add_program_ids": _id_list(request.form.get("add_program_ids")),
+                       "remove_program_ids": _id_list(request.form.get("remove_program_ids")),
+                       "expect_status": request.form.get("expect_status", "").strip() or None}
+    except (TypeError, ValueError, AttributeError):
+        if as_json:
+            return jsonify({"errors": ["malformed request"]}), 400
+        flash("Bulk edit failed: program ids and day shifts must be whole numbers.", "danger")
+        return redirect(request.form.get("next") or url_for("placements.list_placements"))
+    try:
+        stats = bulk_edit.bulk_edit(db.session, ids, values, **options)
+        db.session.commit()
+    except bulk_edit.BulkEditError as e:
+        db.session.rollback()
+        if as_json:
+            return jsonify({"errors": e.errors}), 400
+        flash(f"Bulk edit failed, nothing was changed: {e}", "danger")
+    else:
+        if as_json:
+            return jsonify(stats.as_dict())
+        flash(f"Updated {stats.placements} placements ({stats.links_added} program links added, "
+              f"{stats.links_removed} removed).", "success")
+    return redirect(request.form.get("next") or url_for("placements.list_placements"))
+
 
@@ -1,32 +1,23 @@
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from ..extensions import db
-from ..models import Client, Pharma, Brand
-from ..helpers import get_page, get_per_page, apply_search
+from ..models import Client, Pharma
+from ..resolvers import resolve_pharmas, resolve_brands
+from ..helpers import get_per_page, get_cursor, keyset_paginate, apply_search
 
 clients_bp = Blueprint("clients", __name__)
 
 def _sync_pharma_and_brands_for_client(name: str, brands_csv: str):
-    pharma = Pharma.query.filter_by(name=name).first()
-    if not pharma:
-        pharma = Pharma(name=name)
-        db.session.add(pharma)
-        db.session.flush()
-    brand_names = [b.strip() for b in (brands_csv or '').split(',') if b.strip()]
-    for bn in brand_names:
-        existing = Brand.query.filter_by(name=bn, pharma=pharma).first()
-        if not existing:
-            db.session.add(Brand(name=bn, pharma=pharma))
+    pharma = resolve_pharmas([name])[name]
+    resolve_brands(pharma, [b.strip() for b in (brands_csv or '').split(',') if b.strip()])
 
 @clients_bp.route("/")
 def list_clients():
-    page = get_page()
     per_page = get_per_page(15)
-    query = Client.query.order_by(Client.created_at.desc())
-    query, q = apply_search(query, Client, ["name", "notes"])
-    total = query.count()
-    rows = query.offset((page-1)*per_page).limit(per_page).all()
-    return render_template("clients/list.html", clients=rows, total=total, page=page, per_page=per_page, q=q)
+    query, q, keys = apply_search(Client.query, Client, ["name", "notes"],
+                                  keys=[(Client.created_at, "desc"), (Client.id, "desc")])
+    pager = keyset_paginate(query, keys, per_page, get_cursor())
+    return render_template("clients/list.html", clients=pager.items, pager=pager, total=pager.total, per_page=per_page, q=q)
 
 @clients_bp.route("/create", methods=["GET","POST"])
 def create_client():
@@ -0,0 +1,21 @@
+from flask import Blueprint, jsonify, request
+from ..models import Job
+from ..jobs import as_dict
+
+jobs_bp = Blueprint("jobs", __name__)
+
+@jobs_bp.route("/")
+def list_jobs():
+    query = Job.query
+    status = request.args.get("status")
+    if status:
+        query = query.filter(Job.status == status)
+    kind = request.args.get("kind")
+    if kind:
+        query = query.filter(Job.kind == kind)
+    limit = min(request.args.get("limit", 50, type=int), 500)
+    return jsonify([as_dict(j) for j in query.order_by(Job.id.desc()).limit(limit)])
+
+@jobs_bp.route("/<int:job_id>")
+def job_status(job_id):
+    return jsonify(as_dict(Job.query.get_or_404(job_id)))
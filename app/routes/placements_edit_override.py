@@ -1,7 +1,9 @@
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from ..extensions import db
-from ..models import Pharma, Brand, Contract, Campaign, Program, Placement, TargetList
+from ..m2m import sync_links
+from ..cache import lookup
+from ..models import Pharma, Brand, Contract, Campaign, Placement, TargetList
 
 contracts_bp = Blueprint("contracts", __name__)
 campaigns_bp = Blueprint("campaigns", __name__)
@@ -18,7 +20,7 @@ def parse_date(s):
 @placements_bp.route("/<int:placement_id>/edit", methods=["GET","POST"])
 def edit_placement(placement_id):
     pl = Placement.query.get_or_404(placement_id)
-    programs = Program.query.order_by(Program.name).all()
+    programs = lookup("programs")
     if request.method == "POST":
         pl.name = request.form.get("name","").strip()
         program_ids = request.form.getlist("program_ids", type=int)
@@ -32,8 +34,7 @@ def edit_placement(placement_id):
         pl.ad_server = request.form.get("ad_server","").strip() or None
         pl.impression_goal = request.form.get("impression_goal", type=int)
         pl.click_goal = request.form.get("click_goal", type=int)
-        chosen = Program.query.filter(Program.id.in_(program_ids)).all() if program_ids else []
-        pl.programs = chosen
+        sync_links(db.session, pl, "programs", program_ids)
         db.session.commit()
         flash("Placement updated.", "success")
         nxt = request.form.get("next")
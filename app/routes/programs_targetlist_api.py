@@ -1,8 +1,17 @@
 from flask import request, jsonify
 from ..extensions import db
-from ..models import Campaign, Contract, Pharma, Brand, TargetList
+from ..models import TargetList
+from ..eligibility import eligible_target_lists
 from .campaigns_programs import programs_bp
 
+def target_list_options(tls, current=None):
+    """``[{id, label}]`` for the program form's dropdown, keeping ``current`` selectable (shared with /aio)."""
+    tls = list(tls)
+    if current is not None and all(t.id != current.id for t in tls):
+        tls.append(current)
+    tls.sort(key=lambda x: (x.label or '').lower())
+    return [{"id": t.id, "label": t.label} for t in tls]
+
 @programs_bp.route("/api/target-lists")
 def api_program_target_lists():
     if request.args.get("all") == "1":
@@ -14,25 +23,8 @@ def api_program_target_lists():
     if not campaign_id:
         return jsonify([])
 
-    camp = Campaign.query.get_or_404(campaign_id)
-    contract = Contract.query.get_or_404(camp.contract_id)
-    pharma_id = contract.pharma_id
-    brand_ids = [b.id for b in contract.brands]
-
-    tls = []
-    if pharma_id and brand_ids:
-        tls = (TargetList.query
-               .filter(
-                 TargetList.pharmas.any(Pharma.id == pharma_id),
-                 TargetList.brands.any(Brand.id.in_(brand_ids))
-               )
-               .order_by(TargetList.label)
-               .all())
-
+    tls = eligible_target_lists(campaign_id)
+    cur = None
     if current_tl_id and all(t.id != current_tl_id for t in tls):
-        cur = TargetList.query.get(current_tl_id)
-        if cur:
-            tls.append(cur)
-
-    tls.sort(key=lambda x: (x.label or '').lower())
-    return jsonify([{"id": t.id, "label": t.label} for t in tls])
+        cur = db.session.get(TargetList, current_tl_id)
+    return jsonify(target_list_options(tls, cur))
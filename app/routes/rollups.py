@@ -0,0 +1,42 @@
+from flask import Blueprint, abort, jsonify, request
+from sqlalchemy import select
+from ..extensions import db
+from ..models import Campaign, Contract
+from ..rollups import TABLES, as_dict
+
+rollups_bp = Blueprint("rollups", __name__)
+
+_LEVELS = {"campaigns": "campaign", "contracts": "contract", "pharmas": "pharma"}
+# ?<parent>_id= filter per level: (parameter, model, parent column)
+_PARENTS = {"campaign": ("contract_id", Campaign, Campaign.contract_id),
+            "contract": ("pharma_id", Contract, Contract.pharma_id)}
+
+@rollups_bp.route("/<any(campaigns, contracts, pharmas):kind>")
+def api_rollups(kind):
+    """KPI rollups for ?ids=1,2 and/or ?contract_id= (campaigns) / ?pharma_id= (contracts), by id."""
+    level = _LEVELS[kind]
+    table = TABLES[level]
+    key = table.c[f"{level}_id"]
+    stmt = select(table).order_by(key)
+    ids = [int(v) for value in request.args.getlist("ids") for v in value.split(",") if v.strip().isdigit()]
+    if ids:
+        stmt = stmt.where(key.in_(ids))
+    if level in _PARENTS:
+        param, model, parent = _PARENTS[level]
+        parent_id = request.args.get(param, type=int)
+        if parent_id:
+            stmt = stmt.where(key.in_(select(model.id).where(parent == parent_id)))
+    after = request.args.get("after", type=int)
+    if after:
+        stmt = stmt.where(key > after)
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
+    return jsonify([as_dict(r, level) for r in db.session.execute(stmt.limit(limit))])
+
+@rollups_bp.route("/<any(campaigns, contracts, pharmas):kind>/<int:owner_id>")
+def api_rollup(kind, owner_id):
+    level = _LEVELS[kind]
+    table = TABLES[level]
+    row = db.session.execute(select(table).where(table.c[f"{level}_id"] == owner_id)).first()
+    if row is None:
+        abort(404)
+    return jsonify(as_dict(row, level))
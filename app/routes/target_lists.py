@@ -1,17 +1,25 @@
 # app/routes/target_lists.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from werkzeug.utils import secure_filename
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from ..extensions import db
-from ..models import Pharma, Brand, TargetList
+from .. import audience, jobs, overlap
+from ..cache import lookup
+from ..m2m import sync_links
+from ..models import TargetList
+from ..s3_utils import (s3_client, upload_stream, generate_presigned_get_url, presigned_post,
+                        start_presigned_multipart, complete_presigned_multipart)
 from flask import current_app as app
 
-import io
+import hashlib
+import json
+import os
 import time
-
-try:
-    import boto3
-except Exception:
-    boto3 = None
+import uuid
+from botocore.exceptions import ClientError
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 
 target_lists_bp = Blueprint("target_lists", __name__)
 
@@ -24,24 +32,7 @@ def parse_int_list(values):
             pass
     return out
 
-def _require_s3_client():
-    if not boto3:
-        raise RuntimeError("boto3 not installed. `pip install boto3`")
-    region = app.config.get("AWS_REGION") or "us-east-1"
-    return boto3.client("s3", region_name=region)
-
-def _upload_to_s3(file_storage, bucket, key, kms_key_id=None, acl=None):
-    """
-    Uploads the given Werkzeug file to S3 and returns (s3_key, original_filename, size_bytes).
-    """
-    filename = secure_filename(file_storage.filename or f"upload-{int(time.time())}")
-    # Read into memory for reliable size
-    data = file_storage.read()
-    size_bytes = len(data)
-    file_storage.stream.close()
-
-    client = _require_s3_client()
-
+def _s3_extra_args(kms_key_id=None, acl=None):
     extra = {}
     # Optional server-side encryption
     if kms_key_id:
@@ -53,24 +44,87 @@ def _upload_to_s3(file_storage, bucket, key, kms_key_id=None, acl=None):
     # Optional ACL
     if acl:
         extra["ACL"] = acl
+    return extra
+
+def _find_duplicate(digest, exclude_id=None):
+    """An existing TargetList whose stored object has this SHA-256, if any."""
+    query = TargetList.query.filter(TargetList.content_sha256 == digest)
+    if exclude_id is not None:
+        query = query.filter(TargetList.id != exclude_id)
+    return query.order_by(TargetList.id).first()
+
+def _point_at(tl, existing, filename, digest):
+    tl.s3_key = existing.s3_key
+    tl.original_filename = filename
+    tl.size_bytes = existing.size_bytes
+    tl.content_sha256 = digest
+    return audience.copy(existing.id, tl.id)
 
-    client.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=data,
-        **extra,
-    )
-    return key, filename, size_bytes
+def _enqueue_upload(file_storage, tl, bucket, key, kms_key_id=None, acl=None):
+    """
+    Spools the given Werkzeug file to local disk, hashing it on the way, and queues
+    its transfer to S3. The job fills in tl.s3_key / original_filename / size_bytes
+    once the object exists, so a new list has no s3_key until then. If an identical
+    object is already stored, tl points at it straight away and None is returned
+    instead of a job.
+    """
+    filename = secure_filename(file_storage.filename or f"upload-{int(time.time())}")
+    hasher = hashlib.sha256()
+    path = jobs.spool(file_storage, hasher)
+    digest = hasher.hexdigest()
+    existing = _find_duplicate(digest, exclude_id=tl.id)
+    if existing is not None:
+        os.remove(path)
+        if not _point_at(tl, existing, filename, digest) and bucket:
+            audience.enqueue_ingest(tl)
+        return None
+    payload = {
+        "tl_id": tl.id, "bucket": bucket, "key": key, "filename": filename, "sha256": digest,
+        "extra": _s3_extra_args(kms_key_id, acl),
+        "spool": path,
+    }
+    return jobs.enqueue("target_list_upload", payload, subject=("target_list", tl.id))
+
+@jobs.handler("target_list_upload")
+def _finish_upload(payload):
+    tl = db.session.get(TargetList, payload["tl_id"])
+    if tl is None:
+        return {"skipped": "target list was deleted"}
+    # An identical file may have finished uploading while this job waited
+    existing = _find_duplicate(payload["sha256"], exclude_id=tl.id)
+    if existing is not None:
+        if _point_at(tl, existing, payload["filename"], payload["sha256"]):
+            return {"s3_key": existing.s3_key, "deduplicated_from": existing.id}
+        size_bytes = existing.size_bytes
+    else:
+        with open(payload["spool"], "rb") as fh:
+            # Size is counted as parts stream through; the body is never held whole
+            size_bytes = upload_stream(s3_client(), fh, payload["bucket"], payload["key"],
+                                       extra_args=payload["extra"])
+        tl.s3_key = payload["key"]
+        tl.original_filename = payload["filename"]
+        tl.size_bytes = size_bytes
+        tl.content_sha256 = payload["sha256"]
+    # Index the identifiers from the local copy rather than reading the object back
+    with open(payload["spool"], "rb") as fh:
+        indexed = audience.ingest(tl.id, fh, payload["filename"])
+    return {"s3_key": tl.s3_key, "size_bytes": size_bytes,
+            "audience": indexed.status, "identifier_count": indexed.identifier_count}
 
 @target_lists_bp.route("/")
 def list_target_lists():
-    tls = TargetList.query.order_by(TargetList.uploaded_at.desc()).all()
-    return render_template("target_lists/list.html", target_lists=tls)
+    tls = (TargetList.query
+           .options(selectinload(TargetList.pharmas), selectinload(TargetList.brands),
+                    selectinload(TargetList.audience))
+           .order_by(TargetList.uploaded_at.desc())
+           .all())
+    upload_jobs = jobs.latest_for("target_list", [tl.id for tl in tls])
+    return render_template("target_lists/list.html", target_lists=tls, upload_jobs=upload_jobs)
 
 @target_lists_bp.route("/create", methods=["GET","POST"])
 def create_target_list():
-    pharmas = Pharma.query.order_by(Pharma.name).all()
-    brands = Brand.query.order_by(Brand.name).all()
+    pharmas = lookup("pharmas")
+    brands = lookup("brands")
     if request.method == "POST":
         label = (request.form.get("label") or "").strip()
 
@@ -86,6 +140,7 @@ def create_target_list():
         s3_key = None
         original_filename = None
         size_bytes = None
+        pending_upload = None
 
         bucket = app.config.get("S3_BUCKET_NAME")
         prefix = app.config.get("S3_PREFIX", "target-lists/")
@@ -98,19 +153,12 @@ def create_target_list():
                 return render_template("target_lists/form.html", tl=None, pharmas=pharmas, brands=brands,
                                        selected_pharma_ids=[], selected_brand_ids=[])
 
-            # Build an S3 key: <prefix><epoch>-<filename>
+            # Build an S3 key: <prefix><epoch>-<filename>; the job records it once the object exists
             safe = secure_filename(file_storage.filename)
             ts = int(time.time())
-            key = f"{prefix}{ts}-{safe}"
-
-            try:
-                s3_key, original_filename, size_bytes = _upload_to_s3(
-                    file_storage, bucket=bucket, key=key, kms_key_id=kms_key_id, acl=acl
-                )
-            except Exception as e:
-                flash(f"Upload to S3 failed: {e}", "danger")
-                return render_template("target_lists/form.html", tl=None, pharmas=pharmas, brands=brands,
-                                       selected_pharma_ids=[], selected_brand_ids=[])
+            upload_key = f"{prefix}{ts}-{safe}"
+            original_filename = safe
+            pending_upload = file_storage
         elif pasted_s3_key:
             s3_key = pasted_s3_key
             original_filename = (request.form.get("original_filename") or "").strip() or s3_key.split("/")[-1]
@@ -129,15 +177,29 @@ def create_target_list():
         db.session.add(tl)
         db.session.flush()
 
+        if pending_upload is not None:
+            try:
+                job = _enqueue_upload(pending_upload, tl, bucket=bucket, key=upload_key, kms_key_id=kms_key_id, acl=acl)
+            except Exception as e:
+                db.session.rollback()
+                flash(f"Upload failed: {e}", "danger")
+                return render_template("target_lists/form.html", tl=None, pharmas=pharmas, brands=brands,
+                                       selected_pharma_ids=[], selected_brand_ids=[])
+
         pharma_ids = parse_int_list(request.form.getlist("pharma_ids"))
         brand_ids = parse_int_list(request.form.getlist("brand_ids"))
-        if pharma_ids:
-            tl.pharmas = Pharma.query.filter(Pharma.id.in_(pharma_ids)).all()
-        if brand_ids:
-            tl.brands = Brand.query.filter(Brand.id.in_(brand_ids)).all()
+        sync_links(db.session, tl, "pharmas", pharma_ids)
+        sync_links(db.session, tl, "brands", brand_ids)
+        if pending_upload is None and bucket:
+            audience.enqueue_ingest(tl)
 
         db.session.commit()
-        flash("Target List created.", "success")
+        if pending_upload is not None and job is None:
+            flash("Target List created. An identical file was already stored, so the upload was skipped.", "success")
+        elif pending_upload is not None:
+            flash(f"Target List created. The file is uploading in the background (job {job.id}).", "success")
+        else:
+            flash("Target List created.", "success")
         return redirect(url_for("target_lists.list_target_lists"))
 
     return render_template("target_lists/form.html", tl=None, pharmas=pharmas, brands=brands,
@@ -146,8 +208,8 @@ def create_target_list():
 @target_lists_bp.route("/<int:tl_id>/edit", methods=["GET","POST"])
 def edit_target_list(tl_id):
     tl = TargetList.query.get_or_404(tl_id)
-    pharmas = Pharma.query.order_by(Pharma.name).all()
-    brands = Brand.query.order_by(Brand.name).all()
+    pharmas = lookup("pharmas")
+    brands = lookup("brands")
 
     if request.method == "POST":
         tl.label = (request.form.get("label") or tl.label).strip() or tl.label
@@ -160,6 +222,8 @@ def edit_target_list(tl_id):
         kms_key_id = app.config.get("S3_KMS_KEY_ID")
         acl = app.config.get("S3_ACL")
 
+        job = None
+        deduplicated = False
         if file_storage and getattr(file_storage, "filename", ""):
             if not bucket:
                 flash("S3 bucket is not configured. Set S3_BUCKET_NAME.", "danger")
@@ -170,32 +234,220 @@ def edit_target_list(tl_id):
             ts = int(time.time())
             key = f"{prefix}{ts}-{safe}"
             try:
-                s3_key, original_filename, size_bytes = _upload_to_s3(
-                    file_storage, bucket=bucket, key=key, kms_key_id=kms_key_id, acl=acl
-                )
-                tl.s3_key = s3_key
-                tl.original_filename = original_filename
-                tl.size_bytes = size_bytes
+                # The current file stays in place until the new one is uploaded
+                job = _enqueue_upload(file_storage, tl, bucket=bucket, key=key, kms_key_id=kms_key_id, acl=acl)
+                deduplicated = job is None
             except Exception as e:
-                flash(f"Upload to S3 failed: {e}", "danger")
+                flash(f"Upload failed: {e}", "danger")
                 return render_template("target_lists/form.html", tl=tl, pharmas=pharmas, brands=brands,
                                        selected_pharma_ids={p.id for p in tl.pharmas},
                                        selected_brand_ids={b.id for b in tl.brands})
         elif pasted_s3_key:
+            changed = pasted_s3_key != tl.s3_key
+            if changed:
+                tl.content_sha256 = None  # re-computed when the new object is ingested
             tl.s3_key = pasted_s3_key
             tl.original_filename = (request.form.get("original_filename") or "").strip() or pasted_s3_key.split("/")[-1]
+            if changed and bucket:
+                audience.enqueue_ingest(tl)
 
         # Update mappings
         pharma_ids = parse_int_list(request.form.getlist("pharma_ids"))
         brand_ids = parse_int_list(request.form.getlist("brand_ids"))
-        tl.pharmas = Pharma.query.filter(Pharma.id.in_(pharma_ids)).all() if pharma_ids else []
-        tl.brands = Brand.query.filter(Brand.id.in_(brand_ids)).all() if brand_ids else []
+        sync_links(db.session, tl, "pharmas", pharma_ids)
+        sync_links(db.session, tl, "brands", brand_ids)
 
         db.session.commit()
-        flash("Target List updated.", "success")
+        if deduplicated:
+            flash("Target List updated. An identical file was already stored, so the upload was skipped.", "success")
+        elif job is not None:
+            flash(f"Target List updated. The new file is uploading in the background (job {job.id}).", "success")
+        else:
+            flash("Target List updated.", "success")
         return redirect(url_for("target_lists.list_target_lists"))
 
     selected_pharma_ids = {p.id for p in tl.pharmas}
     selected_brand_ids = {b.id for b in tl.brands}
     return render_template("target_lists/form.html", tl=tl, pharmas=pharmas, brands=brands,
                            selected_pharma_ids=selected_pharma_ids, selected_brand_ids=selected_brand_ids)
+
+@target_lists_bp.route("/<int:tl_id>/audience")
+def target_list_audience(tl_id):
+    tl = TargetList.query.options(selectinload(TargetList.audience)).get_or_404(tl_id)
+    a = tl.audience
+    if a is None:
+        return jsonify({"target_list_id": tl.id, "status": "pending"})
+    return jsonify({
+        "target_list_id": tl.id, "status": a.status, "error": a.error,
+        "identifier_column": a.identifier_column, "row_count": a.row_count,
+        "invalid_count": a.invalid_count, "identifier_count": a.identifier_count,
+        "ingested_at": a.ingested_at.isoformat() if a.ingested_at else None,
+    })
+
+def _requested_ids():
+    ids = []
+    for value in request.args.getlist("ids"):
+        ids.extend(parse_int_list(value.split(",")))
+    campaign_id = request.args.get("campaign_id", type=int)
+    if campaign_id:
+        ids.extend(overlap.campaign_target_lists(campaign_id))
+    return list(dict.fromkeys(ids))
+
+@target_lists_bp.route("/overlap")
+def target_list_overlap():
+    """N×N shared-HCP counts for ?ids=1,2,3 (and/or every list used by ?campaign_id=)."""
+    ids = _requested_ids()
+    limit = app.config["OVERLAP_MAX_LISTS"]
+    if len(ids) > limit:
+        return jsonify({"error": f"at most {limit} target lists per request"}), 400
+    started = time.perf_counter()
+    ids, sizes, matrix, missing = overlap.matrix(ids)
+    labels = dict(db.session.execute(select(TargetList.id, TargetList.label).where(TargetList.id.in_(ids))).all())
+    return jsonify({
+        "ids": ids, "labels": [labels.get(i) for i in ids], "sizes": sizes, "matrix": matrix,
+        "not_indexed": missing, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+
+@target_lists_bp.route("/reach")
+def target_list_reach():
+    """De-duplicated reach and common core across ?ids= and/or a campaign's program lists."""
+    ids = _requested_ids()
+    if len(ids) > app.config["OVERLAP_MAX_LISTS"]:
+        return jsonify({"error": f"at most {app.config['OVERLAP_MAX_LISTS']} target lists per request"}), 400
+    ids, missing, union, intersection = overlap.combined(ids)
+    return jsonify({
+        "ids": ids, "not_indexed": missing,
+        "sum_of_sizes": sum(audience.sizes(ids).values()),
+        "deduplicated_reach": union, "shared_by_all": intersection,
+    })
+
+@target_lists_bp.route("/<int:tl_id>/download")
+def download_target_list(tl_id):
+    tl = TargetList.query.get_or_404(tl_id)
+    if tl.s3_key is None:
+        flash("This target list's file has not been uploaded yet.", "warning")
+        return redirect(url_for("target_lists.list_target_lists"))
+    try:
+        return redirect(generate_presigned_get_url(tl.s3_key))
+    except RuntimeError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("target_lists.list_target_lists"))
+
+# -------- Direct browser-to-S3 uploads (S3_DIRECT_UPLOADS) --------
+def _direct_upload_tokens():
+    return URLSafeTimedSerializer(app.secret_key, salt="target-list-direct-upload")
+
+@target_lists_bp.route("/direct-upload", methods=["POST"])
+def start_direct_upload():
+    """Hand the browser a presigned POST (small files) or presigned multipart PUT URLs."""
+    bucket = app.config.get("S3_BUCKET_NAME")
+    if not app.config["S3_DIRECT_UPLOADS"] or not bucket:
+        return jsonify({"error": "Direct uploads are not enabled."}), 404
+    size = request.form.get("size", type=int)
+    if not size or size <= 0:
+        return jsonify({"error": "File size is required."}), 400
+    filename = secure_filename(request.form.get("filename") or "") or f"upload-{int(time.time())}"
+    # the nonce keeps same-second uploads of one filename apart and identifies this upload
+    nonce = uuid.uuid4().hex
+    key = f"{app.config.get('S3_PREFIX', 'target-lists/')}{int(time.time())}-{nonce}-{filename}"
+    extra = _s3_extra_args(app.config.get("S3_KMS_KEY_ID"), app.config.get("S3_ACL"))
+    expires = app.config["S3_DIRECT_UPLOAD_EXPIRES"]
+    post_max = app.config["S3_DIRECT_POST_MAX_MB"] * 1024 * 1024
+    client = s3_client()
+    state = {"key": key, "filename": filename, "nonce": nonce}
+    if size <= post_max:
+        post = presigned_post(client, bucket, key, post_max, extra_args=extra, expires_in=expires)
+        return jsonify({"mode": "post", "url": post["url"], "fields": post["fields"],
+                        "token": _direct_upload_tokens().dumps(state)})
+    upload_id, part_size, parts = start_presigned_multipart(client, bucket, key, size, extra_args=extra,
+                                                            expires_in=expires)
+    state["upload_id"] = upload_id
+    return jsonify({"mode": "multipart", "part_size": part_size, "parts": parts,
+                    "token": _direct_upload_tokens().dumps(state)})
+
+def _direct_upload_state():
+    """The signed state from start_direct_upload, or None when the token is bad or expired."""
+    try:
+        return _direct_upload_tokens().loads(request.form.get("token", ""),
+                                             max_age=app.config["S3_DIRECT_UPLOAD_EXPIRES"] + 300)
+    except BadSignature:
+        return None
+
+@target_lists_bp.route("/direct-upload/complete", methods=["POST"])
+def complete_direct_upload():
+    """
+    Called by the browser once the object is in S3; records (or updates) the
+    TargetList. A repeated call for the same token (double click, fetch retry)
+    returns the list already recorded for its upload nonce instead of creating
+    another.
+    """
+    bucket = app.config.get("S3_BUCKET_NAME")
+    state = _direct_upload_state()
+    if state is None or "nonce" not in state:
+        return jsonify({"error": "Upload token is invalid or expired."}), 400
+    recorded = TargetList.query.filter_by(upload_nonce=state["nonce"]).first()
+    if recorded is not None:
+        return _completed(recorded)
+    client = s3_client()
+    try:
+        if state.get("upload_id"):
+            complete_presigned_multipart(client, bucket, state["key"], state["upload_id"],
+                                         json.loads(request.form.get("parts") or "[]"))
+        head = client.head_object(Bucket=bucket, Key=state["key"])
+    except Exception as e:
+        return jsonify({"error": f"Upload could not be completed: {e}"}), 400
+
+    tl_id = request.form.get("tl_id", type=int)
+    label = (request.form.get("label") or "").strip()
+    if tl_id:
+        tl = TargetList.query.get_or_404(tl_id)
+        tl.label = label or tl.label
+    elif not label:
+        return jsonify({"error": "Label is required."}), 400
+    else:
+        tl = TargetList(label=label, s3_key=state["key"], original_filename=state["filename"])
+        db.session.add(tl)
+    tl.s3_key = state["key"]
+    tl.upload_nonce = state["nonce"]
+    tl.original_filename = state["filename"]
+    tl.size_bytes = head["ContentLength"]
+    tl.content_sha256 = None  # computed by the ingest job while it reads the object
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # a concurrent completion of the same upload recorded it first
+        db.session.rollback()
+        return _completed(TargetList.query.filter_by(upload_nonce=state["nonce"]).first_or_404())
+
+    pharma_ids = parse_int_list(request.form.getlist("pharma_ids"))
+    brand_ids = parse_int_list(request.form.getlist("brand_ids"))
+    sync_links(db.session, tl, "pharmas", pharma_ids)
+    sync_links(db.session, tl, "brands", brand_ids)
+    job = audience.enqueue_ingest(tl)
+    db.session.commit()
+    flash(f"Target List {'updated' if tl_id else 'created'}.", "success")
+    return jsonify({"id": tl.id, "job": job.id, "redirect": url_for("target_lists.list_target_lists")})
+
+def _completed(tl):
+    """complete_direct_upload's response for a list an earlier call already recorded."""
+    job = jobs.latest_for("target_list", [tl.id]).get(tl.id)
+    return jsonify({"id": tl.id, "job": job.id if job else None,
+                    "redirect": url_for("target_lists.list_target_lists")})
+
+@target_lists_bp.route("/direct-upload/abort", methods=["POST"])
+def abort_direct_upload():
+    """Called by the browser when a multipart upload fails, so S3 drops (and stops billing) its parts."""
+    state = _direct_upload_state()
+    if state is None:
+        return jsonify({"error": "Upload token is invalid or expired."}), 400
+    if not state.get("upload_id"):
+        # a presigned POST either stored the object or nothing
+        return jsonify({"aborted": False})
+    try:
+        s3_client().abort_multipart_upload(Bucket=app.config.get("S3_BUCKET_NAME"), Key=state["key"],
+                                           UploadId=state["upload_id"])
+    except ClientError as e:
+        # NoSuchUpload: already completed or aborted
+        if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+            return jsonify({"error": f"Upload could not be aborted: {e}"}), 502
+    return jsonify({"aborted": True})
@@ -1,12 +1,167 @@
-
 import os
+import time
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from flask import current_app
+from .cache import LRUBackend
+from .instrumentation import record_call
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+class S3ClientProvider:
+    """
+    One S3 client per process, built on first use and shared by every request
+    and worker thread (botocore clients are thread-safe; sessions are not, so
+    the client gets a session of its own). Its urllib3 pool keeps connections
+    open across requests. Construction and per-call timings are kept in
+    stats() and reported to the request's Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {"clients_built": 0, "build_ms": 0.0, "calls": 0, "call_ms": 0.0,
+                       "errors": 0, "retries": 0}
+
+    def client(self):
+        client = self._client
+        if client is None or self._pid != os.getpid():
+            with self._lock:
+                # A forked worker must not share the parent's sockets
+                if self._client is None or self._pid != os.getpid():
+                    self._client = self._build()
+                    self._pid = os.getpid()
+                client = self._client
+        return client
+
+    def _build(self):
+        cfg = self.app.config
+        started = time.perf_counter()
+        client = boto3.session.Session().client(
+            "s3",
+            region_name=cfg["AWS_REGION"],
+            endpoint_url=cfg.get("S3_ENDPOINT_URL") or None,
+            config=Config(max_pool_connections=cfg["S3_MAX_POOL_CONNECTIONS"],
+                          connect_timeout=cfg["S3_CONNECT_TIMEOUT"],
+                          read_timeout=cfg["S3_READ_TIMEOUT"],
+                          retries={"mode": cfg["S3_RETRY_MODE"], "total_max_attempts": cfg["S3_MAX_ATTEMPTS"]}),
+        )
+        events = client.meta.events
+        events.register("before-call.s3", self._before_call)
+        events.register("after-call.s3", self._after_call)
+        events.register("after-call-error.s3", self._after_call_error)
+        ms = (time.perf_counter() - started) * 1000
+        # called with self._lock held
+        self._stats["clients_built"] += 1
+        self._stats["build_ms"] += ms
+        self.app.logger.info("built S3 client in %.1fms (pool %d)", ms, cfg["S3_MAX_POOL_CONNECTIONS"])
+        return client
+
+    def _before_call(self, context, **kwargs):
+        context["timing_started"] = time.perf_counter()
+
+    def _record(self, context, error=False, retries=0):
+        started = context.pop("timing_started", None)
+        if started is None:
+            return
+        ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["call_ms"] += ms
+            self._stats["errors"] += int(error)
+            self._stats["retries"] += retries
+        record_call("s3", ms)
+
+    def _after_call(self, http_response, parsed, context, **kwargs):
+        retries = (parsed or {}).get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        self._record(context, error=http_response.status_code >= 400, retries=retries)
+
+    def _after_call_error(self, context, **kwargs):
+        self._record(context, error=True)
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+        out["build_ms"] = round(out["build_ms"], 1)
+        out["call_ms"] = round(out["call_ms"], 1)
+        out["pool_size"] = self.app.config["S3_MAX_POOL_CONNECTIONS"]
+        return out
 
 def s3_client():
-    return boto3.client("s3", region_name=current_app.config["AWS_REGION"])
+    """The app's shared S3 client (see S3ClientProvider)."""
+    return current_app.extensions["s3"].client()
+
+def _read_part(stream, size):
+    """Read up to ``size`` bytes, looping over short reads until EOF."""
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = stream.read(size - len(buf))
+        if not chunk:
+            break
+        buf.extend(chunk)
+    return bytes(buf)
+
+def upload_stream(client, stream, bucket, key, extra_args=None, part_size=None, max_concurrency=None):
+    """
+    Stream a file-like object to S3 without buffering the whole body.
+
+    Bodies smaller than one part go through a single put_object; anything
+    larger becomes a multipart upload with at most ``max_concurrency`` parts
+    in flight, so memory stays bounded by part_size * (max_concurrency + 1).
+    Returns the number of bytes uploaded.
+    """
+    extra = dict(extra_args or {})
+    part_size = max(int(part_size or current_app.config.get("S3_MULTIPART_PART_SIZE", 8 * 1024 * 1024)), MIN_PART_SIZE)
+    max_concurrency = max(int(max_concurrency or current_app.config.get("S3_MULTIPART_CONCURRENCY", 4)), 1)
+
+    first = _read_part(stream, part_size)
+    size_bytes = len(first)
+    if size_bytes < part_size:
+        client.put_object(Bucket=bucket, Key=key, Body=first, **extra)
+        return size_bytes
+
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, **extra)["UploadId"]
+    slots = threading.BoundedSemaphore(max_concurrency)
+    futures = []
+
+    def _send(number, body):
+        try:
+            resp = client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body)
+            return {"PartNumber": number, "ETag": resp["ETag"]}
+        finally:
+            slots.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            number, body = 1, first
+            while body:
+                slots.acquire()
+                futures.append(pool.submit(_send, number, body))
+                # fail fast instead of streaming the rest of a doomed upload
+                if any(f.done() and f.exception() for f in futures):
+                    break
+                body = _read_part(stream, part_size)
+                size_bytes += len(body)
+                number += 1
+        parts = [f.result() for f in futures]
+        client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except Exception:
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except ClientError:
+            pass
+        raise
+    return size_bytes
 
 def upload_fileobj(file_storage, key_prefix=None):
     bucket = current_app.config["S3_BUCKET_NAME"]
@@ -15,22 +170,87 @@ def upload_fileobj(file_storage, key_prefix=None):
     key = f"{prefix}{uuid.uuid4().hex}.{ext}"
     client = s3_client()
     try:
-        client.upload_fileobj(file_storage.stream, bucket, key, ExtraArgs={"ServerSideEncryption": "AES256"})
+        upload_stream(client, file_storage.stream, bucket, key, extra_args={"ServerSideEncryption": "AES256"})
         return key
     except ClientError as e:
         raise RuntimeError(f"S3 upload failed: {e}")
 
+def _presigned_cache():
+    return current_app.extensions["presigned_urls"]
+
 def generate_presigned_get_url(key: str, expires_in: int = 300) -> str:
-    """Return a temporary signed URL to download an object."""
+    """
+    Return a temporary signed URL to download an object. URLs are reused until
+    S3_PRESIGN_CACHE_MARGIN seconds before they expire.
+    """
     bucket = current_app.config["S3_BUCKET_NAME"]
     if not bucket:
         raise RuntimeError("S3_BUCKET_NAME not configured")
+    margin = current_app.config.get("S3_PRESIGN_CACHE_MARGIN", 60)
+    cache = _presigned_cache()
+    cache_key = f"get:{bucket}:{expires_in}:{key}"
+    url = cache.get(cache_key)
+    if url is not None:
+        return url
     client = s3_client()
     try:
-        return client.generate_presigned_url(
+        url = client.generate_presigned_url(
             "get_object",
             Params={"Bucket": bucket, "Key": key},
             ExpiresIn=expires_in
         )
     except ClientError as e:
         raise RuntimeError(f"Presign failed: {e}")
+    if expires_in > margin:
+        cache.set(cache_key, url, expires_in - margin)
+    return url
+
+# upload_fileobj-style ExtraArgs -> POST policy form fields
+_POST_FIELDS = {
+    "ServerSideEncryption": "x-amz-server-side-encryption",
+    "SSEKMSKeyId": "x-amz-server-side-encryption-aws-kms-key-id",
+    "ACL": "acl",
+}
+
+def presigned_post(client, bucket, key, max_bytes, extra_args=None, expires_in=3600):
+    """Presigned form POST for a single-request browser upload of up to ``max_bytes``."""
+    fields = {_POST_FIELDS[k]: v for k, v in (extra_args or {}).items() if k in _POST_FIELDS}
+    conditions = [{k: v} for k, v in fields.items()]
+    conditions.append(["content-length-range", 1, max_bytes])
+    return client.generate_presigned_post(Bucket=bucket, Key=key, Fields=fields or None,
+                                          Conditions=conditions, ExpiresIn=expires_in)
+
+def start_presigned_multipart(client, bucket, key, size, part_size=None, extra_args=None, expires_in=3600):
+    """
+    Open a multipart upload for a browser to fill with PUTs. Returns
+    (upload_id, part_size, [{"part_number", "url"}]) covering ``size`` bytes.
+    """
+    part_size = max(int(part_size or current_app.config.get("S3_MULTIPART_PART_SIZE", 8 * 1024 * 1024)), MIN_PART_SIZE)
+    # S3 allows at most 10,000 parts
+    part_size = max(part_size, -(-size // 10000))
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, **(extra_args or {}))["UploadId"]
+    count = max(-(-size // part_size), 1)
+    parts = [{"part_number": n, "url": client.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": bucket, "Key": key, "UploadId": upload_id, "PartNumber": n},
+                ExpiresIn=expires_in)}
+             for n in range(1, count + 1)]
+    return upload_id, part_size, parts
+
+def complete_presigned_multipart(client, bucket, key, upload_id, parts):
+    """Finish a browser multipart upload; ``parts`` is [{"part_number", "etag"}]."""
+    ordered = sorted(({"PartNumber": int(p["part_number"]), "ETag": p["etag"]} for p in parts),
+                     key=lambda p: p["PartNumber"])
+    try:
+        client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                         MultipartUpload={"Parts": ordered})
+    except ClientError:
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except ClientError:
+            pass
+        raise
+
+def init_app(app):
+    app.extensions["s3"] = S3ClientProvider(app)
+    app.extensions["presigned_urls"] = LRUBackend(app.config["S3_PRESIGN_CACHE_SIZE"])
@@ -0,0 +1,204 @@
+"""
+Full-text search index behind helpers.apply_search.
+
+One document per row of the searchable tables, kept in a single
+``search_index`` table: an FTS5 virtual table on SQLite, a tsvector column
+with a GIN index on Postgres. Documents carry the names the list views
+search across (a contract's document includes its pharma and brand names),
+so lists no longer join related tables to filter. Documents are rewritten
+inside the committing transaction via changes.on_commit.
+"""
+import re
+from flask import current_app
+from sqlalchemy import select, text, Integer, Float
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import joinedload, selectinload
+from .extensions import db
+from .changes import on_commit
+from .models import (Pharma, Brand, Contract, Campaign, Program, Placement, Client,
+                     contract_brand)
+
+# entity -> code packed into the document key so rows can be replaced by key
+ENTITY_CODES = {
+    "pharma": 1, "brand": 2, "contract": 3, "campaign": 4,
+    "program": 5, "placement": 6, "client": 7,
+}
+MODELS = {
+    "pharma": Pharma, "brand": Brand, "contract": Contract, "campaign": Campaign,
+    "program": Program, "placement": Placement, "client": Client,
+}
+_CHUNK = 500
+
+def _doc_key(entity, entity_id):
+    return entity_id * 8 + ENTITY_CODES[entity]
+
+def backend():
+    return current_app.extensions.get("search")
+
+def _ensure_index(conn):
+    """Create the index if missing; returns (backend, created) or (None, False)."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='search_index'")).first()
+        if exists:
+            return "fts5", False
+        try:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE search_index USING fts5("
+                "entity UNINDEXED, entity_id UNINDEXED, body, "
+                "tokenize='unicode61 remove_diacritics 2')"))
+        except OperationalError:
+            return None, False  # SQLite built without FTS5
+        return "fts5", True
+    if dialect == "postgresql":
+        exists = conn.execute(text("SELECT to_regclass('search_index')")).scalar()
+        if exists:
+            return "tsvector", False
+        conn.execute(text(
+            "CREATE TABLE search_index ("
+            "doc_key BIGINT PRIMARY KEY, entity VARCHAR(20) NOT NULL, entity_id INTEGER NOT NULL, "
+            "body TEXT NOT NULL, "
+            "tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED)"))
+        conn.execute(text("CREATE INDEX ix_search_index_tsv ON search_index USING GIN (tsv)"))
+        return "tsvector", True
+    return None, False
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i:i + _CHUNK]
+
+def _join(*parts):
+    return " ".join(p for p in parts if p)
+
+def _documents(session, entity, ids):
+    """Yield (entity_id, body) for the rows of ``entity`` that still exist."""
+    model = MODELS[entity]
+    stmt = select(model).where(model.id.in_(ids))
+    if entity == "contract":
+        stmt = stmt.options(joinedload(Contract.pharma), selectinload(Contract.brands))
+    elif entity == "campaign":
+        stmt = stmt.options(joinedload(Campaign.contract))
+    elif entity == "program":
+        stmt = stmt.options(joinedload(Program.campaign))
+    elif entity == "brand":
+        stmt = stmt.options(joinedload(Brand.pharma))
+    for row in session.execute(stmt).unique().scalars():
+        if entity == "contract":
+            body = _join(row.name, row.pharma.name if row.pharma else "", *(b.name for b in row.brands))
+        elif entity == "campaign":
+            body = _join(row.name, row.description, row.contract.name if row.contract else "")
+        elif entity == "program":
+            body = _join(row.name, row.platform, row.campaign.name if row.campaign else "")
+        elif entity == "placement":
+            body = _join(row.name, row.channel)
+        elif entity == "client":
+            body = _join(row.name, row.notes)
+        elif entity == "brand":
+            body = _join(row.name, row.pharma.name if row.pharma else "")
+        else:
+            body = row.name
+        yield row.id, body
+
+def reindex(session, entity, ids, kind=None):
+    kind = kind or backend()
+    if not kind or not ids:
+        return
+    for chunk in _chunks(ids):
+        keys = [_doc_key(entity, i) for i in chunk]
+        if kind == "fts5":
+            session.execute(text("DELETE FROM search_index WHERE rowid IN (%s)" % ",".join(map(str, keys))))
+        else:
+            session.execute(text("DELETE FROM search_index WHERE doc_key = ANY(:keys)"), {"keys": keys})
+        rows = [{"k": _doc_key(entity, i), "e": entity, "i": i, "b": body}
+                for i, body in _documents(session, entity, chunk)]
+        if not rows:
+            continue
+        if kind == "fts5":
+            session.execute(text(
+                "INSERT INTO search_index (rowid, entity, entity_id, body) VALUES (:k, :e, :i, :b)"), rows)
+        else:
+            session.execute(text(
+                "INSERT INTO search_index (doc_key, entity, entity_id, body) VALUES (:k, :e, :i, :b)"), rows)
+
+def _dependents(session, changes):
+    """Expand changed ids to every document whose body embeds their names."""
+    touched = {entity: set(changes.get(entity, ())) for entity in ENTITY_CODES}
+    if touched["pharma"]:
+        for chunk in _chunks(touched["pharma"]):
+            touched["contract"].update(session.scalars(select(Contract.id).where(Contract.pharma_id.in_(chunk))))
+            touched["brand"].update(session.scalars(select(Brand.id).where(Brand.pharma_id.in_(chunk))))
+    if touched["brand"]:
+        for chunk in _chunks(touched["brand"]):
+            touched["contract"].update(session.scalars(
+                select(contract_brand.c.contract_id).where(contract_brand.c.brand_id.in_(chunk))))
+    if touched["contract"]:
+        for chunk in _chunks(touched["contract"]):
+            touched["campaign"].update(session.scalars(select(Campaign.id).where(Campaign.contract_id.in_(chunk))))
+    if touched["campaign"]:
+        for chunk in _chunks(touched["campaign"]):
+            touched["program"].update(session.scalars(select(Program.id).where(Program.campaign_id.in_(chunk))))
+    return touched
+
+@on_commit
+def _sync_index(session, changes):
+    kind = backend()
+    if not kind or not any(entity in changes for entity in ENTITY_CODES):
+        return
+    for entity, ids in _dependents(session, changes).items():
+        reindex(session, entity, ids, kind)
+
+def rebuild(session):
+    """Recompute every document; returns the number of rows indexed per entity."""
+    kind = backend()
+    if not kind:
+        return {}
+    session.execute(text("DELETE FROM search_index"))
+    counts = {}
+    for entity, model in MODELS.items():
+        ids = list(session.scalars(select(model.id)))
+        reindex(session, entity, ids, kind)
+        counts[entity] = len(ids)
+    return counts
+
+def _terms(q):
+    return re.findall(r"\w+", q, re.UNICODE)
+
+def ranked_ids(entity, q):
+    """
+    Subquery of (entity_id, search_rank) for documents matching every term of
+    ``q`` as a prefix; lower search_rank is more relevant. None when the index
+    is unavailable or ``q`` has no searchable terms.
+    """
+    kind = backend()
+    terms = _terms(q)
+    if not kind or not terms:
+        return None
+    if kind == "fts5":
+        match = " ".join('"%s"*' % t for t in terms)
+        stmt = text(
+            "SELECT entity_id, bm25(search_index) AS search_rank FROM search_index "
+            "WHERE search_index MATCH :match AND entity = :entity")
+    else:
+        match = " & ".join("%s:*" % t for t in terms)
+        stmt = text(
+            "SELECT entity_id, -ts_rank(tsv, to_tsquery('simple', :match)) AS search_rank FROM search_index "
+            "WHERE entity = :entity AND tsv @@ to_tsquery('simple', :match)")
+    stmt = stmt.bindparams(match=match, entity=entity)
+    return stmt.columns(entity_id=Integer, search_rank=Float).subquery("ranked")
+
+def init_app(app):
+    app.extensions["search"] = None
+    if not app.config.get("SEARCH_INDEX_ENABLED", True):
+        return
+    with app.app_context():
+        try:
+            with db.engine.begin() as conn:
+                kind, created = _ensure_index(conn)
+        except (OperationalError, ProgrammingError):
+            kind, created = None, False
+        app.extensions["search"] = kind
+        if created:
+            rebuild(db.session)
+            db.session.commit()
@@ -0,0 +1,182 @@
+"""
+Synthetic data generator for reproducing production-scale slowness.
+
+Writes straight through Core executemany INSERTs with explicit ids (so no
+RETURNING round trips), in chunks, into whatever database the app is
+configured for. Derived tables (search index, eligibility) are rebuilt once
+at the end instead of per chunk. On Postgres the id sequences are moved past
+the generated rows afterwards, so later ORM inserts do not collide. Use
+`flask generate-data`.
+"""
+import random
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert, select
+from .extensions import db
+from .models import (Pharma, Brand, Contract, Campaign, Program, Placement, Client, TargetList,
+                     contract_brand, program_placement, pharma_target_list, brand_target_list)
+
+CHANNELS = ["email", "web", "app", "social", "print", "search"]
+STATUSES = ["planned", "live", "paused", "complete"]
+PLATFORMS = ["Epocrates", "Medscape", "Doximity", "WebMD", "Sermo"]
+WORDS = ["Alpha", "Beacon", "Summit", "Vector", "Horizon", "Pulse", "Nova", "Atlas",
+         "Meridian", "Zenith", "Catalyst", "Harbor", "Keystone", "Lumen", "Orbit"]
+
+class Spec:
+    """Row counts to generate. Totals, except where a name says 'per'."""
+
+    def __init__(self, pharmas=100, brands_per_pharma=5, contracts=2000, campaigns_per_contract=3,
+                 programs_per_campaign=3, placements=50000, programs_per_placement=3,
+                 target_lists=500, seed=42, chunk_size=10000):
+        self.pharmas = pharmas
+        self.brands_per_pharma = brands_per_pharma
+        self.contracts = contracts
+        self.campaigns_per_contract = campaigns_per_contract
+        self.programs_per_campaign = programs_per_campaign
+        self.placements = placements
+        self.programs_per_placement = programs_per_placement
+        self.target_lists = target_lists
+        self.seed = seed
+        self.chunk_size = chunk_size
+
+def _next_id(conn, model):
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+def _reset_sequences(conn):
+    """Explicit ids leave Postgres serial sequences behind; move each one to its table's max(id)."""
+    if conn.dialect.name != "postgresql":
+        return
+    for model in (Pharma, Brand, Contract, Campaign, Program, Placement, TargetList, Client):
+        table = model.__table__
+        # setval is strict, so a column without a sequence (NULL) or an empty table is a no-op
+        conn.execute(select(func.setval(func.pg_get_serial_sequence(table.name, "id"),
+                                        select(func.max(table.c.id)).scalar_subquery())))
+
+def _name(rng, *parts):
+    return " ".join([rng.choice(WORDS), rng.choice(WORDS), *map(str, parts)])
+
+class _Writer:
+    def __init__(self, conn, chunk_size, counts):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.counts = counts
+        self.pending = {}
+
+    def add(self, table, row):
+        key = getattr(table, "__table__", table).name
+        bucket = self.pending.setdefault(key, (table, []))[1]
+        bucket.append(row)
+        if len(bucket) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        # buckets flush in first-use order, which keeps parents ahead of FKs
+        for k, (table, rows) in self.pending.items():
+            if rows:
+                self.conn.execute(insert(table), rows)
+                self.counts[k] = self.counts.get(k, 0) + len(rows)
+                rows.clear()
+
+def generate(spec, progress=None):
+    """Append a synthetic hierarchy described by ``spec``; returns {table: rows inserted}."""
+    rng = random.Random(spec.seed)
+    counts = {}
+    started = time.perf_counter()
+    today = date.today()
+
+    def report(stage):
+        if progress:
+            progress(stage, counts, time.perf_counter() - started)
+
+    with db.engine.begin() as conn:
+        w = _Writer(conn, spec.chunk_size, counts)
+        pharma0, brand0, contract0 = _next_id(conn, Pharma), _next_id(conn, Brand), _next_id(conn, Contract)
+        campaign0, program0, placement0 = _next_id(conn, Campaign), _next_id(conn, Program), _next_id(conn, Placement)
+        tl0, client0 = _next_id(conn, TargetList), _next_id(conn, Client)
+
+        brands_of = {}
+        for i in range(spec.pharmas):
+            pid = pharma0 + i
+            w.add(Pharma, {"id": pid, "name": f"Pharma {pid}"})
+            w.add(Client, {"id": client0 + i, "name": f"Pharma {pid}", "notes": _name(rng, "account"),
+                           "created_at": datetime.utcnow() - timedelta(days=rng.randint(0, 900))})
+            brands_of[pid] = []
+            for j in range(spec.brands_per_pharma):
+                bid = brand0 + i * spec.brands_per_pharma + j
+                brands_of[pid].append(bid)
+                w.add(Brand, {"id": bid, "name": f"{rng.choice(WORDS)}{bid}", "pharma_id": pid})
+        w.flush()
+        report("pharmas/brands")
+
+        pharma_ids = list(brands_of)
+        tls_of_pharma = {pid: [] for pid in pharma_ids}
+        for i in range(spec.target_lists):
+            tid = tl0 + i
+            pid = rng.choice(pharma_ids)
+            tls_of_pharma[pid].append(tid)
+            w.add(TargetList, {"id": tid, "label": _name(rng, "list", tid), "s3_key": f"synthetic/{tid}.csv",
+                               "original_filename": f"list-{tid}.csv", "size_bytes": rng.randint(10_000, 50_000_000),
+                               "uploaded_at": datetime.utcnow() - timedelta(days=rng.randint(0, 900))})
+            w.add(pharma_target_list, {"pharma_id": pid, "target_list_id": tid})
+            for bid in rng.sample(brands_of[pid], min(2, len(brands_of[pid]))):
+                w.add(brand_target_list, {"brand_id": bid, "target_list_id": tid})
+        w.flush()
+        report("target lists")
+
+        campaign_id, program_id = campaign0, program0
+        programs = []
+        for i in range(spec.contracts):
+            cid = contract0 + i
+            pid = rng.choice(pharma_ids)
+            start = today - timedelta(days=rng.randint(0, 720))
+            w.add(Contract, {"id": cid, "name": _name(rng, "contract", cid), "pharma_id": pid,
+                             "start_date": start, "end_date": start + timedelta(days=rng.randint(90, 540)),
+                             "budget_total": float(rng.randint(50, 5000) * 1000)})
+            for bid in rng.sample(brands_of[pid], min(rng.randint(1, 3), len(brands_of[pid]))):
+                w.add(contract_brand, {"contract_id": cid, "brand_id": bid})
+            for _ in range(spec.campaigns_per_contract):
+                w.add(Campaign, {"id": campaign_id, "name": _name(rng, "campaign"), "contract_id": cid,
+                                 "description": _name(rng, "objective")})
+                for _ in range(spec.programs_per_campaign):
+                    tls = tls_of_pharma[pid]
+                    w.add(Program, {"id": program_id, "name": _name(rng, "program"), "campaign_id": campaign_id,
+                                    "target_list_id": rng.choice(tls) if tls else None,
+                                    "platform": rng.choice(PLATFORMS), "asset_id": f"A-{program_id}",
+                                    "expected_reach": rng.randint(1_000, 200_000)})
+                    programs.append(program_id)
+                    program_id += 1
+                campaign_id += 1
+        w.flush()
+        report("contracts/campaigns/programs")
+
+        # placements link to neighbouring programs, which mostly share a contract
+        per = max(spec.programs_per_placement, 1)
+        for i in range(spec.placements):
+            plid = placement0 + i
+            start = today - timedelta(days=rng.randint(0, 365))
+            goal = rng.randint(10, 2000) * 1000
+            w.add(Placement, {"id": plid, "name": _name(rng, "placement"), "channel": rng.choice(CHANNELS),
+                              "status": rng.choice(STATUSES), "start_date": start,
+                              "end_date": start + timedelta(days=rng.randint(14, 180)),
+                              "impression_goal": goal,
+                              "click_goal": goal // rng.randint(50, 500)})
+            if programs:
+                base = rng.randrange(len(programs))
+                for k in range(per):
+                    w.add(program_placement, {"program_id": programs[(base + k) % len(programs)],
+                                              "placement_id": plid})
+            if i and i % (spec.chunk_size * 10) == 0:
+                report(f"placements {i}")
+        w.flush()
+        _reset_sequences(conn)
+        report("placements")
+    return counts
+
+def rebuild_derived():
+    """Recompute the search index, eligibility and rollup tables after a bulk load."""
+    from . import cache, eligibility, rollups, search
+    search.rebuild(db.session)
+    eligibility.rebuild(db.session)
+    rollups.rebuild(db.session)
+    db.session.commit()
+    cache.invalidate()
@@ -0,0 +1,33 @@
+"""0004_tl_eligibility
+
+Revision ID: 0004_tl_eligibility
+Revises: 0003_program_plat_asset
+Create Date: 2026-10-18 00:00:01.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004_tl_eligibility'
+down_revision = '0003_program_plat_asset'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if not insp.has_table('target_list_eligibility'):
+        op.create_table(
+            'target_list_eligibility',
+            sa.Column('campaign_id', sa.Integer(), nullable=False),
+            sa.Column('target_list_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['campaign_id'], ['campaign.id']),
+            sa.ForeignKeyConstraint(['target_list_id'], ['target_list.id']),
+            sa.PrimaryKeyConstraint('campaign_id', 'target_list_id')
+        )
+        op.create_index('ix_target_list_eligibility_target_list_id', 'target_list_eligibility', ['target_list_id'])
+    # The app fills the table on first start (or via `flask rebuild-eligibility`)
+
+def downgrade():
+    op.drop_table('target_list_eligibility')
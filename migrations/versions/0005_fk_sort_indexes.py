@@ -0,0 +1,55 @@
+"""0005_fk_sort_indexes
+
+Revision ID: 0005_fk_sort_indexes
+Revises: 0004_tl_eligibility
+Create Date: 2026-10-18 00:00:02.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_fk_sort_indexes'
+down_revision = '0004_tl_eligibility'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns) -- kept in step with the models
+INDEXES = [
+    # foreign keys
+    ('ix_brand_pharma_id_name', 'brand', ['pharma_id', 'name']),
+    ('ix_contract_pharma_id', 'contract', ['pharma_id']),
+    ('ix_campaign_contract_id_name', 'campaign', ['contract_id', 'name']),
+    ('ix_program_campaign_id_name', 'program', ['campaign_id', 'name']),
+    ('ix_program_target_list_id', 'program', ['target_list_id']),
+    # reverse side of the association tables (their PK covers the left column)
+    ('ix_program_placement_placement_id', 'program_placement', ['placement_id']),
+    ('ix_contract_brand_brand_id', 'contract_brand', ['brand_id']),
+    ('ix_pharma_target_list_target_list_id', 'pharma_target_list', ['target_list_id']),
+    ('ix_brand_target_list_target_list_id', 'brand_target_list', ['target_list_id']),
+    # sort columns
+    ('ix_brand_name', 'brand', ['name']),
+    ('ix_contract_name', 'contract', ['name']),
+    ('ix_campaign_name', 'campaign', ['name']),
+    ('ix_program_name', 'program', ['name']),
+    ('ix_target_list_label', 'target_list', ['label']),
+    ('ix_target_list_uploaded_at', 'target_list', ['uploaded_at']),
+    ('ix_client_created_at_id', 'client', ['created_at', 'id']),
+]
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    for name, table, columns in INDEXES:
+        if not insp.has_table(table):
+            continue
+        existing = {ix['name'] for ix in insp.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+def downgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    for name, table, columns in reversed(INDEXES):
+        if insp.has_table(table) and name in {ix['name'] for ix in insp.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,43 @@
+"""0006_jobs
+
+Revision ID: 0006_jobs
+Revises: 0005_fk_sort_indexes
+Create Date: 2026-10-18 00:00:03.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_jobs'
+down_revision = '0005_fk_sort_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if not insp.has_table('job'):
+        op.create_table(
+            'job',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=50), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('result', sa.Text(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('max_attempts', sa.Integer(), nullable=False),
+            sa.Column('subject_table', sa.String(length=50), nullable=True),
+            sa.Column('subject_id', sa.Integer(), nullable=True),
+            sa.Column('run_after', sa.DateTime(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_job_status_run_after', 'job', ['status', 'run_after'])
+        op.create_index('ix_job_subject', 'job', ['subject_table', 'subject_id'])
+
+def downgrade():
+    op.drop_table('job')
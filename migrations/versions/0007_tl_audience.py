@@ -0,0 +1,37 @@
+"""0007_tl_audience
+
+Revision ID: 0007_tl_audience
+Revises: 0006_jobs
+Create Date: 2026-10-18 00:00:04.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007_tl_audience'
+down_revision = '0006_jobs'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if not insp.has_table('target_list_audience'):
+        op.create_table(
+            'target_list_audience',
+            sa.Column('target_list_id', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('identifier_column', sa.String(length=120), nullable=True),
+            sa.Column('row_count', sa.Integer(), nullable=True),
+            sa.Column('invalid_count', sa.Integer(), nullable=True),
+            sa.Column('identifier_count', sa.Integer(), nullable=True),
+            sa.Column('ingested_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['target_list_id'], ['target_list.id']),
+            sa.PrimaryKeyConstraint('target_list_id')
+        )
+    # Existing lists are indexed with `flask ingest-target-lists`
+
+def downgrade():
+    op.drop_table('target_list_audience')
@@ -0,0 +1,29 @@
+"""0008_tl_content_sha256
+
+Revision ID: 0008_tl_content_sha256
+Revises: 0007_tl_audience
+Create Date: 2026-10-18 00:00:05.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008_tl_content_sha256'
+down_revision = '0007_tl_audience'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if 'content_sha256' not in {c['name'] for c in insp.get_columns('target_list')}:
+        op.add_column('target_list', sa.Column('content_sha256', sa.String(length=64), nullable=True))
+    if 'ix_target_list_content_sha256' not in {ix['name'] for ix in insp.get_indexes('target_list')}:
+        op.create_index('ix_target_list_content_sha256', 'target_list', ['content_sha256'])
+    # Existing lists get a digest from `flask ingest-target-lists --all`
+
+def downgrade():
+    op.drop_index('ix_target_list_content_sha256', table_name='target_list')
+    with op.batch_alter_table('target_list') as batch:
+        batch.drop_column('content_sha256')
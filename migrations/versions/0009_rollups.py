@@ -0,0 +1,58 @@
+"""0009_rollups
+
+Revision ID: 0009_rollups
+Revises: 0008_tl_content_sha256
+Create Date: 2026-10-18 00:00:06.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009_rollups'
+down_revision = '0008_tl_content_sha256'
+branch_labels = None
+depends_on = None
+
+# KPI source columns first added by `flask upgrade-schema-v12`; now mapped on the models
+KPI_COLUMNS = [
+    ('contract', sa.Column('budget_total', sa.Float(), nullable=True)),
+    ('program', sa.Column('expected_reach', sa.Integer(), nullable=True)),
+    ('placement', sa.Column('impression_goal', sa.Integer(), nullable=True)),
+    ('placement', sa.Column('click_goal', sa.Integer(), nullable=True)),
+]
+
+ROLLUPS = [('campaign_rollup', 'campaign_id'), ('contract_rollup', 'contract_id'), ('pharma_rollup', 'pharma_id')]
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    for table, column in KPI_COLUMNS:
+        if column.name not in {c['name'] for c in insp.get_columns(table)}:
+            op.add_column(table, column)
+    for name, key in ROLLUPS:
+        if insp.has_table(name):
+            continue
+        op.create_table(
+            name,
+            sa.Column(key, sa.Integer(), nullable=False),
+            sa.Column('contract_count', sa.Integer(), nullable=True),
+            sa.Column('campaign_count', sa.Integer(), nullable=True),
+            sa.Column('program_count', sa.Integer(), nullable=False),
+            sa.Column('placement_count', sa.Integer(), nullable=False),
+            sa.Column('impression_goal', sa.BigInteger(), nullable=True),
+            sa.Column('click_goal', sa.BigInteger(), nullable=True),
+            sa.Column('expected_reach', sa.BigInteger(), nullable=True),
+            sa.Column('budget_total', sa.Float(), nullable=True),
+            sa.Column('placements_by_status', sa.Text(), nullable=False),
+            sa.Column('placements_by_channel', sa.Text(), nullable=False),
+            sa.Column('start_date', sa.Date(), nullable=True),
+            sa.Column('end_date', sa.Date(), nullable=True),
+            sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint(key)
+        )
+    # The app fills empty rollup tables on startup; `flask rebuild-rollups` recomputes them
+
+def downgrade():
+    for name, _ in reversed(ROLLUPS):
+        op.drop_table(name)
@@ -0,0 +1,25 @@
+"""0010_tl_s3_key_nullable
+
+Revision ID: 0010_tl_s3_key_nullable
+Revises: 0009_rollups
+Create Date: 2026-10-18 00:00:07.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010_tl_s3_key_nullable'
+down_revision = '0009_rollups'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # New uploads have no key until their upload job has stored the object
+    with op.batch_alter_table('target_list') as batch:
+        batch.alter_column('s3_key', existing_type=sa.String(length=300), nullable=True)
+
+def downgrade():
+    op.execute("UPDATE target_list SET s3_key = '' WHERE s3_key IS NULL")
+    with op.batch_alter_table('target_list') as batch:
+        batch.alter_column('s3_key', existing_type=sa.String(length=300), nullable=False)
@@ -0,0 +1,24 @@
+"""0011_tl_s3_key_index
+
+Revision ID: 0011_tl_s3_key_index
+Revises: 0010_tl_s3_key_nullable
+Create Date: 2026-10-18 00:00:08.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0011_tl_s3_key_index'
+down_revision = '0010_tl_s3_key_nullable'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Direct-upload completion looks its key up to stay idempotent
+    insp = sa.inspect(op.get_bind())
+    if 'ix_target_list_s3_key' not in {ix['name'] for ix in insp.get_indexes('target_list')}:
+        op.create_index('ix_target_list_s3_key', 'target_list', ['s3_key'])
+
+def downgrade():
+    op.drop_index('ix_target_list_s3_key', table_name='target_list')
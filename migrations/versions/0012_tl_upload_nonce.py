@@ -0,0 +1,33 @@
+"""0012_tl_upload_nonce
+
+Revision ID: 0012_tl_upload_nonce
+Revises: 0011_tl_s3_key_index
+Create Date: 2026-10-18 00:00:09.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0012_tl_upload_nonce'
+down_revision = '0011_tl_s3_key_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Direct-upload completion is idempotent per upload nonce rather than per key
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if 'upload_nonce' not in {c['name'] for c in insp.get_columns('target_list')}:
+        op.add_column('target_list', sa.Column('upload_nonce', sa.String(length=32), nullable=True))
+    indexes = {ix['name'] for ix in insp.get_indexes('target_list')}
+    if 'ix_target_list_upload_nonce' not in indexes:
+        op.create_index('ix_target_list_upload_nonce', 'target_list', ['upload_nonce'], unique=True)
+    if 'ix_target_list_s3_key' in indexes:
+        op.drop_index('ix_target_list_s3_key', table_name='target_list')
+
+def downgrade():
+    op.create_index('ix_target_list_s3_key', 'target_list', ['s3_key'])
+    op.drop_index('ix_target_list_upload_nonce', table_name='target_list')
+    with op.batch_alter_table('target_list') as batch:
+        batch.drop_column('upload_nonce')
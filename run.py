@@ -1,4 +1,5 @@
 import os
+import click
 from app import create_app, db
 
 app = create_app()
@@ -118,5 +119,305 @@ def upgrade_schema_v15():
         conn.close()
         print("✓ upgrade-schema-v15 completed")
 
+@app.cli.command("sync-replica")
+def sync_replica():
+    """Copy the primary SQLite database over the DATABASE_REPLICA_URL file."""
+    from app.replica import REPLICA, sync_sqlite
+    with app.app_context():
+        if REPLICA not in db.engines:
+            raise SystemExit("DATABASE_REPLICA_URL is not set")
+        primary, replica = db.engines[None], db.engines[REPLICA]
+        if primary.dialect.name != "sqlite" or replica.dialect.name != "sqlite":
+            raise SystemExit("sync-replica only copies SQLite files; use the database's own replication")
+        sync_sqlite(primary, replica)
+        print(f"✓ Copied {primary.url.database} → {replica.url.database}")
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index():
+    """Recompute every full-text search document from the source tables."""
+    from app import search
+    with app.app_context():
+        counts = search.rebuild(db.session)
+        db.session.commit()
+        if not counts:
+            print("Search index disabled or unavailable; list search uses ILIKE")
+            return
+        for entity, n in counts.items():
+            print(f"  {entity}: {n}")
+        print("✓ Search index rebuilt")
+
+@app.cli.command("rebuild-eligibility")
+def rebuild_eligibility():
+    """Recompute the campaign → target list eligibility table."""
+    from app import eligibility
+    with app.app_context():
+        eligibility.rebuild(db.session)
+        db.session.commit()
+        print("✓ Target list eligibility rebuilt")
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups():
+    """Recompute the campaign, contract and pharma KPI rollup tables."""
+    from app import rollups
+    from app.models import campaign_rollup, contract_rollup, pharma_rollup
+    with app.app_context():
+        rollups.rebuild(db.session)
+        db.session.commit()
+        for table in (campaign_rollup, contract_rollup, pharma_rollup):
+            print(f"  {table.name}: {db.session.query(table).count():,}")
+        print("✓ KPI rollups rebuilt")
+
+@app.cli.command("check-query-plans")
+@click.option("--verbose", is_flag=True, help="Print every plan, not just failures.")
+@click.option("--routes", is_flag=True, help="Also explain the SELECTs every GET route runs against this database.")
+def check_query_plans(verbose, routes):
+    """EXPLAIN QUERY PLAN the hot queries; exit 1 if any falls back to a full scan."""
+    from app.queryplan import check_query_plans as run_check, check_route_plans
+    failures = 0
+    for blueprint, description, plan, scans in run_check():
+        if scans:
+            failures += 1
+            print(f"✗ {blueprint}: {description} scans {', '.join(scans)}")
+        elif verbose:
+            print(f"✓ {blueprint}: {description}")
+        if scans or verbose:
+            for line in plan:
+                print(f"    {line}")
+    if routes:
+        results, repeats = check_route_plans(app)
+        for label, statement, plan, scans in results:
+            if scans:
+                failures += 1
+                print(f"✗ {label} scans {', '.join(scans)}: {' '.join(statement.split())[:200]}")
+            if scans or verbose:
+                for line in plan:
+                    print(f"    {line}")
+        for label, shape, times in repeats:
+            failures += 1
+            print(f"✗ {label} runs one statement {times}×: {shape[:200]}")
+    if failures:
+        raise SystemExit(f"{failures} hot queries fall back to a full table scan")
+    print("✓ No full table scans in hot query plans")
+
+@app.cli.command("import-hierarchy")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "json"]), default=None,
+              help="Defaults to the file extension.")
+@click.option("--batch-size", default=1000, show_default=True)
+def import_hierarchy(path, fmt, batch_size):
+    """Bulk import contracts → campaigns → programs → placements from CSV/JSON."""
+    from app.importer import import_hierarchy as run_import
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "json")
+
+    def report(stats):
+        print(f"  {stats.rows} rows, {stats.rows_per_sec:,.0f} rows/s")
+
+    with app.app_context(), open(path, "rb") as fh:
+        stats = run_import(fh, fmt=fmt, batch_size=batch_size, progress=report)
+    for name, n in stats.created.items():
+        print(f"  created {name}: {n}")
+    for err in stats.errors[:20]:
+        print(f"  ! {err}")
+    print(f"✓ Imported {stats.rows} rows ({stats.skipped} skipped) in {stats.elapsed:.2f}s "
+          f"({stats.rows_per_sec:,.0f} rows/s)")
+
+@app.cli.command("export-hierarchy")
+@click.option("--output", "-o", default="-", show_default=True, help="File to write, or - for stdout.")
+@click.option("--format", "fmt", type=click.Choice(["csv", "parquet"]), default=None,
+              help="Defaults to the output extension, else csv.")
+@click.option("--pharma-id", type=int, default=None)
+@click.option("--contract-id", "contract_ids", type=int, multiple=True)
+@click.option("--batch-size", default=None, type=int, help="Rows per batch (default EXPORT_BATCH_SIZE).")
+def export_hierarchy(output, fmt, pharma_id, contract_ids, batch_size):
+    """Stream contracts → campaigns → programs → placements to CSV/Parquet."""
+    import time
+    from app import export
+    fmt = fmt or ("parquet" if output.lower().endswith(".parquet") else "csv")
+    try:
+        export.check_format(fmt)
+    except export.ExportUnavailable as e:
+        raise click.ClickException(str(e))
+    stats = {}
+    started = time.perf_counter()
+    with app.app_context():
+        chunks = export.stream(fmt, batch_size or app.config["EXPORT_BATCH_SIZE"], pharma_id=pharma_id,
+                               contract_ids=list(contract_ids), stats=stats)
+        with click.open_file(output, "wb") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+    elapsed = time.perf_counter() - started
+    rows = stats.get("rows", 0)
+    click.echo(f"✓ Exported {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)",
+               err=output == "-")
+
+@app.cli.command("run-jobs")
+@click.option("--drain", is_flag=True, help="Exit once no job is runnable.")
+@click.option("--threads", default=None, type=int, help="Worker threads (default JOBS_WORKERS).")
+def run_jobs(drain, threads):
+    """Process queued background jobs (uploads, imports) in this process."""
+    import time
+    from app import jobs
+    if drain:
+        with app.app_context():
+            jobs.requeue_stale(app.config["JOBS_STALE_SECONDS"])
+            n = jobs.drain()
+        print(f"✓ Ran {n} jobs")
+        return
+    worker = jobs.Worker(app, threads or app.config["JOBS_WORKERS"] or 1, app.config["JOBS_POLL_INTERVAL"])
+    worker.start()
+    print(f"Processing jobs with {worker.threads} threads (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop()
+
+@app.cli.command("ingest-target-lists")
+@click.argument("ids", nargs=-1, type=int)
+@click.option("--all", "reindex_all", is_flag=True, help="Re-read lists that are already indexed.")
+def ingest_target_lists(ids, reindex_all):
+    """Stream target list files back from S3 and index their HCP identifiers."""
+    from app import audience
+    from app.models import TargetList, TargetListAudience
+    with app.app_context():
+        query = TargetList.query.filter(TargetList.s3_key.isnot(None)).order_by(TargetList.id)
+        if ids:
+            query = query.filter(TargetList.id.in_(ids))
+        elif not reindex_all:
+            query = query.outerjoin(TargetListAudience).filter(TargetListAudience.target_list_id.is_(None))
+        failures = 0
+        for tl in query.all():
+            try:
+                a = audience.ingest_from_s3(tl)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                failures += 1
+                print(f"✗ {tl.id} {tl.label}: {e}")
+                continue
+            detail = f"{a.identifier_count:,} ids / {a.row_count:,} rows" if a.status == "ready" else a.error
+            print(f"  {tl.id} {tl.label}: {a.status} ({detail})")
+        if failures:
+            raise SystemExit(f"{failures} target lists could not be read")
+        print("✓ Target lists indexed")
+
+@app.cli.command("generate-data")
+@click.option("--pharmas", default=100, show_default=True)
+@click.option("--brands-per-pharma", default=5, show_default=True)
+@click.option("--contracts", default=2000, show_default=True)
+@click.option("--campaigns-per-contract", default=3, show_default=True)
+@click.option("--programs-per-campaign", default=3, show_default=True)
+@click.option("--placements", default=50000, show_default=True)
+@click.option("--programs-per-placement", default=3, show_default=True)
+@click.option("--target-lists", default=500, show_default=True)
+@click.option("--seed", default=42, show_default=True)
+@click.option("--chunk-size", default=10000, show_default=True)
+def generate_data(**options):
+    """Append a production-scale synthetic hierarchy to the configured database."""
+    from app.synthetic import Spec, generate, rebuild_derived
+
+    def report(stage, counts, elapsed):
+        print(f"  {stage}: {sum(counts.values()):,} rows in {elapsed:.1f}s")
+
+    with app.app_context():
+        counts = generate(Spec(**options), progress=report)
+        print("  rebuilding search index and eligibility ...")
+        rebuild_derived()
+    for table, n in counts.items():
+        print(f"  {table}: {n:,}")
+    print(f"✓ Generated {sum(counts.values()):,} rows")
+
+@app.cli.command("bench-routes")
+@click.option("--iterations", default=20, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), help="Write results as JSON.")
+@click.option("--compare", "baseline", type=click.Path(exists=True, dir_okay=False),
+              help="Earlier --output file to diff against.")
+@click.option("--only", multiple=True, help="Benchmark routes whose label contains this.")
+@click.option("--writes", is_flag=True, help="Also run the POST scenarios (they insert rows).")
+def bench_routes(iterations, output, baseline, only, writes):
+    """Measure latency, SQL count and peak memory for every route."""
+    import json
+    from app import bench
+
+    def report(label, r):
+        print(f"  {label:<55} {r['status']} p50 {r['p50_ms']:>8.2f}ms  p95 {r['p95_ms']:>8.2f}ms  "
+              f"{r['queries']:>4} sql  {r['peak_kib']:>9.1f} KiB")
+
+    results = bench.run(app, iterations=iterations, only=only, include_writes=writes, progress=report)
+    if output:
+        with open(output, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"✓ Wrote {output}")
+    if baseline:
+        old = bench.load(baseline)
+        print(f"Compared with {old['meta'].get('revision')} ({old['meta'].get('timestamp')}):")
+        for label, metric, a, b, pct in bench.compare(old, results):
+            if abs(pct) >= 10:
+                print(f"  {'▲' if pct > 0 else '▼'} {label} {metric}: {a} → {b} ({pct:+.0f}%)")
+
+@app.cli.command("bench-concurrency")
+@click.option("--workers", default=4, show_default=True, help="Worker processes (like gunicorn workers).")
+@click.option("--seconds", default=5.0, show_default=True)
+@click.option("--write-ratio", default=0.2, show_default=True, help="Fraction of operations that write.")
+@click.option("--profile", "profiles", multiple=True, type=click.Choice(["default", "tuned"]),
+              help="Engine profiles to run (default: both).")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write results as JSON.")
+def bench_concurrency(workers, seconds, write_ratio, profiles, output):
+    """Measure read/write throughput of concurrent processes per DB_ENGINE_PROFILE."""
+    import json
+    from app import bench
+
+    def report(profile, r):
+        print(f"  {profile:<8} {r['reads_per_sec']:>9.1f} reads/s  {r['writes_per_sec']:>8.1f} writes/s  "
+              f"read p95 {r['read_p95_ms']}ms  write p95 {r['write_p95_ms']}ms  {r['errors']} errors")
+
+    results = bench.concurrency(app, workers=workers, seconds=seconds, write_ratio=write_ratio,
+                                profiles=profiles or ("default", "tuned"), progress=report)
+    if output:
+        with open(output, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"✓ Wrote {output}")
+
+@app.cli.command("bench-m2m")
+@click.option("--width", default=200, show_default=True, help="Links in the collection.")
+@click.option("--changed", default=5, show_default=True, help="Links dropped (and restored) per edit.")
+@click.option("--iterations", default=20, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), help="Write results as JSON.")
+def bench_m2m(width, changed, iterations, output):
+    """Compare collection reassignment with diff-based link sync on wide many-to-many edits."""
+    import json
+    from app import bench
+
+    def report(case, strategy, r):
+        print(f"  {case:<20} {strategy:<7} p50 {r['p50_ms']:>9.2f}ms  p95 {r['p95_ms']:>9.2f}ms  {r['queries']:>4} sql")
+
+    results = bench.m2m(app, width=width, changed=changed, iterations=iterations, progress=report)
+    if output:
+        with open(output, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"✓ Wrote {output}")
+
+@app.cli.command("bench-lookups")
+@click.option("--clients", default=16, show_default=True, help="Concurrent client threads.")
+@click.option("--seconds", default=5.0, show_default=True, help="Load duration per tier.")
+@click.option("--background", default=0, show_default=True, help="Extra threads rendering a large contract page.")
+@click.option("--tier", "tiers", multiple=True, type=click.Choice(["sync", "async"]), help="Tiers to run (default: both).")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write results as JSON.")
+def bench_lookups(clients, seconds, background, tiers, output):
+    """Compare concurrent throughput of the sync and async (/aio) lookup endpoints."""
+    import json
+    from app import bench
+
+    def report(tier, r):
+        print(f"  {tier:<6} {r['requests_per_sec']:>8.1f} req/s  p50 {r['p50_ms']}ms  p95 {r['p95_ms']}ms  "
+              f"{r['background_per_sec']:>6.1f} pages/s  {r['errors']} errors")
+
+    results = bench.lookups(app, clients=clients, seconds=seconds, background=background,
+                            tiers=tiers or ("sync", "async"), progress=report)
+    if output:
+        with open(output, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"✓ Wrote {output}")
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,35 @@
+import boto3
+import pytest
+from moto import mock_aws
+from app import create_app
+from app.extensions import db
+
+BUCKET = "test-bucket"
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """A fresh app on its own SQLite file; jobs only run when a test asks for them."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv("JOBS_MODE", "external")
+    monkeypatch.setenv("AUDIENCE_DIR", str(tmp_path / "audience"))
+    monkeypatch.setenv("JOBS_SPOOL_DIR", str(tmp_path / "spool"))
+    app = create_app()
+    app.config["TESTING"] = True
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def s3(monkeypatch):
+    """A moto S3 with BUCKET created; the app's S3 client is built inside the mock."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
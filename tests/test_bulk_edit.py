@@ -0,0 +1,38 @@
+from datetime import date
+from sqlalchemy import select
+from app.extensions import db
+from app.models import Placement
+
+def _placements(app, *spans):
+    with app.app_context():
+        rows = [Placement(name=f"P{i}", channel="display", status="live", start_date=start, end_date=end)
+                for i, (start, end) in enumerate(spans)]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [p.id for p in rows]
+
+def _spans(app):
+    with app.app_context():
+        return db.session.execute(select(Placement.start_date, Placement.end_date).order_by(Placement.id)).all()
+
+def test_shift_moves_both_dates(app, client):
+    ids = _placements(app, (date(2024, 1, 1), date(2024, 1, 31)), (None, date(2024, 3, 1)))
+    response = client.post("/placements/bulk-edit", json={"ids": ids, "shift_days": -10})
+    assert response.status_code == 200
+    assert _spans(app) == [(date(2023, 12, 22), date(2024, 1, 21)), (None, date(2024, 2, 20))]
+
+def test_shift_is_bounded(app, client):
+    spans = [(date(2024, 1, 1), date(2024, 1, 31))]
+    ids = _placements(app, *spans)
+    response = client.post("/placements/bulk-edit", json={"ids": ids, "shift_days": 3000000})
+    assert response.status_code == 400
+    assert "at most 3650 days" in response.get_json()["errors"][0]
+    assert _spans(app) == spans
+
+def test_shift_past_the_last_date_changes_nothing(app, client):
+    spans = [(date(2024, 1, 1), date(2024, 1, 31)), (date(9999, 6, 1), date(9999, 12, 1))]
+    ids = _placements(app, *spans)
+    response = client.post("/placements/bulk-edit", json={"ids": ids, "shift_days": 365})
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == [f"batch 1: shifted dates out of range for {ids[1]}"]
+    assert _spans(app) == spans
@@ -0,0 +1,77 @@
+import json
+from app.extensions import db
+from app.models import TargetList
+from conftest import BUCKET
+
+SIZE = 6 * 1024 * 1024
+
+def _start(app, client, size=SIZE, post_max_mb=0):
+    app.config.update(S3_BUCKET_NAME=BUCKET, S3_DIRECT_UPLOADS=True, S3_DIRECT_POST_MAX_MB=post_max_mb)
+    response = client.post("/target-lists/direct-upload", data={"filename": "list.csv", "size": size})
+    assert response.status_code == 200
+    return response.get_json()
+
+def _put_parts(s3, plan, key, upload_id):
+    # what the browser does with the presigned part URLs
+    body = b"npi\n" + b"1234567890\n" * (SIZE // 11)
+    etags = []
+    for part in plan["parts"]:
+        start = (part["part_number"] - 1) * plan["part_size"]
+        resp = s3.upload_part(Bucket=BUCKET, Key=key, UploadId=upload_id, PartNumber=part["part_number"],
+                              Body=body[start:start + plan["part_size"]])
+        etags.append({"part_number": part["part_number"], "etag": resp["ETag"]})
+    return etags
+
+def _open_upload(s3):
+    (upload,) = s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", [])
+    return upload["Key"], upload["UploadId"]
+
+def test_completing_twice_records_one_target_list(app, client, s3):
+    plan = _start(app, client)
+    key, upload_id = _open_upload(s3)
+    form = {"token": plan["token"], "label": "List", "parts": json.dumps(_put_parts(s3, plan, key, upload_id))}
+    first = client.post("/target-lists/direct-upload/complete", data=form)
+    second = client.post("/target-lists/direct-upload/complete", data=form)
+    assert first.status_code == second.status_code == 200
+    assert first.get_json()["id"] == second.get_json()["id"]
+    assert first.get_json()["job"] == second.get_json()["job"]
+    with app.app_context():
+        (tl,) = db.session.scalars(db.select(TargetList)).all()
+        assert tl.s3_key == key
+
+def test_abort_drops_the_multipart_upload(app, client, s3):
+    plan = _start(app, client)
+    key, upload_id = _open_upload(s3)
+    s3.upload_part(Bucket=BUCKET, Key=key, UploadId=upload_id, PartNumber=1, Body=b"x" * 1024)
+    response = client.post("/target-lists/direct-upload/abort", data={"token": plan["token"]})
+    assert response.status_code == 200 and response.get_json() == {"aborted": True}
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    # a second abort (or one after completion) is not an error
+    assert client.post("/target-lists/direct-upload/abort", data={"token": plan["token"]}).status_code == 200
+
+def test_abort_of_a_presigned_post_is_a_no_op(app, client, s3):
+    plan = _start(app, client, size=1024, post_max_mb=64)
+    assert plan["mode"] == "post"
+    response = client.post("/target-lists/direct-upload/abort", data={"token": plan["token"]})
+    assert response.get_json() == {"aborted": False}
+
+def test_abort_rejects_a_bad_token(app, client, s3):
+    _start(app, client)
+    assert client.post("/target-lists/direct-upload/abort", data={"token": "nope"}).status_code == 400
+
+def test_same_second_uploads_of_one_filename_stay_apart(app, client, s3, monkeypatch):
+    monkeypatch.setattr("app.routes.target_lists.time.time", lambda: 1700000000.0)
+    ids = []
+    for label, body in (("Alpha", b"npi\n1111111111\n"), ("Beta", b"npi\n2222222222\n")):
+        plan = _start(app, client, size=len(body), post_max_mb=64)
+        # what the browser's form POST stores
+        s3.put_object(Bucket=BUCKET, Key=plan["fields"]["key"], Body=body)
+        response = client.post("/target-lists/direct-upload/complete", data={"token": plan["token"], "label": label})
+        assert response.status_code == 200
+        ids.append(response.get_json()["id"])
+    assert ids[0] != ids[1]
+    with app.app_context():
+        lists = db.session.scalars(db.select(TargetList).order_by(TargetList.id)).all()
+        assert [tl.label for tl in lists] == ["Alpha", "Beta"]
+        assert lists[0].s3_key != lists[1].s3_key
+        assert s3.get_object(Bucket=BUCKET, Key=lists[0].s3_key)["Body"].read() == b"npi\n1111111111\n"
@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import select
+from app.extensions import db
+from app.eligibility import _eligible_pairs
+from app.m2m import sync_links
+from app.models import Pharma, Brand, Contract, Campaign, TargetList, target_list_eligibility
+
+def _stored():
+    return set(db.session.execute(select(target_list_eligibility.c.campaign_id,
+                                         target_list_eligibility.c.target_list_id)).all())
+
+def _expected():
+    return set(db.session.execute(_eligible_pairs()).all())
+
+@pytest.fixture
+def graph(app):
+    with app.app_context():
+        pharma = Pharma(name="Pharma")
+        brand = Brand(name="Brand", pharma=pharma)
+        lists = [TargetList(label=f"List {i}", s3_key=f"k{i}", original_filename="list.csv",
+                            brands=[brand], pharmas=[pharma] if i < 2 else [])
+                 for i in range(3)]
+        contract = Contract(name="Contract", pharma=pharma, brands=[brand])
+        db.session.add_all([pharma, brand, contract, *lists,
+                            *(Campaign(name=f"Campaign {i}", contract=contract) for i in range(2))])
+        db.session.commit()
+        yield pharma.id, [tl.id for tl in lists]
+
+def test_pharma_collection_edit_refreshes_eligibility(app, graph):
+    pharma_id, (first, second, third) = graph
+    with app.app_context():
+        assert _stored() == _expected() and {tl for _, tl in _stored()} == {first, second}
+        pharma = db.session.get(Pharma, pharma_id)
+        pharma.target_lists = [tl for tl in pharma.target_lists if tl.id != first]
+        pharma.target_lists.append(db.session.get(TargetList, third))
+        db.session.commit()
+        assert {tl for _, tl in _stored()} == {second, third}
+        assert _stored() == _expected()
+
+def test_pharma_sync_links_refreshes_eligibility(app, graph):
+    pharma_id, (first, second, third) = graph
+    with app.app_context():
+        sync_links(db.session, db.session.get(Pharma, pharma_id), "target_lists", [third])
+        db.session.commit()
+        assert {tl for _, tl in _stored()} == {third}
+        assert _stored() == _expected()
@@ -0,0 +1,53 @@
+import csv
+import io
+import pyarrow.parquet as pq
+import pytest
+from app.export import HEADER
+from app.extensions import db
+from app.models import Pharma, Brand, Contract, Campaign, Program, Placement
+
+@pytest.fixture
+def contract_id(app):
+    with app.app_context():
+        pharma = Pharma(name="Pharma")
+        contract = Contract(name="Contract", pharma=pharma, brands=[Brand(name="Brand", pharma=pharma)])
+        for i in range(3):
+            campaign = Campaign(name=f"Campaign {i}", contract=contract)
+            for j in range(2):
+                program = Program(name=f"Program {i}.{j}", campaign=campaign, platform="web", asset_id=f"A{i}{j}")
+                db.session.add_all(Placement(name=f"Placement {i}.{j}.{k}", status="live", impression_goal=1000 * k,
+                                             programs=[program]) for k in range(3))
+        db.session.add(Pharma(name="Empty"))
+        db.session.commit()
+        return contract.id
+
+def _export(client, fmt, **args):
+    response = client.get("/contracts/export", query_string={"format": fmt, **args})
+    assert response.status_code == 200
+    return response.get_data()
+
+def test_csv_export(client, contract_id):
+    rows = list(csv.reader(io.StringIO(_export(client, "csv", contract_id=contract_id).decode("utf-8"))))
+    assert rows[0] == HEADER
+    assert len(rows) == 1 + 18
+    assert {row[HEADER.index("brands")] for row in rows[1:]} == {"Brand"}
+
+def test_parquet_export_streams_one_row_group_per_batch(app, client, contract_id):
+    app.config["EXPORT_BATCH_SIZE"] = 4
+    table = pq.read_table(io.BytesIO(_export(client, "parquet", contract_id=contract_id)))
+    assert table.column_names == HEADER
+    assert table.num_rows == 18
+    assert pq.ParquetFile(io.BytesIO(_export(client, "parquet", contract_id=contract_id))).num_row_groups == 5
+
+    rows = list(csv.reader(io.StringIO(_export(client, "csv", contract_id=contract_id).decode("utf-8"))))[1:]
+    parquet = table.to_pylist()
+    assert [r["placement_id"] for r in parquet] == [int(r[HEADER.index("placement_id")]) for r in rows]
+    assert [r["placement"] for r in parquet] == [r[HEADER.index("placement")] for r in rows]
+    assert sorted({r["impression_goal"] for r in parquet}) == [0, 1000, 2000]
+
+def test_parquet_export_without_rows(app, client, contract_id):
+    with app.app_context():
+        empty = db.session.query(Pharma.id).filter_by(name="Empty").scalar()
+    table = pq.read_table(io.BytesIO(_export(client, "parquet", pharma_id=empty)))
+    assert table.num_rows == 0
+    assert table.column_names == HEADER
@@ -0,0 +1,61 @@
+import io
+from sqlalchemy import select
+from app import rollups, search
+from app.bulk_edit import bulk_edit
+from app.extensions import db
+from app.importer import import_hierarchy
+from app.models import Placement, Program, campaign_rollup, contract_rollup, pharma_rollup
+
+HEADER = "pharma,contract,brands,campaign,program,placement,channel,status,start_date,end_date\n"
+
+def _csv(rows):
+    return io.BytesIO((HEADER + "".join(",".join(r) + "\n" for r in rows)).encode())
+
+def _derived(session):
+    """Rollup rows (without refreshed_at) and search documents, as comparable sets."""
+    out = {}
+    for table in (campaign_rollup, contract_rollup, pharma_rollup):
+        columns = [c for c in table.c if c.key != "refreshed_at"]
+        out[table.name] = set(session.execute(select(*columns)).all())
+    if search.backend():
+        out["search"] = set(session.execute(db.text("SELECT entity, entity_id, body FROM search_index")).all())
+    return out
+
+def _matches_rebuild(session):
+    incremental = _derived(session)
+    rollups.rebuild(session)
+    search.rebuild(session)
+    assert incremental == _derived(session)
+    session.rollback()
+
+def test_importer_links_match_a_rebuild(app):
+    rows = [("Acme", f"C{c}", "Alpha;Beta" if c % 2 else "Beta", f"Camp{c}", f"Prog{c}{p}", f"Pl{c}{p}{k}",
+             "display", "live", "2024-01-01", "2024-03-31")
+            for c in range(3) for p in range(2) for k in range(3)]
+    # placements shared across programs and campaigns of one contract
+    rows += [("Acme", "C1", "Gamma", "Camp1b", "Prog1x", "Pl100", "video", "planned", "2024-02-01", "2024-05-01")]
+    with app.app_context():
+        import_hierarchy(_csv(rows), fmt="csv", batch_size=5)
+        _matches_rebuild(db.session)
+        # new links only: existing placements and brands under a new campaign and contract
+        import_hierarchy(_csv([("Acme", "C0", "Delta", "Camp9", "Prog9", "Pl000", "display", "live",
+                                "2024-01-01", "2024-03-31"),
+                               ("Acme", "C2", "Alpha", "Camp2", "Prog20", "Pl002", "display", "live",
+                                "2024-01-01", "2024-03-31")]), fmt="csv")
+        _matches_rebuild(db.session)
+
+def test_bulk_edit_links_match_a_rebuild(app):
+    rows = [("Acme", f"C{c}", "Alpha", f"Camp{c}", f"Prog{c}", f"Pl{c}{k}", "display", "live",
+             "2024-01-01", "2024-03-31") for c in range(3) for k in range(4)]
+    with app.app_context():
+        session = db.session
+        import_hierarchy(_csv(rows), fmt="csv")
+        programs = {p.name: p.id for p in session.scalars(select(Program))}
+        placements = {p.name: p.id for p in session.scalars(select(Placement))}
+        # link C0's placements into C1's program, then unlink half of them from C0's
+        bulk_edit(session, [placements[f"Pl0{k}"] for k in range(4)], add_program_ids=[programs["Prog1"]])
+        session.commit()
+        _matches_rebuild(session)
+        bulk_edit(session, [placements["Pl00"], placements["Pl01"]], remove_program_ids=[programs["Prog0"]])
+        session.commit()
+        _matches_rebuild(session)
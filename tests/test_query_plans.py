@@ -0,0 +1,18 @@
+from app.extensions import db
+from app.queryplan import _seed, check_query_plans, check_route_plans
+
+def test_hot_queries_use_indexes():
+    failures = [(blueprint, description, plan) for blueprint, description, plan, scans in check_query_plans() if scans]
+    assert failures == []
+
+def test_route_queries_use_indexes(app):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            _seed(conn)
+    results, repeats = check_route_plans(app)
+    assert {label.split("?")[0] for label, *_ in results} >= {
+        "contracts.list_contracts", "contracts.view_contract", "programs.api_program_target_lists",
+        "placements.list_placements", "target_lists.list_target_lists"}
+    scans = [(label, " ".join(statement.split()), plan) for label, statement, plan, scans in results if scans]
+    assert scans == []
+    assert repeats == [], "statements repeated per row (N+1)"
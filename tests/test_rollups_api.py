@@ -0,0 +1,13 @@
+import pytest
+from app.extensions import db
+from app.models import Pharma
+
+@pytest.mark.parametrize("limit, expected", [(None, 5), (2, 2), (0, 1), (-1, 1), (5000, 5)])
+def test_limit_is_clamped(app, client, limit, expected):
+    with app.app_context():
+        db.session.add_all(Pharma(name=f"Pharma {i}") for i in range(5))
+        db.session.commit()
+    query = {} if limit is None else {"limit": limit}
+    response = client.get("/rollups/pharmas", query_string=query)
+    assert response.status_code == 200
+    assert len(response.get_json()) == expected
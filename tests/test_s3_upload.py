@@ -0,0 +1,81 @@
+import io
+import pytest
+from app import cache
+from app.s3_utils import MIN_PART_SIZE, generate_presigned_get_url, s3_client, upload_stream
+from conftest import BUCKET
+
+MB = 1024 * 1024
+
+class FailingStream(io.RawIOBase):
+    """Yields ``good`` bytes, then fails the next read like a dropped client connection."""
+
+    def __init__(self, good):
+        self.remaining = good
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        if self.remaining <= 0:
+            raise OSError("connection reset")
+        n = min(len(buf), self.remaining)
+        buf[:n] = b"x" * n
+        self.remaining -= n
+        return n
+
+def _body(size):
+    return bytes(i % 251 for i in range(size))
+
+def _upload(s3, data, key="list.csv"):
+    return upload_stream(s3, io.BytesIO(data), BUCKET, key, part_size=MIN_PART_SIZE, max_concurrency=2)
+
+def _stored(s3, key="list.csv"):
+    return s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+@pytest.mark.parametrize("size, parts", [(12 * MB, 3), (10 * MB, 2)])
+def test_multipart_upload(s3, size, parts):
+    data = _body(size)
+    assert _upload(s3, data) == size
+    assert _stored(s3) == data
+    head = s3.head_object(Bucket=BUCKET, Key="list.csv", PartNumber=1)
+    assert head["PartsCount"] == parts
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+
+def test_small_body_is_a_single_put(s3):
+    data = _body(1000)
+    assert _upload(s3, data) == 1000
+    assert _stored(s3) == data
+    assert "PartsCount" not in s3.head_object(Bucket=BUCKET, Key="list.csv", PartNumber=1)
+
+def test_empty_body(s3):
+    assert _upload(s3, b"") == 0
+    assert _stored(s3) == b""
+
+def test_read_error_aborts_multipart_upload(s3):
+    stream = io.BufferedReader(FailingStream(MIN_PART_SIZE + 1024))
+    with pytest.raises(OSError):
+        upload_stream(s3, stream, BUCKET, "broken.csv", part_size=MIN_PART_SIZE, max_concurrency=2)
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert "Contents" not in s3.list_objects_v2(Bucket=BUCKET, Prefix="broken.csv")
+
+def test_presigned_get_urls_are_reused_until_the_margin(app, s3, monkeypatch):
+    app.config.update(S3_BUCKET_NAME=BUCKET, S3_PRESIGN_CACHE_MARGIN=60)
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    with app.app_context():
+        client = s3_client()
+        signed = []
+        sign = client.generate_presigned_url
+        monkeypatch.setattr(client, "generate_presigned_url", lambda *a, **kw: signed.append(1) or sign(*a, **kw))
+        first = generate_presigned_get_url("a.csv", expires_in=300)
+        now[0] += 239
+        assert generate_presigned_get_url("a.csv", expires_in=300) == first
+        assert len(signed) == 1
+        # within S3_PRESIGN_CACHE_MARGIN of expiry: signed again
+        now[0] += 2
+        generate_presigned_get_url("a.csv", expires_in=300)
+        assert len(signed) == 2
+        # a URL that would expire within the margin is never cached
+        generate_presigned_get_url("a.csv", expires_in=30)
+        generate_presigned_get_url("a.csv", expires_in=30)
+        assert len(signed) == 4
@@ -0,0 +1,34 @@
+import io
+from app import jobs
+from app.extensions import db
+from app.models import Job, TargetList
+from conftest import BUCKET
+
+def _create(client, body=b"npi\n1234567890\n"):
+    return client.post("/target-lists/create", data={"label": "List", "file": (io.BytesIO(body), "list.csv")},
+                       content_type="multipart/form-data")
+
+def test_upload_sets_s3_key_once_the_object_exists(app, client, s3):
+    app.config["S3_BUCKET_NAME"] = BUCKET
+    assert _create(client).status_code == 302
+    with app.app_context():
+        tl = db.session.scalars(db.select(TargetList)).one()
+        assert tl.s3_key is None
+        assert jobs.drain() >= 1
+        db.session.refresh(tl)
+        assert tl.s3_key.endswith("-list.csv")
+        assert s3.get_object(Bucket=BUCKET, Key=tl.s3_key)["Body"].read() == b"npi\n1234567890\n"
+
+def test_failed_upload_leaves_no_dangling_key(app, client, s3):
+    app.config["S3_BUCKET_NAME"] = BUCKET
+    app.config["JOBS_MAX_ATTEMPTS"] = 1
+    assert _create(client).status_code == 302
+    s3.delete_bucket(Bucket=BUCKET)
+    with app.app_context():
+        jobs.drain()
+        assert db.session.scalars(db.select(Job.status)).one() == jobs.FAILED
+        tl = db.session.scalars(db.select(TargetList)).one()
+        assert tl.s3_key is None
+        tl_id = tl.id
+    response = client.get(f"/target-lists/{tl_id}/download")
+    assert response.status_code == 302 and response.location.endswith("/target-lists/")
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import event
+from app.extensions import db
+from app.models import Pharma, Brand, Contract, Campaign, Program, Placement, TargetList
+
+# statements one contract page may run, however many campaigns it has
+MAX_QUERIES = 6
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+def _contract(n_campaigns, programs=3, placements=2):
+    pharma = Pharma(name=f"Pharma {n_campaigns}")
+    brand = Brand(name=f"Brand {n_campaigns}", pharma=pharma)
+    target_list = TargetList(label=f"List {n_campaigns}", s3_key=f"k{n_campaigns}", original_filename="list.csv")
+    contract = Contract(name=f"Contract {n_campaigns}", pharma=pharma, brands=[brand])
+    db.session.add_all([pharma, brand, target_list, contract])
+    for i in range(n_campaigns):
+        campaign = Campaign(name=f"Campaign {i}", contract=contract)
+        for j in range(programs):
+            program = Program(name=f"Program {i}.{j}", campaign=campaign, platform="web", asset_id="a",
+                              target_list=target_list)
+            db.session.add_all(Placement(name=f"Placement {i}.{j}.{k}", programs=[program])
+                               for k in range(placements))
+    db.session.commit()
+    return contract.id
+
+def _queries(app, client, contract_id):
+    with app.app_context(), QueryCounter(db.engine) as counter:
+        response = client.get(f"/contracts/{contract_id}")
+    assert response.status_code == 200
+    return len(counter.statements)
+
+@pytest.mark.parametrize("n_campaigns", [10, 40])
+def test_query_count_does_not_grow_with_campaigns(app, client, n_campaigns):
+    with app.app_context():
+        small, large = _contract(1), _contract(n_campaigns)
+    _queries(app, client, small)  # warm the lookup cache
+    baseline = _queries(app, client, small)
+    assert baseline <= MAX_QUERIES
+    assert _queries(app, client, large) == baseline